@@ -28,6 +28,8 @@ PyInstaller.__main__.run([
     '--hidden-import', 'collectors.processes',
     '--hidden-import', 'collectors.network',
     '--hidden-import', 'config',
+    '--hidden-import', 'ioc',
+    '--hidden-import', 'policies',
 ])
 
 print("\n" + "=" * 50)
@@ -3,6 +3,11 @@ Network Collector
 Monitors active connections, open ports, and network interfaces.
 """
 import psutil
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ioc
 
 
 def collect():
@@ -10,6 +15,7 @@ def collect():
 
     # Active connections
     connections = []
+    remote_endpoints = set()
     open_ports = set()
     try:
         for conn in psutil.net_connections(kind="inet"):
@@ -20,11 +26,20 @@ def collect():
                     "status": conn.status,
                     "pid": conn.pid,
                 })
+                if conn.raddr:
+                    remote_endpoints.add(f"{conn.raddr.ip}:{conn.raddr.port}")
             if conn.status == "LISTEN" and conn.laddr:
                 open_ports.add(conn.laddr.port)
     except (psutil.AccessDenied, PermissionError):
         pass
 
+    # Remote endpoints listed in the local IOC bundle (confirmed server-side)
+    bundle = ioc.current()
+    ioc_connections = [
+        endpoint for endpoint in sorted(remote_endpoints)
+        if bundle and bundle.contains_ip(endpoint.rpartition(":")[0])
+    ]
+
     # Network interfaces
     interfaces = []
     stats = psutil.net_if_stats()
@@ -51,7 +66,10 @@ def collect():
     return {
         "active_connections": len(connections),
         "established_connections": connections[:20],  # Limit to 20 for payload size
+        # Every distinct remote endpoint, for the backend's fleet search index
+        "remote_endpoints": sorted(remote_endpoints),
         "open_ports": sorted(list(open_ports)),
+        "ioc_connections": ioc_connections,
         "interfaces": interfaces,
         "bytes_sent_mb": round(io.bytes_sent / (1024 ** 2), 1),
         "bytes_recv_mb": round(io.bytes_recv / (1024 ** 2), 1),
@@ -8,31 +8,50 @@ import os
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import SUSPICIOUS_PROCESSES, HIGH_CPU_THRESHOLD
+import ioc
+import policies
 
 
 def collect():
     """Returns running process summary and flagged suspicious processes."""
-    processes = []
+    names = set()
     suspicious = []
+    bundle = ioc.current()
+    blocked = policies.blocked_processes()
     total = 0
 
     for proc in psutil.process_iter(["pid", "name", "cpu_percent", "memory_percent", "username"]):
         try:
             info = proc.info
             total += 1
+            if info["name"]:
+                names.add(info["name"])
 
             # Check if suspicious
             name_lower = info["name"].lower() if info["name"] else ""
             is_suspicious = False
             reason = ""
+            rule = ""
 
             if name_lower in [s.lower() for s in SUSPICIOUS_PROCESSES]:
                 is_suspicious = True
                 reason = "Known malicious tool"
+                rule = "known_tool"
+
+            elif name_lower in blocked:
+                is_suspicious = True
+                reason = "Blocked by policy"
+                rule = "policy"
+
+            elif bundle and name_lower and bundle.contains_process(name_lower):
+                is_suspicious = True
+                reason = "IOC feed match"
+                rule = "ioc"
 
             elif info["cpu_percent"] and info["cpu_percent"] > HIGH_CPU_THRESHOLD:
                 is_suspicious = True
                 reason = f"High CPU usage ({info['cpu_percent']:.1f}%)"
+                rule = "high_cpu"
 
             if is_suspicious:
                 suspicious.append({
@@ -42,6 +61,7 @@ def collect():
                     "memory": round(info["memory_percent"] or 0, 1),
                     "user": info.get("username", ""),
                     "reason": reason,
+                    "rule": rule,
                 })
 
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
@@ -50,4 +70,6 @@ def collect():
     return {
         "total_count": total,
         "suspicious": suspicious,
+        # Distinct running process names, for the backend's fleet search index
+        "names": sorted(names),
     }
@@ -29,5 +29,11 @@ SUSPICIOUS_PROCESSES = [
     "sharphound.exe", "rubeus.exe",
 ]
 
+# Local copy of the backend's IOC feeds (downloaded and kept up to date automatically)
+IOC_BUNDLE_PATH = "ioc_bundle.bin"
+
+# Local copy of the organization's policy bundle
+POLICY_CACHE_PATH = "policies.json"
+
 # High CPU threshold (flag processes above this %)
 HIGH_CPU_THRESHOLD = 85.0
@@ -0,0 +1,247 @@
+"""
+IOC Bundle
+Local copy of the backend's IOC feeds, memory-mapped so the collectors can
+check every process and connection without sending them all upstream.
+
+The file format is documented in backend/app/services/ioc_bundle.py; this
+module only reads it and applies deltas (stdlib only). Fingerprint-set
+hits may be bloom-filter candidates, so they're reported as suspicious and
+the backend confirms them against its exact feeds.
+"""
+import hashlib
+import logging
+import mmap
+import os
+import socket
+import struct
+import sys
+import zlib
+from bisect import bisect_left, bisect_right
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import SERVER_URL, API_BASE, API_KEY, IOC_BUNDLE_PATH
+
+logger = logging.getLogger("ocsafe-agent")
+
+MAGIC = b"OCIOCBND"
+DELTA_MAGIC = b"OCIOCDLT"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sI16sI")
+ENTRY = struct.Struct("<4sII")
+SET_HEADER = struct.Struct("<BxxxI")
+DELTA_HEADER = struct.Struct("<8s16s16sI")
+DELTA_ENTRY = struct.Struct("<4sBI")
+MODE_EXACT, MODE_BLOOM = 0, 1
+COPY, XOR, REPLACE = 0, 1, 2
+
+
+def fingerprint(value):
+    """Same 64-bit fingerprint as the backend (blake2b, little-endian)."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _pad(length):
+    return -length % 8
+
+
+def _sections(data):
+    magic, fmt, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        raise ValueError("Not an IOC bundle")
+    sections = []
+    for i in range(count):
+        tag, offset, length = ENTRY.unpack_from(data, HEADER.size + i * ENTRY.size)
+        sections.append((tag, offset, length))
+    return version.rstrip(b"\0").decode("ascii"), sections
+
+
+def _pack(version, sections):
+    offset = HEADER.size + ENTRY.size * len(sections)
+    offset += _pad(offset)
+    entries, body = [], []
+    for tag, data in sections:
+        entries.append(ENTRY.pack(tag, offset, len(data)))
+        body.append(data + b"\0" * _pad(len(data)))
+        offset += len(data) + _pad(len(data))
+    head = HEADER.pack(MAGIC, FORMAT_VERSION, version.encode("ascii"), len(sections)) + b"".join(entries)
+    return head + b"\0" * _pad(len(head)) + b"".join(body)
+
+
+def apply_delta(old, delta):
+    """Rebuild the new bundle from the current one and a server delta."""
+    data = zlib.decompress(delta)
+    magic, base, version, count = DELTA_HEADER.unpack_from(data)
+    old_version, old_sections = _sections(old)
+    if magic != DELTA_MAGIC or base.rstrip(b"\0").decode("ascii") != old_version:
+        raise ValueError("Delta does not apply to the local bundle")
+    previous = {tag: old[offset:offset + length] for tag, offset, length in old_sections}
+
+    sections = []
+    pos = DELTA_HEADER.size
+    for _ in range(count):
+        tag, mode, length = DELTA_ENTRY.unpack_from(data, pos)
+        pos += DELTA_ENTRY.size
+        chunk = data[pos:pos + length]
+        pos += length
+        if mode == COPY:
+            sections.append((tag, bytes(previous[tag])))
+        elif mode == XOR:
+            before = previous[tag]
+            sections.append((tag, (int.from_bytes(before, "little") ^ int.from_bytes(chunk, "little"))
+                             .to_bytes(len(before), "little")))
+        else:
+            sections.append((tag, bytes(chunk)))
+    return _pack(version.rstrip(b"\0").decode("ascii"), sections)
+
+
+class _FingerprintSection:
+    def __init__(self, view):
+        self.mode, self.num_hashes = SET_HEADER.unpack_from(view)
+        body = view[SET_HEADER.size:]
+        if self.mode == MODE_EXACT:
+            self.values = body.cast("Q")
+        else:
+            self.bits = body
+            self.mask = len(body) * 8 - 1
+
+    def __contains__(self, fp):
+        if self.mode == MODE_EXACT:
+            index = bisect_left(self.values, fp)
+            return index < len(self.values) and self.values[index] == fp
+        h1, h2 = fp & 0xFFFFFFFF, (fp >> 32) | 1
+        for i in range(self.num_hashes):
+            bit = (h1 + i * h2) & self.mask
+            if not self.bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+
+class IOCBundle:
+    """Read-only, memory-mapped view of a bundle file."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self.version, sections = _sections(self._view)
+        views = {tag: self._view[offset:offset + length] for tag, offset, length in sections}
+        self._views = list(views.values())
+
+        self.processes = _FingerprintSection(views[b"PROC"])
+        self.hashes = _FingerprintSection(views[b"HASH"])
+        self.domains = _FingerprintSection(views[b"DOMN"])
+        self._views += [s.values if s.mode == MODE_EXACT else s.bits
+                        for s in (self.processes, self.hashes, self.domains)]
+
+        (count,) = struct.unpack_from("<I", views[b"IPV4"])
+        ipv4 = views[b"IPV4"][4:4 + 8 * count]
+        self.ipv4_starts, self.ipv4_ends = ipv4[:4 * count].cast("I"), ipv4[4 * count:].cast("I")
+        self._views += [ipv4, self.ipv4_starts, self.ipv4_ends]
+        # IPv6 ranges are rare; plain ints are simpler than 128-bit compares
+        (count,) = struct.unpack_from("<I", views[b"IPV6"])
+        ipv6 = [int.from_bytes(views[b"IPV6"][4 + 16 * i:20 + 16 * i], "big") for i in range(2 * count)]
+        self.ipv6_starts, self.ipv6_ends = ipv6[:count], ipv6[count:]
+        self.ports = set(struct.unpack_from(f"<{len(views[b'PORT']) // 2}H", views[b"PORT"]))
+
+    def close(self):
+        # Views must be released before the map can close (and, on Windows,
+        # before the file can be replaced)
+        for view in reversed(self._views):
+            view.release()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def raw(self):
+        return self._map[:]
+
+    def contains_process(self, name):
+        return fingerprint(name.strip().lower()) in self.processes
+
+    def contains_hash(self, file_hash):
+        return fingerprint(file_hash.strip().lower()) in self.hashes
+
+    def contains_domain(self, domain):
+        labels = domain.strip().lower().rstrip(".").split(".")
+        return any(fingerprint(".".join(labels[i:])) in self.domains for i in range(len(labels) - 1))
+
+    def contains_ip(self, ip):
+        ip = ip.strip().strip("[]")
+        try:
+            value = int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+            starts, ends = self.ipv4_starts, self.ipv4_ends
+        except OSError:
+            try:
+                value = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+            except OSError:
+                return False
+            starts, ends = self.ipv6_starts, self.ipv6_ends
+        index = bisect_right(starts, value) - 1
+        return index >= 0 and value <= ends[index]
+
+
+_bundle = None
+
+
+def current():
+    """The loaded bundle, or None if the agent hasn't got one yet."""
+    global _bundle
+    if _bundle is None and os.path.exists(IOC_BUNDLE_PATH):
+        try:
+            _bundle = IOCBundle(IOC_BUNDLE_PATH)
+        except (OSError, ValueError, KeyError, struct.error) as e:
+            logger.error("Ignoring unreadable IOC bundle %s: %s", IOC_BUNDLE_PATH, e)
+    return _bundle
+
+
+def _discard():
+    global _bundle
+    if _bundle is not None:
+        _bundle.close()
+        _bundle = None
+
+
+def _install(data, version):
+    global _bundle
+    if _sections(data)[0] != version:
+        raise ValueError("Bundle version does not match its ETag")
+    tmp_path = IOC_BUNDLE_PATH + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    _discard()
+    os.replace(tmp_path, IOC_BUNDLE_PATH)
+    _bundle = IOCBundle(IOC_BUNDLE_PATH)
+
+
+def refresh():
+    """
+    Fetch the bundle if the backend has a newer one. Sends the local
+    version as If-None-Match, so an unchanged bundle costs a 304 and a
+    changed one usually a small delta.
+    """
+    bundle = current()
+    url = f"{SERVER_URL}{API_BASE}/policies/ioc-bundle"
+    headers = {"X-API-Key": API_KEY}
+    if bundle is not None:
+        headers["If-None-Match"] = f'"{bundle.version}"'
+
+    resp = requests.get(url, headers=headers, timeout=30)
+    if resp.status_code == 304:
+        return
+    resp.raise_for_status()
+    version = resp.headers.get("ETag", "").strip('"')
+
+    if resp.headers.get("X-IOC-Delta-Base") and bundle is not None:
+        try:
+            _install(apply_delta(bundle.raw(), resp.content), version)
+        except (ValueError, KeyError, zlib.error, struct.error) as e:
+            # Local copy is damaged or out of step: start over with a full bundle
+            logger.warning("IOC delta failed (%s), downloading the full bundle", e)
+            _discard()
+            os.remove(IOC_BUNDLE_PATH)
+            return refresh()
+    else:
+        _install(resp.content, version)
+    logger.info("IOC bundle updated to %s", version)
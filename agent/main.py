@@ -16,6 +16,8 @@ from datetime import datetime, timezone
 
 from config import SERVER_URL, API_BASE, API_KEY, DEVICE_ID, COLLECT_INTERVAL, COLLECTORS
 from collectors import system, security, processes, network
+import ioc
+import policies
 
 # Setup logging
 logging.basicConfig(
@@ -99,6 +101,10 @@ def send_telemetry(payload):
         if resp.status_code == 200:
             result = resp.json()
             threat_eval = result.get("threat_evaluation", {})
+            try:
+                policies.sync(result.get("policy_version"))
+            except Exception as e:
+                logger.error("Policy sync failed, keeping cached policies: %s", e)
             if threat_eval.get("is_threat"):
                 logger.warning("THREAT DETECTED: %s", threat_eval.get("reasons"))
             else:
@@ -114,6 +120,10 @@ def send_telemetry(payload):
 def run_cycle():
     """Single collect-and-send cycle."""
     logger.info("--- Collecting telemetry ---")
+    try:
+        ioc.refresh()
+    except Exception as e:
+        logger.error("IOC bundle refresh failed, keeping the current one: %s", e)
     payload = collect_telemetry()
     send_telemetry(payload)
 
@@ -0,0 +1,92 @@
+"""
+Policy Cache
+Local copy of the organization's policy bundle, kept on disk so the agent
+enforces the last known policies across restarts and while offline.
+
+The backend reports its current policy version in every ingest response;
+the bundle is only re-fetched when that differs from the cached one, and
+then usually as a delta.
+"""
+import json
+import logging
+import os
+import sys
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from config import SERVER_URL, API_BASE, API_KEY, POLICY_CACHE_PATH
+
+logger = logging.getLogger("ocsafe-agent")
+
+_bundle = None
+
+
+def current():
+    """The cached bundle ({"version", "policies"}), or None before the first sync."""
+    global _bundle
+    if _bundle is None and os.path.exists(POLICY_CACHE_PATH):
+        try:
+            with open(POLICY_CACHE_PATH, encoding="utf-8") as f:
+                _bundle = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Ignoring unreadable policy cache %s: %s", POLICY_CACHE_PATH, e)
+    return _bundle
+
+
+def blocked_processes():
+    """Lower-cased process names blocked by any policy."""
+    bundle = current()
+    if not bundle:
+        return set()
+    return {
+        name.lower()
+        for policy in bundle["policies"]
+        for name in (policy.get("rules") or {}).get("blocked_processes", [])
+    }
+
+
+def _save(bundle):
+    global _bundle
+    tmp_path = POLICY_CACHE_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(bundle, f)
+    os.replace(tmp_path, POLICY_CACHE_PATH)
+    _bundle = bundle
+
+
+def sync(version=None):
+    """
+    Bring the cache up to date. With the version from an ingest response,
+    nothing is fetched when it matches the cached bundle.
+    """
+    bundle = current()
+    if bundle is not None and version is not None and version == bundle["version"]:
+        return
+
+    url = f"{SERVER_URL}{API_BASE}/policies/bundle"
+    headers = {"X-API-Key": API_KEY}
+    if bundle is not None:
+        headers["If-None-Match"] = f'"{bundle["version"]}"'
+
+    resp = requests.get(url, headers=headers, timeout=10)
+    if resp.status_code == 304:
+        return
+    resp.raise_for_status()
+    data = resp.json()
+
+    if resp.headers.get("X-Policy-Delta-Base"):
+        if bundle is None or data["base"] != bundle["version"]:
+            # Cache changed underneath us; ask for the full bundle
+            headers.pop("If-None-Match", None)
+            resp = requests.get(url, headers=headers, timeout=10)
+            resp.raise_for_status()
+            data = resp.json()
+        else:
+            removed = set(data["removed"])
+            policies = {p["id"]: p for p in bundle["policies"] if p["id"] not in removed}
+            policies.update((p["id"], p) for p in data["upserted"])
+            data = {"version": data["version"], "policies": [policies[k] for k in sorted(policies)]}
+
+    _save(data)
+    logger.info("Policies updated to %s (%d policies)", data["version"], len(data["policies"]))
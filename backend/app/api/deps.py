@@ -4,14 +4,39 @@ from jose import jwt, JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.db.session import get_db
+from app.core.metrics import registry
+from app.db.session import get_db, get_ingest_db
 from app.models.core import User, APIKey
 from app.core.security_keys import verify_api_key
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
+# Column values of recently authenticated users, keyed by user id.
+# Invalidated when a user is removed or their role changes.
+_user_cache = TTLCache(maxsize=settings.USER_CACHE_MAX_ENTRIES, ttl=settings.USER_CACHE_TTL_SECONDS)
+_user_columns = [column.key for column in User.__table__.columns]
+
+user_cache_hits = registry.counter(
+    "ocsafe_user_cache_hits_total", "Authenticated requests served from the user cache (one saved query each)"
+)
+user_cache_misses = registry.counter(
+    "ocsafe_user_cache_misses_total", "Authenticated requests that had to load the user from the database"
+)
+registry.gauge(
+    "ocsafe_user_cache_hit_ratio", "Hit ratio of the authenticated-user cache",
+    function=lambda: _user_cache.hit_rate,
+)
+registry.gauge(
+    "ocsafe_user_cache_entries", "Users currently held in the authenticated-user cache",
+    function=lambda: len(_user_cache),
+)
+
+def invalidate_cached_user(user_id: int) -> None:
+    _user_cache.pop(user_id)
+
 async def get_current_user(
     db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)
 ) -> User:
@@ -30,10 +55,19 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    result = await db.execute(select(User).where(User.id == int(user_id)))
+    user_id = int(user_id)
+    cached = _user_cache.get(user_id)
+    if cached is not None:
+        user_cache_hits.inc()
+        # Fresh transient instance per request, nothing shared between sessions
+        return User(**cached)
+
+    user_cache_misses.inc()
+    result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalars().first()
     if user is None:
         raise credentials_exception
+    _user_cache.set(user_id, {column: getattr(user, column) for column in _user_columns})
     return user
 
 async def get_current_active_user(
@@ -52,9 +86,12 @@ async def get_current_admin_user(
     return current_user
 
 async def verify_api_key_dependency(
-    api_key: str = Security(api_key_header), db: AsyncSession = Depends(get_db)
+    api_key: str = Security(api_key_header), db: AsyncSession = Depends(get_ingest_db)
 ) -> APIKey:
-    """Validates an incoming API Key header. Used for server-to-server or SDK calls."""
+    """
+    Validates an incoming API Key header. Used for server-to-server or SDK calls.
+    API-key traffic comes from agents, so it runs on the ingest pool.
+    """
     if not api_key:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
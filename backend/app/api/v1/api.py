@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, api_keys, devices, policies, telemetry, dashboard, alerts, clients, users, audit_logs
+from app.api.v1.endpoints import auth, api_keys, devices, policies, telemetry, dashboard, alerts, clients, users, audit_logs, search, network
 
 api_router = APIRouter()
 
@@ -13,3 +13,5 @@ api_router.include_router(alerts.router, prefix="/alerts", tags=["alerts"])
 api_router.include_router(clients.router, prefix="/clients", tags=["clients"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(audit_logs.router, prefix="/audit-logs", tags=["audit_logs"])
+api_router.include_router(search.router, prefix="/search", tags=["search"])
+api_router.include_router(network.router, prefix="/network", tags=["network"])
@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
 from app.db.session import get_db
 from app.models.core import User
+from app.services.correlation import correlation_engine
 
 router = APIRouter()
 
@@ -31,6 +32,15 @@ async def list_alerts(
         ]
     }
 
+@router.get("/campaigns")
+async def list_campaign_alerts(
+    current_user: User = Depends(deps.get_current_active_user)
+):
+    """
+    Recent fleet-wide campaign alerts from the correlation engine, newest first.
+    """
+    return {"alerts": correlation_engine.recent(current_user.organization_id)}
+
 @router.put("/{alert_id}/resolve")
 async def resolve_alert(
     alert_id: str,
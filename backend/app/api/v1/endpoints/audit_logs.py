@@ -1,11 +1,17 @@
+import base64
+import csv
+import io
+import json
 from typing import List
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import desc
+from sqlalchemy import desc, tuple_
 
 from app.api import deps
-from app.db.session import get_db
+from app.core.config import settings
+from app.db.session import get_read_db, replica_router
 from app.models.core import AuditLog, User
 from pydantic import BaseModel
 from datetime import datetime
@@ -13,30 +19,139 @@ from typing import Optional
 
 router = APIRouter()
 
+EXPORT_COLUMNS = ("id", "created_at", "user_id", "action", "target_type", "target_id", "details", "ip_address")
+
 class AuditLogSchema(BaseModel):
     id: int
     user_id: Optional[int]
     action: str
+    target_type: Optional[str]
+    target_id: Optional[str]
     details: Optional[str]
     ip_address: Optional[str]
     created_at: datetime
-    
+
     class Config:
         from_attributes = True
 
+
+def _encode_cursor(entry: AuditLog) -> str:
+    return base64.urlsafe_b64encode(f"{entry.created_at.isoformat()}|{entry.id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, _, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition("|")
+        return datetime.fromisoformat(created_at), int(entry_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _filtered(
+    organization_id: int,
+    user_id: Optional[int],
+    action: Optional[str],
+    target_type: Optional[str],
+    target_id: Optional[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+):
+    """Newest first; (created_at, id) order makes every position a stable cursor."""
+    query = (
+        select(AuditLog)
+        .where(AuditLog.organization_id == organization_id)
+        .order_by(desc(AuditLog.created_at), desc(AuditLog.id))
+    )
+    if user_id is not None:
+        query = query.where(AuditLog.user_id == user_id)
+    if action:
+        query = query.where(AuditLog.action.istartswith(action, autoescape=True))
+    if target_type is not None:
+        query = query.where(AuditLog.target_type == target_type)
+    if target_id is not None:
+        query = query.where(AuditLog.target_id == target_id)
+    if since is not None:
+        query = query.where(AuditLog.created_at >= since)
+    if until is not None:
+        query = query.where(AuditLog.created_at < until)
+    return query
+
+
 @router.get("/", response_model=List[AuditLogSchema])
 async def get_audit_logs(
-    limit: int = 50,
-    db: AsyncSession = Depends(get_db),
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor of the previous page"),
+    user_id: Optional[int] = None,
+    action: Optional[str] = Query(default=None, description="Action prefix, e.g. 'user.' or 'policy.created'"),
+    target_type: Optional[str] = None,
+    target_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db),
     current_admin: User = Depends(deps.get_current_admin_user)
 ):
     """
-    Fetch the most recent audit logs for the organization (Admin only).
+    Fetch audit logs for the organization, newest first (Admin only).
+    When more entries match, the X-Next-Cursor response header holds the
+    cursor for the next page. Non-critical entries are written in batches
+    and show up within AUDIT_FLUSH_INTERVAL_SECONDS.
     """
-    result = await db.execute(
-        select(AuditLog)
-        .where(AuditLog.organization_id == current_admin.organization_id)
-        .order_by(desc(AuditLog.created_at))
-        .limit(limit)
+    query = _filtered(current_admin.organization_id, user_id, action, target_type, target_id, since, until)
+    if cursor:
+        created_at, entry_id = _decode_cursor(cursor)
+        query = query.where(tuple_(AuditLog.created_at, AuditLog.id) < tuple_(created_at, entry_id))
+
+    result = await db.execute(query.limit(limit + 1))
+    entries = result.scalars().all()
+    if len(entries) > limit:
+        entries = entries[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(entries[-1])
+    return entries
+
+
+@router.get("/export")
+async def export_audit_logs(
+    format: str = Query(default="csv", pattern="^(csv|jsonl)$"),
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    target_type: Optional[str] = None,
+    target_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_admin: User = Depends(deps.get_current_admin_user)
+):
+    """
+    Stream every matching audit entry as CSV or JSON lines, newest first,
+    read with a server-side cursor in EXPORT_BATCH_SIZE batches.
+    """
+    query = _filtered(current_admin.organization_id, user_id, action, target_type, target_id, since, until)
+    query = query.with_only_columns(*(getattr(AuditLog, column) for column in EXPORT_COLUMNS))
+
+    def encode(rows) -> bytes:
+        if format == "jsonl":
+            return "".join(
+                json.dumps({**row._asdict(), "created_at": row.created_at.isoformat()}) + "\n" for row in rows
+            ).encode("utf-8")
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            (row.id, row.created_at.isoformat(), *row[2:]) for row in rows
+        )
+        return buffer.getvalue().encode("utf-8")
+
+    async def body():
+        if format == "csv":
+            yield (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+        # Not the request's session: the stream outlives the endpoint call
+        async with replica_router.session() as db:
+            stream = await db.stream(query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+            async for rows in stream.partitions():
+                yield encode(rows)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"audit-{current_admin.organization_id}-{datetime.utcnow():%Y%m%d}.{format}"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
-    return result.scalars().all()
@@ -1,71 +1,92 @@
 from typing import List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
-from app.db.session import get_db
+from app.core.response_cache import response_cache
+from app.db.session import get_read_db
 from app.models.core import User
+from app.services.presence import presence_tracker, presence_history
+from app.services.security_score import security_score
+from app.services import threat_counters
 
 router = APIRouter()
 
 @router.get("/score")
 async def get_security_score(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_active_user)
 ):
     """
     Returns the overall device security score (e.g., 85/100)
     for the main dashboard gauge.
+    Score is 100 minus the average latest risk score across devices.
     """
-    # TODO: Implement actual calculation logic
-    # Blank structure for frontend integration
-    return {
-        "score": 0,
-        "max_score": 100,
-        "status_label": ""  # e.g., "Good - Secure"
-    }
+    organization_id = current_user.organization_id
+
+    async def build():
+        return await security_score.get_score(db, organization_id)
+
+    return await response_cache.respond(request, organization_id, "dashboard", build)
 
 @router.get("/analytics/threats")
 async def get_threats_analytics(
-    days: int = 7,
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    days: int = Query(default=7, ge=1, le=90),
+    granularity: str = Query(default="day", pattern="^(day|hour)$"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_active_user)
 ):
     """
     Returns data for the 'Threats Detected (Last X Days)' line chart.
+    Read from the pre-aggregated threat counters, one row per bucket.
     """
-    # TODO: Fetch from MongoDB active_threats/telemetry_logs
-    return {
-        "labels": [], # e.g., [1, 2, 3, 4, 5, 6, 7]
-        "data": []    # e.g., [15, 30, 25, 70, 40, 50, 60]
-    }
+    organization_id = current_user.organization_id
+
+    async def build():
+        return await threat_counters.threat_series(db, organization_id, days, granularity)
+
+    return await response_cache.respond(request, organization_id, "dashboard", build)
 
 @router.get("/analytics/devices")
 async def get_devices_analytics(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    days: int = Query(default=7, ge=1, le=90),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_active_user)
 ):
     """
     Returns data for the 'Devices Online vs Offline' bar charts.
-    Provides data over months or specific time periods.
+    Current counts come from the in-memory presence tracker; the series
+    is the daily average of the persisted presence snapshots.
     """
-    # TODO: Implement aggregation
-    return {
-        "labels": [],           # e.g., ["January", "February", ...]
-        "online_series": [],    # e.g., [4, 2, 4, 4, 3, 1]
-        "offline_series": []    # e.g., [5, 3, 1, 5, 5, 1]
-    }
+    organization_id = current_user.organization_id
+
+    async def build():
+        history = await presence_history(db, organization_id, days)
+        return {
+            "labels": [point["label"] for point in history],
+            "online_series": [point["online"] for point in history],
+            "offline_series": [point["offline"] for point in history],
+            "current": presence_tracker.counts(organization_id),
+        }
+
+    return await response_cache.respond(request, organization_id, "dashboard", build)
 
 @router.get("/analytics/risk-distribution")
 async def get_risk_distribution(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    days: int = Query(default=30, ge=1, le=90),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_active_user)
 ):
     """
     Returns data for the 'Risk Distribution' pie chart.
+    Counts threat evaluations per risk bucket over the last N days.
     """
-    # TODO: Aggregate risk levels
-    return {
-        "low": 0,
-        "medium": 0,
-        "high": 0
-    }
+    organization_id = current_user.organization_id
+
+    async def build():
+        return await threat_counters.risk_distribution(db, organization_id, days)
+
+    return await response_cache.respond(request, organization_id, "dashboard", build)
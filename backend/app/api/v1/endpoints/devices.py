@@ -1,20 +1,31 @@
+import asyncio
+import json
 from typing import List
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.api import deps
-from app.db.session import get_db
-from app.models.core import Device, APIKey, DeviceAction, AuditLog
-from app.schemas.core import Device as DeviceSchema, DeviceCreate, DeviceActionCreate, DeviceAction as DeviceActionSchema
+from app.core.config import settings
+from app.core.response_cache import response_cache
+from app.db.session import AsyncSessionLocal, get_db, get_ingest_db, get_read_db
+from app.models.core import Device, APIKey, DeviceAction
+from app.schemas.core import (
+    Device as DeviceSchema, DeviceCreate, DeviceActionCreate, DeviceAction as DeviceActionSchema,
+    BulkDeviceActionCreate, BulkDeviceActionResult, DeviceActionAck,
+)
+from app.services import action_batches, action_queue
+from app.services.audit import AuditAction, AuditEvent, audit_writer, request_ip
+from app.services.heartbeats import heartbeat_buffer
+from app.services.presence import presence_tracker
 
 router = APIRouter()
 
 @router.post("/enroll", response_model=DeviceSchema)
 async def enroll_device(
     *,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_ingest_db),
     device_in: DeviceCreate,
     api_key: APIKey = Depends(deps.verify_api_key_dependency)
 ):
@@ -36,49 +47,58 @@ async def enroll_device(
     db.add(db_device)
     await db.commit()
     await db.refresh(db_device)
+    presence_tracker.register(db_device.organization_id, db_device.id)
+    response_cache.invalidate(db_device.organization_id, "devices", "telemetry", "dashboard")
     return db_device
 
 @router.post("/{device_id}/heartbeat")
 async def device_heartbeat(
     device_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_ingest_db),
     api_key: APIKey = Depends(deps.verify_api_key_dependency)
 ):
     """
     Receive heartbeat from the OS agent to mark it as online.
+    The timestamp is buffered and flushed to the database in bulk.
     """
     result = await db.execute(
-        select(Device).where(
+        select(Device.id).where(
             Device.id == device_id, 
             Device.organization_id == api_key.organization_id
         )
     )
-    device = result.scalars().first()
-    
-    if not device:
+    if result.scalar() is None:
         raise HTTPException(status_code=404, detail="Device not found")
         
-    device.last_heartbeat = datetime.utcnow()
-    db.add(device)
-    await db.commit()
+    heartbeat_buffer.record(device_id)
+    presence_tracker.touch(api_key.organization_id, device_id)
     
     return {"status": "ok", "message": "Heartbeat updated"}
 
 @router.get("/", response_model=List[DeviceSchema])
 async def list_devices(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
     current_user = Depends(deps.get_current_active_user)
 ):
     """List devices in the admin dashboard (User token auth)"""
-    result = await db.execute(
-        select(Device).where(Device.organization_id == current_user.organization_id)
-    )
-    return result.scalars().all()
+    organization_id = current_user.organization_id
+
+    async def build():
+        result = await db.execute(
+            select(Device).where(Device.organization_id == organization_id)
+        )
+        devices = result.scalars().all()
+        heartbeat_buffer.apply(devices)
+        return [DeviceSchema.model_validate(device) for device in devices]
+
+    return await response_cache.respond(request, organization_id, "devices", build)
 
 @router.post("/{device_id}/action", response_model=DeviceActionSchema)
 async def dispatch_device_action(
     device_id: int,
     action_in: DeviceActionCreate,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_admin = Depends(deps.get_current_admin_user)
 ):
@@ -101,37 +121,140 @@ async def dispatch_device_action(
         status="pending"
     )
     db.add(db_action)
-    
-    # Log the audit action
-    audit_log = AuditLog(
+    await db.flush()
+
+    audit_writer.record(db, AuditEvent(
+        AuditAction.DEVICE_ACTION_DISPATCHED,
         organization_id=current_admin.organization_id,
         user_id=current_admin.id,
-        action=f"Dispatched '{action_in.action_type}' to device {device.hostname}",
-    )
-    db.add(audit_log)
-    
+        target_type="device",
+        target_id=device.id,
+        details={"action_id": db_action.id, "action_type": action_in.action_type, "hostname": device.hostname},
+        ip_address=request_ip(request),
+    ))
+
     await db.commit()
     await db.refresh(db_action)
     return db_action
 
+@router.post("/actions/bulk", response_model=BulkDeviceActionResult)
+async def dispatch_bulk_action(
+    action_in: BulkDeviceActionCreate,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_admin = Depends(deps.get_current_admin_user)
+):
+    """
+    Admin commands every device matching a selection (ids, os_type,
+    device_status, a running process or a remote endpoint) at once.
+    Process and remote selectors match every device's latest telemetry as
+    of the returned telemetry_as_of. Follow the returned batch with
+    /actions/batches/{batch_id}.
+    """
+    try:
+        device_ids, resolution = await action_batches.resolve_targets(db, current_admin.organization_id, action_in)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not device_ids:
+        raise HTTPException(status_code=404, detail="No devices match the selection")
+    batch_id = await action_batches.dispatch(
+        db, current_admin.organization_id, current_admin.id, action_in, device_ids, resolution, request_ip(request)
+    )
+    return {"batch_id": batch_id, "action_type": action_in.action_type, "targeted": len(device_ids), **resolution}
+
+@router.get("/actions/batches/{batch_id}")
+async def get_action_batch(
+    batch_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(deps.get_current_active_user)
+):
+    """Pending / completed / failed counts of a bulk dispatch."""
+    report = await action_batches.progress(db, current_user.organization_id, batch_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return report
+
+@router.get("/actions/batches/{batch_id}/stream")
+async def stream_action_batch(
+    batch_id: str,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(deps.get_current_active_user)
+):
+    """
+    Server-Sent Events: a `progress` event whenever the batch's counts
+    change, ending once no action is pending.
+    """
+    organization_id = current_user.organization_id
+    report = await action_batches.progress(db, organization_id, batch_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    # Don't hold a pooled connection for the lifetime of the stream
+    await db.close()
+
+    async def body():
+        current = report
+        yield f"event: progress\ndata: {json.dumps(current)}\n\n".encode()
+        idle = 0.0
+        while not current["done"]:
+            await asyncio.sleep(settings.BULK_ACTION_PROGRESS_INTERVAL_SECONDS)
+            async with AsyncSessionLocal() as session:
+                latest = await action_batches.progress(session, organization_id, batch_id)
+            if latest is None:
+                break
+            if latest != current:
+                current, idle = latest, 0.0
+                yield f"event: progress\ndata: {json.dumps(current)}\n\n".encode()
+            else:
+                idle += settings.BULK_ACTION_PROGRESS_INTERVAL_SECONDS
+                if idle >= settings.LIVE_KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield b": ping\n\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/{device_id}/pending-actions", response_model=List[DeviceActionSchema])
 async def get_pending_actions(
     device_id: int,
-    db: AsyncSession = Depends(get_db),
+    limit: int = Query(default=settings.ACTION_CLAIM_BATCH, ge=1, le=100),
+    db: AsyncSession = Depends(get_ingest_db),
     api_key: APIKey = Depends(deps.verify_api_key_dependency)
 ):
     """
     OS Agent fetches actions it needs to execute.
+    Each returned action is leased to the agent for ACTION_LEASE_SECONDS;
+    unless acknowledged by then it is returned again on a later poll.
     """
-    result = await db.execute(select(Device).where(
+    result = await db.execute(select(Device.id).where(
         Device.id == device_id,
         Device.organization_id == api_key.organization_id
     ))
-    if not result.scalars().first():
+    if result.scalar() is None:
         raise HTTPException(status_code=404, detail="Device not found")
-        
-    actions = await db.execute(select(DeviceAction).where(
-        DeviceAction.device_id == device_id,
-        DeviceAction.status == "pending"
+
+    return await action_queue.claim(db, device_id, limit)
+
+@router.post("/{device_id}/actions/ack")
+async def acknowledge_actions(
+    device_id: int,
+    acks: List[DeviceActionAck],
+    db: AsyncSession = Depends(get_ingest_db),
+    api_key: APIKey = Depends(deps.verify_api_key_dependency)
+):
+    """
+    OS Agent reports actions as completed or failed (with an optional
+    result). Acknowledging an already finished action is a no-op.
+    """
+    result = await db.execute(select(Device.id).where(
+        Device.id == device_id,
+        Device.organization_id == api_key.organization_id
     ))
-    return actions.scalars().all()
+    if result.scalar() is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    if not acks:
+        return {"acknowledged": [], "ignored": []}
+
+    return await action_queue.ack(db, device_id, [ack.model_dump() for ack in acks])
@@ -0,0 +1,94 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api import deps
+from app.core.config import settings
+from app.core.response_cache import response_cache
+from app.db.session import get_read_db
+from app.models.core import User
+from app.services.network_sketches import network_sketches
+
+router = APIRouter()
+
+HOURS = Query(default=1, ge=1, le=settings.SKETCH_RETENTION_DAYS * 24)
+LIMIT = Query(default=20, ge=1, le=settings.SKETCH_TOP_K)
+
+
+@router.get("/top-endpoints")
+async def top_endpoints(
+    request: Request,
+    hours: int = HOURS,
+    limit: int = LIMIT,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Most frequently observed remote endpoints (ip:port) across the fleet.
+    Counts are sketch estimates: never under, over by a small fraction of the total.
+    """
+    organization_id = current_user.organization_id
+
+    async def build():
+        window = await network_sketches.merged(db, organization_id, hours)
+        return {
+            "hours": hours,
+            "total_observations": window.endpoints.sketch.total,
+            "endpoints": [{"endpoint": key, "observations": count} for key, count in window.endpoints.top(limit)],
+        }
+
+    return await response_cache.respond(request, organization_id, "network", build)
+
+
+@router.get("/top-ports")
+async def top_ports(
+    request: Request,
+    hours: int = HOURS,
+    limit: int = LIMIT,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Most frequently reported listening ports across the fleet.
+    """
+    organization_id = current_user.organization_id
+
+    async def build():
+        window = await network_sketches.merged(db, organization_id, hours)
+        return {
+            "hours": hours,
+            "total_observations": window.ports.sketch.total,
+            "ports": [{"port": key, "observations": count} for key, count in window.ports.top(limit)],
+        }
+
+    return await response_cache.respond(request, organization_id, "network", build)
+
+
+@router.get("/distinct-ips")
+async def distinct_external_ips(
+    request: Request,
+    hours: int = HOURS,
+    limit: int = Query(default=20, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Estimated distinct external IPs contacted by the fleet, and the devices
+    that contacted the most.
+    """
+    organization_id = current_user.organization_id
+
+    async def build():
+        window = await network_sketches.merged(db, organization_id, hours)
+        devices = sorted(
+            ((device_id, hll.count()) for device_id, hll in window.device_ips.items()),
+            key=lambda item: (-item[1], item[0]),
+        )
+        return {
+            "hours": hours,
+            "fleet_distinct_external_ips": window.external_ips.count(),
+            "devices": [
+                {"device_id": device_id, "distinct_external_ips": count} for device_id, count in devices[:limit]
+            ],
+        }
+
+    return await response_cache.respond(request, organization_id, "network", build)
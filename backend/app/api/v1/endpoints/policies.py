@@ -1,18 +1,23 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.api import deps
-from app.db.session import get_db
-from app.models.core import Policy, User, Device, AuditLog
+from app.core.response_cache import response_cache
+from app.db.session import get_db, get_ingest_db, get_read_db
+from app.models.core import Policy, User, Device
 from app.schemas.core import Policy as PolicySchema, PolicyCreate
+from app.services.audit import AuditAction, AuditEvent, audit_writer, request_ip
+from app.services.ioc_bundle import ioc_bundles
+from app.services.policy_bundle import policy_bundles
 
 router = APIRouter()
 
 @router.post("/", response_model=PolicySchema)
 async def create_policy(
     *,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     policy_in: PolicyCreate,
     current_user: User = Depends(deps.get_current_active_user)
@@ -27,34 +32,45 @@ async def create_policy(
         organization_id=policy_in.organization_id
     )
     db.add(db_policy)
-    
-    # Log the action
-    audit_log = AuditLog(
+    await db.flush()
+
+    audit_writer.record(db, AuditEvent(
+        AuditAction.POLICY_CREATED,
         organization_id=current_user.organization_id,
         user_id=current_user.id,
-        action=f"Created policy '{policy_in.name}'",
-    )
-    db.add(audit_log)
+        target_type="policy",
+        target_id=db_policy.id,
+        details={"name": policy_in.name},
+        ip_address=request_ip(request),
+    ))
 
     await db.commit()
     await db.refresh(db_policy)
+    response_cache.invalidate(db_policy.organization_id, "policies")
+    policy_bundles.invalidate(db_policy.organization_id)
     return db_policy
 
 @router.get("/", response_model=List[PolicySchema])
 async def list_policies(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_active_user)
 ):
     """List all policies for the admin dashboard"""
-    result = await db.execute(
-        select(Policy).where(Policy.organization_id == current_user.organization_id)
-    )
-    return result.scalars().all()
+    organization_id = current_user.organization_id
+
+    async def build():
+        result = await db.execute(
+            select(Policy).where(Policy.organization_id == organization_id)
+        )
+        return [PolicySchema.model_validate(policy) for policy in result.scalars().all()]
+
+    return await response_cache.respond(request, organization_id, "policies", build)
 
 @router.get("/device/{device_id}", response_model=List[PolicySchema])
 async def get_device_policies(
     device_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_ingest_db),
     # Using API Key authentication so the Agent itself can fetch policies
     api_key = Depends(deps.verify_api_key_dependency)
 ):
@@ -72,7 +88,61 @@ async def get_device_policies(
         
     # In a full system, you might map policies specifically to devices.
     # For now, return all org policies to the device.
-    policies = await db.execute(
-        select(Policy).where(Policy.organization_id == api_key.organization_id)
-    )
-    return policies.scalars().all()
+    bundle = await policy_bundles.current(db, api_key.organization_id)
+    return list(bundle.policies.values())
+
+@router.get("/bundle")
+async def get_policy_bundle(
+    request: Request,
+    db: AsyncSession = Depends(get_ingest_db),
+    api_key = Depends(deps.verify_api_key_dependency)
+):
+    """
+    Versioned policy bundle for agents (see app/services/policy_bundle.py).
+    Agents send their bundle's ETag in If-None-Match and get a 304 when it's
+    current, a delta (X-Policy-Delta-Base header) when their version is still
+    retained, or the full bundle otherwise. Ingest responses carry the
+    current version as "policy_version", so agents only ask when it changed.
+    """
+    organization_id = api_key.organization_id
+    bundle = await policy_bundles.current(db, organization_id)
+    headers = {"ETag": f'"{bundle.version}"', "Cache-Control": "private, no-cache"}
+
+    have = (request.headers.get("if-none-match") or "").strip().removeprefix("W/").strip('"')
+    if have == bundle.version:
+        return Response(status_code=304, headers=headers)
+
+    if have:
+        delta = policy_bundles.delta(organization_id, have, bundle)
+        if delta is not None:
+            headers["X-Policy-Delta-Base"] = have
+            return Response(content=delta, media_type="application/json", headers=headers)
+
+    return Response(content=bundle.body, media_type="application/json", headers=headers)
+
+@router.get("/ioc-bundle")
+async def get_ioc_bundle(
+    request: Request,
+    api_key = Depends(deps.verify_api_key_dependency)
+):
+    """
+    Binary IOC bundle for agent-side matching (format in app/services/ioc_bundle.py).
+    Agents send their bundle's ETag in If-None-Match and get a 304 when it's
+    current, a delta (X-IOC-Delta-Base header) when their version is still
+    retained, or the full bundle otherwise.
+    """
+    version, bundle = await ioc_bundles.current()
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    have = (request.headers.get("if-none-match") or "").strip().removeprefix("W/").strip('"')
+    if have == version:
+        return Response(status_code=304, headers=headers)
+
+    if have:
+        delta = await ioc_bundles.delta(have, version)
+        if delta is not None:
+            headers["X-IOC-Delta-Base"] = have
+            return Response(content=delta, media_type="application/vnd.ocsafe.ioc-delta", headers=headers)
+
+    return Response(content=bundle, media_type="application/vnd.ocsafe.ioc-bundle", headers=headers)
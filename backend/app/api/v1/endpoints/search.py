@@ -0,0 +1,71 @@
+from typing import List
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.api import deps
+from app.db.session import get_read_db
+from app.models.core import Device, User
+from app.services.fleet_index import fleet_index
+from app.services.presence import presence_tracker
+
+router = APIRouter()
+
+
+async def _matches(db: AsyncSession, organization_id: int, kind: str, term: str, limit: int):
+    await fleet_index.ensure_loaded(db, organization_id)
+    device_ids = fleet_index.search(organization_id, kind, term)
+
+    devices: List[dict] = []
+    if device_ids:
+        result = await db.execute(
+            select(Device.id, Device.hostname, Device.os_type)
+            .where(Device.id.in_(device_ids[:limit]), Device.organization_id == organization_id)
+            .order_by(Device.id)
+        )
+        devices = [
+            {"device_id": device_id, "hostname": hostname, "os_type": os_type,
+             "online": presence_tracker.is_online(device_id)}
+            for device_id, hostname, os_type in result.all()
+        ]
+    return {"kind": kind, "query": term, "total": len(device_ids), "devices": devices}
+
+
+@router.get("/processes")
+async def search_processes(
+    name: str = Query(..., min_length=1, description='Process name, e.g. "psexec.exe"; trailing * for prefix'),
+    limit: int = Query(default=500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Devices currently running a process (case-insensitive), from each
+    device's latest telemetry.
+    """
+    return await _matches(db, current_user.organization_id, "process", name, limit)
+
+
+@router.get("/connections")
+async def search_connections(
+    remote: str = Query(..., min_length=1, description='"ip:port", or a bare "ip" for any port'),
+    limit: int = Query(default=500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Devices with an established connection to a remote endpoint.
+    """
+    return await _matches(db, current_user.organization_id, "remote", remote, limit)
+
+
+@router.get("/ports")
+async def search_ports(
+    port: int = Query(..., ge=0, le=65535),
+    limit: int = Query(default=500, ge=1, le=5000),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Devices listening on a port.
+    """
+    return await _matches(db, current_user.organization_id, "port", str(port), limit)
@@ -1,28 +1,61 @@
-from typing import Dict, Any
+import asyncio
+import json
+from typing import Dict, Any, Optional
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import desc
+from sqlalchemy import Text, cast, desc
 
 from app.api import deps
-from app.db.session import get_db
+from app.core.metrics import SIZE_BUCKETS, registry
+from app.core.response_cache import response_cache
+from app.core.serialization import FastJSONResponse, RawJSONResponse
+from app.core.config import settings
+from app.db.session import get_db, get_ingest_db, get_read_db, replica_router
 from app.models.core import Device, APIKey, User, TelemetryLog
+from app.services.correlation import correlation_engine
+from app.services.fleet_index import fleet_index
+from app.services.heartbeats import heartbeat_buffer
+from app.services.live_telemetry import live_telemetry
+from app.services.metric_store import metric_store
+from app.services.network_sketches import network_sketches
+from app.services.policy_bundle import policy_bundles
+from app.services.presence import presence_tracker
+from app.services.security_score import security_score
+from app.services.telemetry_archive import telemetry_archive
+from app.services import telemetry_export, threat_counters
 from app.services.threat_engine import threat_engine
 
 router = APIRouter()
 
+ingest_payload_bytes = registry.histogram(
+    "ocsafe_ingest_payload_bytes", "Size of telemetry payloads received", buckets=SIZE_BUCKETS
+)
+threat_evaluation_duration = registry.histogram(
+    "ocsafe_threat_evaluation_duration_seconds", "Threat engine evaluation time per payload"
+)
+
+# Long-running exports hold a database connection each; cap them per worker
+_export_slots = asyncio.Semaphore(settings.EXPORT_MAX_CONCURRENT)
+
 
 @router.post("/ingest")
 async def ingest_telemetry(
+    request: Request,
     payload: Dict[str, Any],
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_ingest_db),
     api_key: APIKey = Depends(deps.verify_api_key_dependency)
 ):
     """
     Accepts telemetry from OS Agents.
     Stores in PostgreSQL and evaluates against the Threat Engine.
     """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        ingest_payload_bytes.observe(int(content_length))
+
     device_id = payload.get("device_id")
     if not device_id:
         raise HTTPException(status_code=400, detail="Missing device_id")
@@ -37,12 +70,13 @@ async def ingest_telemetry(
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
 
-    # Update device heartbeat
-    device.last_heartbeat = datetime.utcnow()
-    db.add(device)
+    # Update device heartbeat (buffered, flushed in bulk)
+    heartbeat_buffer.record(device.id)
+    presence_tracker.touch(device.organization_id, device.id)
 
     # Evaluate threats
-    eval_result = threat_engine.evaluate_telemetry(device.id, payload)
+    with threat_evaluation_duration.time():
+        eval_result = threat_engine.evaluate_telemetry(device.id, payload)
 
     # Store in PostgreSQL
     log = TelemetryLog(
@@ -52,109 +86,259 @@ async def ingest_telemetry(
         threat_evaluation=eval_result,
     )
     db.add(log)
+    await threat_counters.record(db, api_key.organization_id, eval_result)
     await db.commit()
 
-    return {"status": "ingested", "threat_evaluation": eval_result}
+    security_score.update(api_key.organization_id, device.id, eval_result["risk_score"], log.id)
+    fleet_index.update(api_key.organization_id, device.id, payload, log.id)
+    correlation_engine.observe(api_key.organization_id, device.id, payload, eval_result)
+    network_sketches.observe(api_key.organization_id, device.id, payload)
+    live_telemetry.record(api_key.organization_id, device.id, payload)
+    metric_store.append(api_key.organization_id, device.id, payload)
+    response_cache.touch(api_key.organization_id, "telemetry", "dashboard")
+
+    # Agents re-fetch policies only when this differs from their cached bundle
+    policy_bundle = await policy_bundles.current(db, api_key.organization_id)
+    return {"status": "ingested", "threat_evaluation": eval_result, "policy_version": policy_bundle.version}
 
 
 @router.get("/latest/{device_id}")
 async def get_latest_telemetry(
     device_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_active_user),
 ):
     """
     Get the most recent telemetry for a device.
+    The stored payload is passed through as-is, without decoding it.
     """
     result = await db.execute(
-        select(TelemetryLog)
+        select(TelemetryLog.id, cast(TelemetryLog.payload, Text))
         .where(TelemetryLog.device_id == device_id)
         .order_by(desc(TelemetryLog.created_at))
         .limit(1)
     )
-    log = result.scalars().first()
+    row = result.first()
 
-    if not log:
+    if not row:
         return {"message": "No telemetry data available", "data": None}
 
-    return {"data": log.payload}
+    return RawJSONResponse('{"data":%s}' % (row[1] or "null"))
 
 
 @router.get("/history/{device_id}")
 async def get_telemetry_history(
     device_id: int,
     hours: int = Query(default=24, le=168),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_active_user),
 ):
     """
     Get telemetry history for charts (last N hours).
+    Served from the compressed metric chunks; payloads (archived or in
+    telemetry_log) are only read for the part of the range that predates them.
     """
     since = datetime.utcnow() - timedelta(hours=hours)
-    result = await db.execute(
-        select(TelemetryLog)
-        .where(
-            TelemetryLog.device_id == device_id,
-            TelemetryLog.created_at >= since
-        )
-        .order_by(TelemetryLog.created_at)
-        .limit(500)
-    )
-    logs = result.scalars().all()
+    samples, chunks_start = await metric_store.history(db, device_id, since)
 
-    history = []
-    for log in logs:
-        system_data = (log.payload or {}).get("system", {})
-        history.append({
-            "timestamp": log.created_at.isoformat() if log.created_at else "",
+    def point(created_at, system_data):
+        system_data = system_data or {}
+        return {
+            "timestamp": created_at.isoformat() if created_at else "",
             "cpu_percent": system_data.get("cpu_percent", 0),
             "ram_percent": system_data.get("ram_percent", 0),
             "disk_percent": system_data.get("disk_percent", 0),
+        }
+
+    history = []
+    if chunks_start is None or chunks_start > since:
+        async for records in telemetry_archive.records(
+            current_user.organization_id, device_id, since, chunks_start or datetime.utcnow()
+        ):
+            history.extend(point(r["created_at"], (r["payload"] or {}).get("system")) for r in records)
+
+        # Only the "system" section is charted; don't load the full payloads
+        query = (
+            select(TelemetryLog.created_at, TelemetryLog.payload["system"])
+            .where(
+                TelemetryLog.device_id == device_id,
+                TelemetryLog.created_at >= since
+            )
+            .order_by(TelemetryLog.created_at)
+            .limit(500)
+        )
+        if chunks_start is not None:
+            query = query.where(TelemetryLog.created_at < chunks_start)
+        history.extend(point(created_at, system_data) for created_at, system_data in await db.execute(query))
+        history = history[:500]
+
+    for sample in samples[:500 - len(history)]:
+        history.append({
+            "timestamp": sample["timestamp"],
+            "cpu_percent": sample["cpu_percent"] or 0,
+            "ram_percent": sample["ram_percent"] or 0,
+            "disk_percent": sample["disk_percent"] or 0,
         })
 
-    return {"device_id": device_id, "hours": hours, "data": history}
+    return FastJSONResponse({"device_id": device_id, "hours": hours, "data": history})
+
+
+@router.get("/live/{device_id}")
+async def get_live_telemetry(
+    device_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Recent samples for the device's live charts, from memory.
+    """
+    if not await live_telemetry.ensure_loaded(db, current_user.organization_id, device_id):
+        raise HTTPException(status_code=404, detail="Device not found")
+    return FastJSONResponse({"device_id": device_id, "data": live_telemetry.samples(device_id)})
+
+
+@router.get("/live/{device_id}/stream")
+async def stream_live_telemetry(
+    request: Request,
+    device_id: int,
+    # The same session as the user lookup, so both are released below
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Server-Sent Events: a `snapshot` of the buffered samples, then a
+    `sample` event per ingested payload. Event ids are sample timestamps in
+    milliseconds, so a reconnecting EventSource (Last-Event-ID) only gets
+    the samples it missed.
+    """
+    if not await live_telemetry.ensure_loaded(db, current_user.organization_id, device_id):
+        raise HTTPException(status_code=404, detail="Device not found")
+    # Don't hold a pooled connection for the lifetime of the stream
+    await db.close()
+
+    last_event_id = request.headers.get("last-event-id", "")
+    after_id = int(last_event_id) if last_event_id.isdigit() else 0
+    # Subscribe before the snapshot so no sample falls between the two
+    queue = live_telemetry.subscribe(device_id)
+    snapshot = live_telemetry.samples(device_id, after_id)
+
+    def event(name: str, data: Any, event_id: Optional[int] = None) -> bytes:
+        head = f"id: {event_id}\n" if event_id is not None else ""
+        return f"{head}event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+    async def body():
+        try:
+            yield event("snapshot", snapshot, snapshot[-1]["id"] if snapshot else None)
+            last_id = snapshot[-1]["id"] if snapshot else after_id
+            while True:
+                try:
+                    sample = await asyncio.wait_for(queue.get(), settings.LIVE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield b": ping\n\n"
+                    continue
+                if sample["id"] > last_id:
+                    last_id = sample["id"]
+                    yield event("sample", sample, sample["id"])
+        finally:
+            live_telemetry.unsubscribe(device_id, queue)
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/summary")
 async def get_org_telemetry_summary(
-    db: AsyncSession = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(deps.get_current_active_user),
 ):
     """
     Get latest telemetry per device for the admin fleet overview.
     """
-    # Get all devices in the org
-    device_result = await db.execute(
-        select(Device).where(Device.organization_id == current_user.organization_id)
-    )
-    devices = device_result.scalars().all()
-
-    results = []
-    for device in devices:
-        # Get latest telemetry for each device
-        log_result = await db.execute(
-            select(TelemetryLog)
-            .where(TelemetryLog.device_id == device.id)
+    organization_id = current_user.organization_id
+
+    async def build():
+        # Every device in the org with the sections of its latest telemetry
+        # the overview shows, in one round trip
+        latest_log_id = (
+            select(TelemetryLog.id)
+            .where(TelemetryLog.device_id == Device.id)
             .order_by(desc(TelemetryLog.created_at))
             .limit(1)
+            .correlate(Device)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            select(Device, TelemetryLog.payload["system"], TelemetryLog.payload["security"])
+            .outerjoin(TelemetryLog, TelemetryLog.id == latest_log_id)
+            .where(Device.organization_id == organization_id)
         )
-        log = log_result.scalars().first()
+        rows = result.all()
+        heartbeat_buffer.apply([device for device, _, _ in rows])
 
-        payload = log.payload if log else {}
-        system_data = payload.get("system", {})
-        security_data = payload.get("security", {})
+        results = []
+        for device, system_data, security_data in rows:
+            system_data = system_data or {}
+            security_data = security_data or {}
 
-        results.append({
-            "device_id": device.id,
-            "hostname": system_data.get("hostname", device.hostname or "Unknown"),
-            "os_type": device.os_type or system_data.get("os_name", ""),
-            "status": device.status,
-            "cpu_percent": system_data.get("cpu_percent", 0),
-            "ram_percent": system_data.get("ram_percent", 0),
-            "disk_percent": system_data.get("disk_percent", 0),
-            "firewall_enabled": security_data.get("firewall_enabled", False),
-            "antivirus_enabled": security_data.get("antivirus_enabled", False),
-            "last_seen": device.last_heartbeat.isoformat() if device.last_heartbeat else "",
-        })
+            results.append({
+                "device_id": device.id,
+                "hostname": system_data.get("hostname", device.hostname or "Unknown"),
+                "os_type": device.os_type or system_data.get("os_name", ""),
+                "status": device.status,
+                "online": presence_tracker.is_online(device.id),
+                "cpu_percent": system_data.get("cpu_percent", 0),
+                "ram_percent": system_data.get("ram_percent", 0),
+                "disk_percent": system_data.get("disk_percent", 0),
+                "firewall_enabled": security_data.get("firewall_enabled", False),
+                "antivirus_enabled": security_data.get("antivirus_enabled", False),
+                "last_seen": device.last_heartbeat.isoformat() if device.last_heartbeat else "",
+            })
+
+        return {"devices": results, "total": len(results)}
+
+    return await response_cache.respond(request, organization_id, "telemetry", build)
+
+
+@router.get("/export")
+async def export_telemetry(
+    format: str = Query(default="parquet", pattern="^(csv|arrow|parquet)$"),
+    device_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """
+    Stream the organization's telemetry (optionally one device and a
+    [since, until) range) as CSV, Arrow IPC stream or Parquet.
+    Defaults to the last 7 days.
+    """
+    if format not in telemetry_export.available_formats():
+        raise HTTPException(status_code=400, detail=f"{format} export is not available on this server")
+    if _export_slots.locked():
+        raise HTTPException(status_code=429, detail="Too many exports in progress, retry later")
 
-    return {"devices": results, "total": len(results)}
+    if since is None:
+        since = (until or datetime.utcnow()) - timedelta(days=7)
+    query = telemetry_export.export_query(current_user.organization_id, device_id, since, until)
+    archived = telemetry_export.archived_batches(current_user.organization_id, device_id, since, until)
+
+    async def body():
+        async with _export_slots:
+            # Not the request's session: the stream outlives the endpoint call
+            async with replica_router.session() as db:
+                async for chunk in telemetry_export.export_chunks(db, query, format, archived):
+                    yield chunk
+
+    media_type, extension = telemetry_export.FORMATS[format]
+    scope = f"{current_user.organization_id}-{device_id}" if device_id else f"{current_user.organization_id}"
+    filename = f"telemetry-{scope}-{since:%Y%m%d}.{extension}"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
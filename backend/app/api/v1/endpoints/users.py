@@ -1,19 +1,20 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.api import deps
-from app.db.session import get_db
-from app.models.core import User, AuditLog
+from app.db.session import get_db, get_read_db
+from app.models.core import User
 from app.schemas.core import User as UserSchema, UserCreate
 from app.core import security
+from app.services.audit import AuditAction, AuditEvent, audit_writer, request_ip
 
 router = APIRouter()
 
 @router.get("/", response_model=List[UserSchema])
 async def list_users(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_admin: User = Depends(deps.get_current_admin_user)
 ):
     """
@@ -27,6 +28,7 @@ async def list_users(
 @router.delete("/{user_id}")
 async def remove_user(
     user_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_admin: User = Depends(deps.get_current_admin_user)
 ):
@@ -44,22 +46,26 @@ async def remove_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
         
-    # Log the action
-    audit_log = AuditLog(
+    audit_writer.record(db, AuditEvent(
+        AuditAction.USER_REMOVED,
         organization_id=current_admin.organization_id,
         user_id=current_admin.id,
-        action=f"Removed user {user.email}",
-    )
-    db.add(audit_log)
-    
+        target_type="user",
+        target_id=user.id,
+        details={"email": user.email},
+        ip_address=request_ip(request),
+    ))
+
     await db.delete(user)
     await db.commit()
+    deps.invalidate_cached_user(user_id)
     return {"message": "User removed successfully"}
 
 @router.put("/{user_id}/role")
 async def change_user_role(
     user_id: int,
     role: str,
+    request: Request,
     db: AsyncSession = Depends(get_db),
     current_admin: User = Depends(deps.get_current_admin_user)
 ):
@@ -82,14 +88,17 @@ async def change_user_role(
         
     user.role = role
     
-    # Log the action
-    audit_log = AuditLog(
+    audit_writer.record(db, AuditEvent(
+        AuditAction.USER_ROLE_CHANGED,
         organization_id=current_admin.organization_id,
         user_id=current_admin.id,
-        action=f"Changed user {user.email} role to {role}",
-    )
-    db.add(audit_log)
+        target_type="user",
+        target_id=user.id,
+        details={"email": user.email, "role": role},
+        ip_address=request_ip(request),
+    ))
     db.add(user)
     await db.commit()
+    deps.invalidate_cached_user(user_id)
     
     return {"message": f"User role updated to {role}"}
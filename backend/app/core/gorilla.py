@@ -0,0 +1,178 @@
+"""
+Gorilla time-series compression (Pelkonen et al., VLDB 2015): timestamps
+as delta-of-deltas and float values XORed with their predecessor, packed
+into one bitstream per chunk. Regular reporting intervals cost about one
+bit per timestamp, and unchanged values one bit each.
+
+A chunk holds rows of (epoch seconds, value per column), appended in
+time order. The bitstream does not record its length; readers pass the
+row count, which is stored alongside the chunk.
+"""
+import math
+import struct
+from typing import List, Optional, Sequence, Tuple
+
+_DOUBLE = struct.Struct(">d")
+_NAN_BITS = int.from_bytes(_DOUBLE.pack(math.nan), "big")
+
+# Delta-of-delta buckets: (prefix, prefix bits, value bits); the value is
+# stored offset by the bucket's lower bound, so it is never negative
+_DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+
+def _float_bits(value: float) -> int:
+    return int.from_bytes(_DOUBLE.pack(value), "big")
+
+
+class BitWriter:
+    def __init__(self):
+        self.buffer = bytearray()
+        self._pending = 0  # bits not yet in buffer
+        self._pending_bits = 0
+
+    def write(self, value: int, bits: int) -> None:
+        self._pending = (self._pending << bits) | value
+        self._pending_bits += bits
+        while self._pending_bits >= 8:
+            self._pending_bits -= 8
+            self.buffer.append((self._pending >> self._pending_bits) & 0xFF)
+        self._pending &= (1 << self._pending_bits) - 1
+
+    def getvalue(self) -> bytes:
+        if not self._pending_bits:
+            return bytes(self.buffer)
+        return bytes(self.buffer) + bytes(((self._pending << (8 - self._pending_bits)) & 0xFF,))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.buffer) + (1 if self._pending_bits else 0)
+
+
+class ChunkEncoder:
+    """Appends rows to a chunk; `getvalue()` may be called between appends."""
+
+    def __init__(self, columns: int):
+        self.columns = columns
+        self.count = 0
+        self.first_timestamp: Optional[int] = None
+        self.last_timestamp: Optional[int] = None
+        self._writer = BitWriter()
+        self._delta = 0
+        self._values = [0] * columns
+        # Per column (leading zeros, trailing zeros) of the last stored XOR
+        self._windows: List[Optional[Tuple[int, int]]] = [None] * columns
+
+    def append(self, timestamp: int, values: Sequence[float]) -> None:
+        write = self._writer.write
+        if self.count == 0:
+            write(timestamp & 0xFFFFFFFFFFFFFFFF, 64)
+            self.first_timestamp = timestamp
+        else:
+            delta = timestamp - self.last_timestamp
+            self._write_dod(delta - self._delta)
+            self._delta = delta
+        self.last_timestamp = timestamp
+
+        for column, value in enumerate(values):
+            bits = _float_bits(value) if value == value else _NAN_BITS
+            xor = bits ^ self._values[column]
+            self._values[column] = bits
+            if not xor:
+                write(0, 1)
+                continue
+            leading = min(64 - xor.bit_length(), 31)
+            trailing = (xor & -xor).bit_length() - 1
+            window = self._windows[column]
+            if window is not None and leading >= window[0] and trailing >= window[1]:
+                # Meaningful bits fit in the previous window
+                write(0b10, 2)
+                write(xor >> window[1], 64 - window[0] - window[1])
+            else:
+                significant = 64 - leading - trailing
+                write(0b11, 2)
+                write(leading, 5)
+                write(significant & 63, 6)  # 64 is stored as 0
+                write(xor >> trailing, significant)
+                self._windows[column] = (leading, trailing)
+        self.count += 1
+
+    def _write_dod(self, dod: int) -> None:
+        write = self._writer.write
+        if dod == 0:
+            write(0, 1)
+            return
+        for prefix, prefix_bits, value_bits in _DOD_BUCKETS:
+            low = -(1 << (value_bits - 1)) + 1
+            if low <= dod <= 1 << (value_bits - 1):
+                write(prefix, prefix_bits)
+                write(dod - low, value_bits)
+                return
+        write(0b1111, 4)
+        write(dod & 0xFFFFFFFF, 32)
+
+    def getvalue(self) -> bytes:
+        return self._writer.getvalue()
+
+    @property
+    def nbytes(self) -> int:
+        return self._writer.nbytes
+
+
+def decode(data: bytes, count: int, columns: int) -> List[Tuple[int, Tuple[Optional[float], ...]]]:
+    """The chunk's rows as (timestamp, values), with NaN values as None."""
+    # The chunk as a '0'/'1' string: testing single bits and parsing fields
+    # with int(..., 2) is several times faster than shifting integers
+    bits = format(int.from_bytes(data, "big"), "0%db" % (len(data) * 8)) if data else ""
+    unpack = _DOUBLE.unpack
+    rows = []
+    position = timestamp = delta = 0
+    previous = [0] * columns
+    decoded: List[Optional[float]] = [0.0] * columns
+    windows = [(0, 0)] * columns
+    try:
+        for index in range(count):
+            if index == 0:
+                timestamp = int(bits[:64], 2)
+                position = 64
+            elif bits[position] == "0":
+                timestamp += delta
+                position += 1
+            else:
+                position += 1
+                for _, _, value_bits in _DOD_BUCKETS:
+                    if bits[position] == "0":
+                        dod = int(bits[position + 1:position + 1 + value_bits], 2) - (1 << (value_bits - 1)) + 1
+                        position += 1 + value_bits
+                        break
+                    position += 1
+                else:
+                    dod = int(bits[position:position + 32], 2)
+                    position += 32
+                    if dod >= 1 << 31:
+                        dod -= 1 << 32
+                delta += dod
+                timestamp += delta
+
+            for column in range(columns):
+                if bits[position] == "0":
+                    position += 1
+                    continue
+                if bits[position + 1] == "1":
+                    leading = int(bits[position + 2:position + 7], 2)
+                    significant = int(bits[position + 7:position + 13], 2) or 64
+                    windows[column] = (leading, 64 - leading - significant)
+                    position += 13
+                else:
+                    position += 2
+                leading, trailing = windows[column]
+                end = position + 64 - leading - trailing
+                previous[column] ^= int(bits[position:end], 2) << trailing
+                position = end
+                value = unpack(previous[column].to_bytes(8, "big"))[0]
+                decoded[column] = None if value != value else value
+            rows.append((timestamp, tuple(decoded)))
+    except (IndexError, ValueError):
+        position = len(bits) + 1
+    if position > len(bits):
+        raise ValueError("Chunk is truncated")
+    return rows
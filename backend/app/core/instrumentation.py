@@ -0,0 +1,197 @@
+"""
+Hot-path instrumentation: per-route request latency, per-request database
+query counts and time, and SQLAlchemy cursor hooks. Everything records into
+app.core.metrics and is exposed on /metrics.
+
+Opt-in diagnostics (see app/core/config.py) hang off the same hooks: slow
+queries are logged with their EXPLAIN plan, and requests that repeat the
+same query shape many times (N+1 access patterns) are logged as warnings.
+"""
+import logging
+import re
+import time
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.core.metrics import COUNT_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+request_duration = registry.histogram(
+    "ocsafe_http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+requests_total = registry.counter(
+    "ocsafe_http_requests_total", "HTTP requests by route and status class", ("method", "route", "status")
+)
+request_db_queries = registry.histogram(
+    "ocsafe_http_request_db_queries", "Database queries issued per request", ("route",),
+    buckets=COUNT_BUCKETS,
+)
+request_db_seconds = registry.histogram(
+    "ocsafe_http_request_db_seconds", "Time spent in the database per request", ("route",)
+)
+db_query_duration = registry.histogram(
+    "ocsafe_db_query_duration_seconds", "Duration of individual database queries", ("pool",)
+)
+slow_queries = registry.counter(
+    "ocsafe_db_slow_queries_total", "Queries slower than SLOW_QUERY_THRESHOLD_MS", ("pool",)
+)
+n_plus_one_requests = registry.counter(
+    "ocsafe_http_n_plus_one_total", "Requests that repeated one query shape N_PLUS_ONE_THRESHOLD times",
+    ("route",),
+)
+
+# Plan-only EXPLAIN per dialect; never ANALYZE, which would run the query again
+_EXPLAIN_PREFIX = {"postgresql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}
+
+_WHITESPACE = re.compile(r"\s+")
+# Expanded IN lists / VALUES tuples of placeholders, e.g. ($1, $2, $3) or (?, ?)
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\$\d+|%s|\?|:\w+)(?:\s*,\s*(?:\$\d+|%s|\?|:\w+))*\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+
+
+def statement_shape(statement: str) -> str:
+    """Normalise a statement so queries differing only in parameters compare equal."""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _PLACEHOLDER_LIST.sub("(?)", shape)
+    return _NUMBER.sub("?", shape)
+
+
+class RequestStats:
+    """Mutable per-request accumulator (shared into SQLAlchemy's greenlets)."""
+    __slots__ = ("queries", "db_seconds", "shapes")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        # Statement shape -> executions, only kept when N+1 detection is on
+        self.shapes: Optional[StatementCounter] = (
+            StatementCounter() if settings.N_PLUS_ONE_THRESHOLD else None
+        )
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    """
+    Plan for a statement that just ran, fetched on a fresh DBAPI cursor of the
+    same connection so the plan sees the same transaction state. The raw cursor
+    bypasses SQLAlchemy's events, so this doesn't recurse into the hooks.
+    """
+    prefix = _EXPLAIN_PREFIX.get(conn.dialect.name)
+    if prefix is None:
+        return None
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _log_slow_query(conn, statement: str, parameters, elapsed: float, pool: str) -> None:
+    slow_queries.inc(pool=pool)
+    plan = None
+    # Only SELECTs: a failed EXPLAIN of a write could abort the caller's transaction
+    if settings.SLOW_QUERY_EXPLAIN and statement.lstrip()[:6].upper() == "SELECT":
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception as e:
+            plan = f"(EXPLAIN failed: {e})"
+    logger.warning(
+        "Slow query on %s pool (%.1f ms): %s%s",
+        pool, elapsed * 1000, _WHITESPACE.sub(" ", statement).strip(),
+        f"\n{plan}" if plan else "",
+    )
+
+
+def instrument_engine(engine, pool: str) -> None:
+    """Attach query timing hooks to an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    # The start time lives on the statement's execution context, not the
+    # pooled connection, so a statement that raises leaves nothing behind
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context.ocsafe_query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.ocsafe_query_start
+        db_query_duration.observe(elapsed, pool=pool)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+            if stats.shapes is not None:
+                stats.shapes[statement_shape(statement)] += 1
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold and elapsed * 1000 >= threshold and not executemany:
+            _log_slow_query(conn, statement, parameters, elapsed, pool)
+
+
+def route_label(scope) -> str:
+    """
+    Route template for the matched endpoint, e.g. /api/v1/devices/{device_id}/heartbeat.
+    Routes in included routers only know their own path, so the router prefix
+    is recovered from the leading segments of the concrete request path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    segments = scope["path"].split("/")
+    prefix = "/".join(segments[:max(len(segments) - template.count("/"), 0)])
+    return prefix + template
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no per-request Request/Response objects)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            route = route_label(scope)
+            method = scope["method"]
+            request_duration.observe(elapsed, method=method, route=route)
+            requests_total.inc(method=method, route=route, status=f"{status_code // 100}xx")
+            request_db_queries.observe(stats.queries, route=route)
+            request_db_seconds.observe(stats.db_seconds, route=route)
+            if stats.shapes:
+                _check_n_plus_one(stats.shapes, method, route)
+
+
+def _check_n_plus_one(shapes: StatementCounter, method: str, route: str) -> None:
+    repeated = [(shape, count) for shape, count in shapes.most_common()
+                if count >= settings.N_PLUS_ONE_THRESHOLD]
+    if not repeated:
+        return
+    n_plus_one_requests.inc(route=route)
+    for shape, count in repeated:
+        logger.warning("Possible N+1 in %s %s: %d executions of %s", method, route, count, shape)
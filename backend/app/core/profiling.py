@@ -0,0 +1,119 @@
+"""
+Opt-in per-request sampling profiler. Stacks are written in the folded
+format ("outer;inner;leaf count" per line) that flamegraph.pl and speedscope
+read directly.
+
+The sampler records the event loop thread, so concurrent requests handled by
+the same worker show up in the same profile; profile on a quiet worker (or
+with a single request in flight) for a clean picture. Time spent awaiting the
+database appears under the event loop's selector frames.
+"""
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+from app.core.config import settings
+from app.core.instrumentation import route_label
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-ocsafe-profile"
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every `interval` seconds from a helper thread."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="ocsafe-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self.stacks[self._fold(frame)] += 1
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _write_profile(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that ask for it with the X-OCSafe-Profile header (only
+    honoured when PROFILING_ENABLED) or every request with PROFILE_ALL_REQUESTS.
+    The profile's file name is returned in the X-OCSafe-Profile response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _wanted(scope) -> bool:
+        if settings.PROFILE_ALL_REQUESTS:
+            return True
+        if not settings.PROFILING_ENABLED:
+            return False
+        return any(name == PROFILE_HEADER for name, _ in scope["headers"])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        filename = "%d-%s-%s.folded" % (
+            time.time() * 1000, scope["method"], re.sub(r"[^A-Za-z0-9_.-]+", "_", scope["path"]).strip("_"),
+        )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_HEADER, filename.encode("latin-1"))
+                ]
+            await send(message)
+
+        profiler = SamplingProfiler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            path = os.path.join(settings.PROFILE_OUTPUT_DIR, filename)
+            await asyncio.to_thread(_write_profile, path, profiler.folded())
+            logger.info(
+                "Profiled %s %s: %d samples -> %s",
+                scope["method"], route_label(scope), sum(profiler.stacks.values()), path,
+            )
@@ -0,0 +1,92 @@
+import hashlib
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.serialization import dumps
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+class ResponseCache:
+    """
+    Caches serialized JSON bodies of read endpoints per organization and query.
+    Writes invalidate a namespace (e.g. "devices") for one organization by
+    bumping its version, which orphans every cached key built on the old one.
+    High-frequency writes (telemetry ingest) touch() instead, which bumps at
+    most once per TTL so a steadily reporting fleet doesn't defeat the cache.
+    Each body carries a strong ETag so polling clients get 304s.
+
+    The cache is per worker process; the TTL bounds staleness for changes
+    that don't invalidate explicitly (heartbeats, other workers' writes).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._ttl = ttl
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[Tuple[int, str], int] = {}
+        # Monotonic time of the last bump by touch()
+        self._touched: Dict[Tuple[int, str], float] = {}
+
+    def invalidate(self, organization_id: int, *namespaces: str) -> None:
+        for namespace in namespaces:
+            key = (organization_id, namespace)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def touch(self, organization_id: int, *namespaces: str) -> None:
+        """
+        Invalidate, at most once per TTL per namespace. Entries built since
+        the last bump expire within the TTL anyway, so staleness stays bounded.
+        """
+        now = time.monotonic()
+        for namespace in namespaces:
+            key = (organization_id, namespace)
+            if now - self._touched.get(key, float("-inf")) >= self._ttl:
+                self._touched[key] = now
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _key(self, request: Request, organization_id: int, namespace: str) -> tuple:
+        return (
+            organization_id,
+            namespace,
+            self._versions.get((organization_id, namespace), 0),
+            request.url.path,
+            tuple(sorted(request.query_params.multi_items())),
+        )
+
+    async def respond(
+        self,
+        request: Request,
+        organization_id: int,
+        namespace: str,
+        build: Callable[[], Awaitable[Any]],
+    ) -> Response:
+        """Serve from cache (or build and cache), honouring If-None-Match."""
+        key = self._key(request, organization_id, namespace)
+        entry = self._entries.get(key)
+        if entry is None:
+            body = dumps(await build())
+            etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+            entry = (etag, body)
+            self._entries.set(key, entry)
+
+        etag, body = entry
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+response_cache = ResponseCache(
+    maxsize=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,58 @@
+"""
+Fast JSON encoding for API responses and JSON columns. Uses orjson when it
+is installed and falls back to the standard library otherwise.
+"""
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    # Pydantic models, ORM-derived schemas, Decimals, ...
+    return jsonable_encoder(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON. datetimes are ISO 8601, as with jsonable_encoder."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content), separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
+
+
+def dumps_str(content: Any) -> str:
+    """str variant for SQLAlchemy's json_serializer."""
+    return dumps(content).decode("utf-8")
+
+
+def loads(data) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Default response class. Returning one directly from an endpoint also
+    skips FastAPI's jsonable_encoder pass, which dominates on large bodies.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(JSONResponse):
+    """Response whose content is already-encoded JSON (e.g. a JSON column read as text)."""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, str):
+            return content.encode("utf-8")
+        return content
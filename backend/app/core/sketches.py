@@ -0,0 +1,182 @@
+"""
+Mergeable streaming sketches: Count-Min with heavy-hitter tracking and
+HyperLogLog. Both merge losslessly (cell-wise sum / register-wise max), so
+sketches built by different workers or for different windows combine into
+the sketch of the union.
+"""
+import hashlib
+import math
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class CountMinSketch:
+    """
+    depth x width counters; a key's estimate is its minimum counter, which
+    never undercounts and overcounts by at most e/width of the total with
+    probability 1 - e^-depth.
+    """
+
+    def __init__(self, width: int, depth: int, table: Optional[np.ndarray] = None):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint32) if table is None else table
+        self._row_offsets = np.arange(depth, dtype=np.uint64)[:, None]
+
+    def _cells(self, hashes: np.ndarray) -> np.ndarray:
+        """Flat (depth, n) indices into the table, one row per hash function."""
+        h1 = hashes & _MASK32
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        columns = (h1 + self._row_offsets * h2) % np.uint64(self.width)
+        return (columns + self._row_offsets * np.uint64(self.width)).astype(np.intp)
+
+    def add(self, hashes: np.ndarray) -> np.ndarray:
+        """Add each hash (once per occurrence); returns their new estimates."""
+        cells = self._cells(hashes)
+        flat = self.table.reshape(-1)
+        np.add.at(flat, cells.reshape(-1), 1)
+        return flat[cells].min(axis=0)
+
+    def estimate(self, hashes: np.ndarray) -> np.ndarray:
+        return self.table.reshape(-1)[self._cells(hashes)].min(axis=0)
+
+    def merge(self, other: "CountMinSketch") -> None:
+        self.table += other.table
+
+    def copy(self) -> "CountMinSketch":
+        return CountMinSketch(self.width, self.depth, self.table.copy())
+
+    @property
+    def total(self) -> int:
+        return int(self.table[0].sum())
+
+
+class TopK:
+    """
+    Heavy hitters over a Count-Min sketch. Keeps up to 4k candidate keys
+    with their last estimate and prunes back to the best 2k when full, so a
+    key that becomes heavy later is picked up as soon as it is seen again.
+    """
+
+    def __init__(self, k: int, width: int, depth: int, sketch: Optional[CountMinSketch] = None):
+        self.k = k
+        self.sketch = sketch or CountMinSketch(width, depth)
+        self.candidates: Dict[Hashable, int] = {}
+
+    def add(self, keys: Sequence[Hashable]) -> None:
+        if not keys:
+            return
+        hashes = np.fromiter((hash64(str(key)) for key in keys), dtype=np.uint64, count=len(keys))
+        estimates = self.sketch.add(hashes)
+        self.candidates.update(zip(keys, estimates.tolist()))
+        if len(self.candidates) > 4 * self.k:
+            self._prune(2 * self.k)
+
+    def _prune(self, size: int) -> None:
+        best = sorted(self.candidates.items(), key=lambda item: item[1], reverse=True)[:size]
+        self.candidates = dict(best)
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        """Heaviest keys with fresh estimates, heaviest first."""
+        if not self.candidates:
+            return []
+        keys = list(self.candidates)
+        hashes = np.fromiter((hash64(str(key)) for key in keys), dtype=np.uint64, count=len(keys))
+        ranked = sorted(zip(keys, self.sketch.estimate(hashes).tolist()), key=lambda item: (-item[1], str(item[0])))
+        return ranked[:n or self.k]
+
+    def merge(self, other: "TopK") -> None:
+        self.sketch.merge(other.sketch)
+        for key in other.candidates:
+            self.candidates.setdefault(key, 0)
+        self.candidates = dict(self.top(2 * self.k))
+
+    def copy(self) -> "TopK":
+        copy = TopK(self.k, self.sketch.width, self.sketch.depth, self.sketch.copy())
+        copy.candidates = dict(self.candidates)
+        return copy
+
+
+class HyperLogLog:
+    """
+    Distinct-count estimate in 2^p one-byte registers (standard error about
+    1.04 / sqrt(2^p)). Registers stay in a dict until 1/32 of them are set,
+    so the many small sets (e.g. per device) stay well under 2^p bytes.
+    """
+
+    def __init__(self, p: int, registers: Optional[np.ndarray] = None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers
+        self.sparse: Dict[int, int] = {}
+
+    def add(self, values: Iterable[str]) -> None:
+        for value in values:
+            self.add_hash(hash64(value))
+
+    def add_hash(self, h: int) -> None:
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = 64 - self.p - rest.bit_length() + 1
+        if self.registers is not None:
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+        elif rank > self.sparse.get(index, 0):
+            self.sparse[index] = rank
+            if len(self.sparse) > self.m // 32:
+                self._densify()
+
+    def _densify(self) -> None:
+        self.registers = self.to_array()
+        self.sparse = {}
+
+    def to_array(self) -> np.ndarray:
+        """Dense registers (a copy when sparse)."""
+        if self.registers is not None:
+            return self.registers
+        registers = np.zeros(self.m, dtype=np.uint8)
+        if self.sparse:
+            registers[list(self.sparse)] = list(self.sparse.values())
+        return registers
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if self.registers is None and other.registers is None:
+            for index, rank in other.sparse.items():
+                if rank > self.sparse.get(index, 0):
+                    self.sparse[index] = rank
+            if len(self.sparse) > self.m // 32:
+                self._densify()
+            return
+        if self.registers is None:
+            self._densify()
+        np.maximum(self.registers, other.to_array(), out=self.registers)
+
+    def copy(self) -> "HyperLogLog":
+        copy = HyperLogLog(self.p, None if self.registers is None else self.registers.copy())
+        copy.sparse = dict(self.sparse)
+        return copy
+
+    def count(self) -> int:
+        if self.registers is not None:
+            zeros = int(np.count_nonzero(self.registers == 0))
+            harmonic = float(np.ldexp(1.0, -self.registers.astype(np.int32)).sum())
+        else:
+            zeros = self.m - len(self.sparse)
+            harmonic = zeros + sum(math.ldexp(1.0, -rank) for rank in self.sparse.values())
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / harmonic
+        if estimate <= 2.5 * self.m and zeros:
+            # Small-range correction (linear counting)
+            estimate = self.m * math.log(self.m / zeros)
+        return round(estimate)
+
+    @property
+    def nbytes(self) -> int:
+        return self.m if self.registers is not None else 16 * len(self.sparse)
@@ -1,6 +1,12 @@
 from typing import List, Dict
 from fastapi import WebSocket
 
+from app.core.metrics import registry
+
+broadcast_duration = registry.histogram(
+    "ocsafe_ws_broadcast_duration_seconds", "Time to fan a message out to an organization's sockets"
+)
+
 class ConnectionManager:
     def __init__(self):
         # Maps organization_id to a list of active WebSockets
@@ -18,7 +24,16 @@ class ConnectionManager:
 
     async def broadcast_to_org(self, message: str, organization_id: int):
         if organization_id in self.active_connections:
-            for connection in self.active_connections[organization_id]:
-                await connection.send_text(message)
+            with broadcast_duration.time():
+                for connection in self.active_connections[organization_id]:
+                    await connection.send_text(message)
+
+    def connection_count(self) -> int:
+        return sum(len(connections) for connections in self.active_connections.values())
 
 manager = ConnectionManager()
+
+registry.gauge(
+    "ocsafe_ws_connections", "Open SOC alert WebSocket connections",
+    function=manager.connection_count,
+)
@@ -1,6 +1,30 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
+from app.core.instrumentation import instrument_engine
+from app.core.metrics import registry
+from app.core.serialization import dumps_str, loads
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id() -> str:
+    """
+    Identity of this worker process, for tables where each worker upserts
+    its own rows (network sketches, metric chunks) and readers merge them.
+    """
+    # Resolved per call: workers may fork after this module is imported
+    return f"{socket.gethostname()}:{os.getpid()}"
 
 # Construct PostgreSQL Async Database URL
 SQLALCHEMY_DATABASE_URL = (
@@ -8,12 +32,84 @@ SQLALCHEMY_DATABASE_URL = (
     f"{settings.POSTGRES_SERVER}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
 )
 
-engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL,
-    echo=True,  # Set to False in production
-    future=True
+pool_checkouts = registry.counter(
+    "ocsafe_db_pool_checkouts_total", "Connections checked out of the pool", ("pool",)
+)
+pool_wait_seconds = registry.counter(
+    "ocsafe_db_pool_wait_seconds_total", "Time spent waiting for a pooled connection", ("pool",)
+)
+pool_timeouts = registry.counter(
+    "ocsafe_db_pool_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT_SECONDS", ("pool",)
+)
+
+# Engines by pool label, read on scrape (a pool may be recreated on dispose)
+_engines: Dict[str, AsyncEngine] = {}
+
+
+def _instrumented_pool_class(name: str):
+    """Queue pool that records checkout wait time under the given pool label."""
+
+    class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except exc.TimeoutError:
+                pool_timeouts.inc(pool=name)
+                raise
+            finally:
+                pool_wait_seconds.inc(time.perf_counter() - start, pool=name)
+            pool_checkouts.inc(pool=name)
+            return connection
+
+    return InstrumentedQueuePool
+
+
+def create_engine_for(name: str, pool_size: int, max_overflow: int, url: str = SQLALCHEMY_DATABASE_URL):
+    engine = create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        future=True,
+        poolclass=_instrumented_pool_class(name),
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        # JSON columns (telemetry payloads) encode/decode through orjson
+        json_serializer=dumps_str,
+        json_deserializer=loads,
+        connect_args={
+            # SQLAlchemy's own prepared statement cache (per connection)
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+            # asyncpg's statement cache
+            "statement_cache_size": settings.DB_ASYNCPG_STATEMENT_CACHE_SIZE,
+        },
+    )
+    instrument_engine(engine, pool=name)
+    _engines[name] = engine
+    return engine
+
+
+registry.gauge(
+    "ocsafe_db_pool_checked_out", "Connections currently checked out", ("pool",),
+    function=lambda: {(name,): e.sync_engine.pool.checkedout() for name, e in _engines.items()},
+)
+registry.gauge(
+    "ocsafe_db_pool_size", "Connections currently held by the pool", ("pool",),
+    function=lambda: {
+        (name,): e.sync_engine.pool.checkedin() + e.sync_engine.pool.checkedout()
+        for name, e in _engines.items()
+    },
 )
 
+# Dashboard / admin traffic
+engine = create_engine_for("default", settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
+
+# Agent traffic (telemetry ingest, heartbeats, action polling), isolated so
+# heavy dashboard queries can't starve it of connections and vice versa
+ingest_engine = create_engine_for("ingest", settings.INGEST_DB_POOL_SIZE, settings.INGEST_DB_MAX_OVERFLOW)
+
 AsyncSessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
@@ -22,9 +118,114 @@ AsyncSessionLocal = sessionmaker(
     autocommit=False,
 )
 
+IngestSessionLocal = sessionmaker(
+    bind=ingest_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+    autocommit=False,
+)
+
+# Replication lag in seconds; 0 on a primary or a fully caught-up replica
+_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+read_sessions_routed = registry.counter(
+    "ocsafe_db_read_sessions_total", "Read-only sessions by target", ("target",)
+)
+
+
+class ReplicaRouter:
+    """
+    Hands out read-only sessions bound to a replica whose replication lag is
+    within REPLICA_MAX_LAG_SECONDS, round-robin, falling back to the primary
+    when no replica is configured or healthy. Lag is checked by a background
+    loop, never on the request path.
+    """
+
+    def __init__(self, urls: List[str]):
+        self._replicas = []
+        for index, url in enumerate(urls):
+            name = f"replica{index}"
+            replica_engine = create_engine_for(name, settings.REPLICA_DB_POOL_SIZE, 0, url=url)
+            factory = sessionmaker(
+                bind=replica_engine, class_=AsyncSession,
+                expire_on_commit=False, autoflush=False, autocommit=False,
+            )
+            self._replicas.append((name, replica_engine, factory))
+        self._lag: Dict[str, Optional[float]] = {name: None for name, _, _ in self._replicas}
+        self._healthy: List[tuple] = []
+        self._round_robin = itertools.count()
+
+    async def _check(self, replica_engine) -> Optional[float]:
+        try:
+            async with replica_engine.connect() as connection:
+                return float(await asyncio.wait_for(
+                    connection.scalar(_REPLICA_LAG_SQL), timeout=settings.REPLICA_CHECK_INTERVAL_SECONDS
+                ))
+        except Exception as e:
+            logger.warning("Replica health check failed: %s", e)
+            return None
+
+    async def refresh(self) -> None:
+        healthy = []
+        for name, replica_engine, factory in self._replicas:
+            lag = await self._check(replica_engine)
+            self._lag[name] = lag
+            if lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS:
+                healthy.append((name, factory))
+        self._healthy = healthy
+
+    def session(self) -> AsyncSession:
+        if self._healthy:
+            name, factory = self._healthy[next(self._round_robin) % len(self._healthy)]
+            read_sessions_routed.inc(target=name)
+            return factory()
+        read_sessions_routed.inc(target="primary")
+        return AsyncSessionLocal()
+
+    def lag(self) -> Dict[tuple, float]:
+        return {(name,): lag for name, lag in self._lag.items() if lag is not None}
+
+    async def run(self):
+        """Background loop that re-evaluates replica lag."""
+        if not self._replicas:
+            return
+        while True:
+            await self.refresh()
+            await asyncio.sleep(settings.REPLICA_CHECK_INTERVAL_SECONDS)
+
+
+replica_router = ReplicaRouter(settings.POSTGRES_REPLICA_URLS)
+
+registry.gauge(
+    "ocsafe_db_replica_lag_seconds", "Last measured replication lag", ("replica",),
+    function=replica_router.lag,
+)
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
             yield session
         finally:
             await session.close()
+
+async def get_ingest_db():
+    async with IngestSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+async def get_read_db():
+    """Session for read-only endpoints; may be served by a replica."""
+    async with replica_router.session() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
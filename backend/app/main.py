@@ -1,10 +1,58 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.api.v1.api import api_router
 from app.core.config import settings
+from app.core.instrumentation import MetricsMiddleware
+from app.core.metrics import registry
+from app.core.profiling import ProfilingMiddleware
+from app.core.serialization import FastJSONResponse
 from app.core.sockets import manager
+from app.db.session import replica_router
+from app.services import action_queue
+from app.services.audit import audit_writer
+from app.services.heartbeats import heartbeat_buffer
+from app.services.ioc import ioc_engine
+from app.services.metric_store import metric_store
+from app.services.network_sketches import network_sketches
+from app.services.presence import presence_tracker
+from app.services.telemetry_archive import telemetry_archive
+
 
-app = FastAPI(title=settings.PROJECT_NAME, version=settings.PROJECT_VERSION)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background loops owned by this worker process
+    tasks = [
+        asyncio.create_task(heartbeat_buffer.run()),
+        asyncio.create_task(presence_tracker.run()),
+        asyncio.create_task(replica_router.run()),
+        asyncio.create_task(ioc_engine.run()),
+        asyncio.create_task(network_sketches.run()),
+        asyncio.create_task(metric_store.run()),
+        asyncio.create_task(telemetry_archive.run()),
+        asyncio.create_task(action_queue.run()),
+        asyncio.create_task(audit_writer.run()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Don't lose heartbeats buffered since the last tick
+    await heartbeat_buffer.flush()
+    await network_sketches.flush()
+    await metric_store.flush()
+    await audit_writer.flush()
+
+
+app = FastAPI(
+    title=settings.PROJECT_NAME,
+    version=settings.PROJECT_VERSION,
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -12,7 +60,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination cursors the dashboard reads from responses
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
+if settings.PROFILING_ENABLED or settings.PROFILE_ALL_REQUESTS:
+    app.add_middleware(ProfilingMiddleware)
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -22,6 +75,12 @@ def root():
     return {"message": "Welcome to OCSafe Cyberguard API"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return registry.render()
+
+
 # SOC Alert WebSocket endpoint
 @app.websocket("/ws/alerts/{organization_id}")
 async def websocket_endpoint(websocket: WebSocket, organization_id: int):
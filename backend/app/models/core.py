@@ -1,5 +1,5 @@
 from app.db.base_class import Base
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON, Index, LargeBinary, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -60,12 +60,25 @@ class DeviceAction(Base):
     """
     Commands sent from the Admin dashboard to the OS Agent.
     E.g., isolation, full_scan, terminate_process
+    Agents claim pending actions for a lease and acknowledge them
+    (app/services/action_queue.py).
     """
+    __table_args__ = (
+        # Only pending rows are ever polled; finished ones stay out of these
+        Index("ix_device_action_pending", "device_id", "id",
+              postgresql_where=text("status = 'pending'"), sqlite_where=text("status = 'pending'")),
+        Index("ix_device_action_pending_created", "created_at",
+              postgresql_where=text("status = 'pending'"), sqlite_where=text("status = 'pending'")),
+    )
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("device.id"))
     action_type = Column(String, index=True) # isolate, scan, kill
     payload = Column(JSON, nullable=True) # e.g., {"pid": 1234}
-    status = Column(String, default="pending") # pending, completed, failed
+    status = Column(String, default="pending") # pending, completed, failed, expired
+    batch_id = Column(String, index=True, nullable=True)  # bulk dispatches
+    claimed_until = Column(DateTime, nullable=True)  # lease of the last claim
+    attempts = Column(Integer, default=0, nullable=False)
+    result = Column(JSON, nullable=True)  # reported by the agent on ack
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
     
@@ -75,11 +88,20 @@ class AuditLog(Base):
     """
     Tracks actions administrators take on the dashboard.
     """
+    __table_args__ = (
+        # Newest-first keyset pages, optionally for one user
+        Index("ix_auditlog_org_created", "organization_id", "created_at", "id"),
+        Index("ix_auditlog_org_user_created", "organization_id", "user_id", "created_at", "id"),
+        # History of one user, device, policy or batch
+        Index("ix_auditlog_org_target", "organization_id", "target_type", "target_id", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     organization_id = Column(Integer, ForeignKey("organization.id"))
     user_id = Column(Integer, ForeignKey("user.id"), nullable=True) # Might be system action
-    action = Column(String) # e.g., "created_policy", "isolated_device"
-    details = Column(String)
+    action = Column(String) # AuditAction value, e.g. "policy.created"
+    target_type = Column(String, nullable=True) # e.g. "user", "device", "action_batch"
+    target_id = Column(String, nullable=True)
+    details = Column(String) # JSON object
     ip_address = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -92,6 +114,10 @@ class TelemetryLog(Base):
     Replaces MongoDB — all telemetry stored in PostgreSQL.
     """
     __tablename__ = "telemetry_log"
+    __table_args__ = (
+        # Latest-per-device lookups (summary, latest, history)
+        Index("ix_telemetry_log_device_created", "device_id", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("device.id"), index=True)
     organization_id = Column(Integer, ForeignKey("organization.id"), index=True)
@@ -101,3 +127,75 @@ class TelemetryLog(Base):
 
     device = relationship("Device")
     organization = relationship("Organization")
+
+class DevicePresenceSnapshot(Base):
+    """
+    Periodic online/offline device counts per organization.
+    Written by the presence tracker; feeds the 'Devices Online vs Offline' chart.
+    """
+    __tablename__ = "device_presence_snapshot"
+    __table_args__ = (
+        Index("ix_device_presence_snapshot_org_created", "organization_id", "created_at"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organization.id"))
+    online_count = Column(Integer, default=0)
+    offline_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ThreatCounter(Base):
+    """
+    Pre-aggregated threat and risk-bucket counts per organization.
+    One row per (organization, granularity, bucket); granularity is 'hour' or 'day'.
+    Incremented on ingest so dashboard charts never scan telemetry_log.
+    """
+    __tablename__ = "threat_counter"
+    __table_args__ = (
+        UniqueConstraint("organization_id", "granularity", "bucket_start"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organization.id"))
+    granularity = Column(String, nullable=False)  # hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    threats = Column(Integer, default=0)  # Sum of threat_count
+    low = Column(Integer, default=0)
+    medium = Column(Integer, default=0)
+    high = Column(Integer, default=0)
+
+class NetworkSketch(Base):
+    """
+    Network sketches (app/services/network_sketches.py) of one organization
+    and time window, as last flushed by one worker process. Sketches merge
+    losslessly, so readers combine every worker's row for a window.
+    """
+    __tablename__ = "network_sketch"
+    __table_args__ = (
+        UniqueConstraint("organization_id", "window_start", "worker_id"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(Integer, ForeignKey("organization.id"))
+    window_start = Column(DateTime, nullable=False)
+    worker_id = Column(String, nullable=False)  # hostname:pid
+    data = Column(LargeBinary, nullable=False)  # compressed .npz
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class MetricChunk(Base):
+    """
+    A Gorilla-compressed run of one device's numeric metrics
+    (app/services/metric_store.py), as last flushed by the worker that
+    appended it. Chunks from different workers may overlap in time.
+    """
+    __tablename__ = "metric_chunk"
+    __table_args__ = (
+        # Also serves device range scans (device_id, start_at)
+        UniqueConstraint("device_id", "start_at", "worker_id"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    device_id = Column(Integer, ForeignKey("device.id"), nullable=False)
+    organization_id = Column(Integer, ForeignKey("organization.id"))
+    worker_id = Column(String, nullable=False)  # hostname:pid
+    start_at = Column(DateTime, nullable=False)
+    end_at = Column(DateTime, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
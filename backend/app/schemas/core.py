@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Literal
 from datetime import datetime
 
 # --- Organization Schemas ---
@@ -96,7 +96,35 @@ class DeviceAction(DeviceActionBase):
     id: int
     device_id: int
     status: str
+    batch_id: Optional[str] = None
+    attempts: int = 0
+    claimed_until: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
     created_at: datetime
     completed_at: Optional[datetime]
     class Config:
         from_attributes = True
+
+class DeviceActionAck(BaseModel):
+    id: int
+    status: Literal["completed", "failed"]
+    result: Optional[Dict[str, Any]] = None
+
+class BulkDeviceActionCreate(DeviceActionBase):
+    """
+    Targets every device matching all the given selectors (at least one):
+    explicit ids, device attributes, or a fleet index query on the
+    devices' latest telemetry.
+    """
+    device_ids: Optional[List[int]] = None
+    os_type: Optional[str] = None
+    device_status: Optional[str] = None
+    process: Optional[str] = None  # currently running, e.g. "psexec.exe"
+    remote: Optional[str] = None  # connected to "ip:port" or "ip"
+
+class BulkDeviceActionResult(BaseModel):
+    batch_id: str
+    action_type: str
+    targeted: int
+    resolved_from: str  # "devices", or "latest_telemetry" for process / remote
+    telemetry_as_of: Optional[datetime] = None
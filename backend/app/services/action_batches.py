@@ -0,0 +1,136 @@
+"""
+OCSafe Action Batches
+=====================
+One admin command fanned out to many devices: the target set is resolved
+in one query, every DeviceAction row is written with a single bulk insert
+under a shared batch_id, and the dispatch is audited once through the
+buffered audit writer. Progress is the batch's action count per status,
+answered from the batch_id index.
+"""
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.models.core import Device, DeviceAction
+from app.schemas.core import BulkDeviceActionCreate
+from app.services.audit import AuditAction, AuditEvent, audit_writer
+from app.services.fleet_index import fleet_index
+
+SELECTORS = ("device_ids", "os_type", "device_status", "process", "remote")
+STATUSES = ("pending", "completed", "failed", "expired")
+# Candidate ids per IN (...) query, well below the driver's bind parameter limit
+ID_CHUNK = 5_000
+
+
+async def resolve_targets(db: AsyncSession, organization_id: int,
+                          request: BulkDeviceActionCreate) -> Tuple[List[int], Dict[str, Any]]:
+    """
+    Ids of the organization's devices matching every selector given, and
+    how they were resolved: "resolved_from" is "devices" when only device
+    columns were matched, or "latest_telemetry" for process / remote, with
+    "telemetry_as_of" the time of the snapshot used. Raises ValueError
+    without a selector or past BULK_ACTION_MAX_DEVICES.
+    """
+    if all(getattr(request, selector) is None for selector in SELECTORS):
+        raise ValueError(f"Specify at least one of: {', '.join(SELECTORS)}")
+
+    too_many = f"Selection matches more than {settings.BULK_ACTION_MAX_DEVICES} devices; narrow it down"
+
+    # Id-based selectors are intersected here rather than sent as one IN
+    # list each, since a common process term can match most of the fleet
+    candidates: Optional[Set[int]] = None
+    resolution: Dict[str, Any] = {"resolved_from": "devices", "telemetry_as_of": None}
+    if request.device_ids is not None:
+        if len(request.device_ids) > settings.BULK_ACTION_MAX_DEVICES:
+            raise ValueError(too_many)
+        candidates = set(request.device_ids)
+    for kind, term in (("process", request.process), ("remote", request.remote)):
+        if term is not None:
+            if resolution["telemetry_as_of"] is None:
+                # Reconciled now, not within the search TTL: this worker's
+                # index alone misses devices that report to other workers
+                await fleet_index.ensure_loaded(db, organization_id, max_age=0)
+                resolution = {"resolved_from": "latest_telemetry",
+                              "telemetry_as_of": fleet_index.as_of(organization_id)}
+            found = set(fleet_index.search(organization_id, kind, term))
+            candidates = found if candidates is None else candidates & found
+
+    query = select(Device.id).where(Device.organization_id == organization_id).order_by(Device.id)
+    if request.os_type is not None:
+        query = query.where(Device.os_type == request.os_type)
+    if request.device_status is not None:
+        query = query.where(Device.status == request.device_status)
+
+    limit = settings.BULK_ACTION_MAX_DEVICES + 1
+    if candidates is None:
+        device_ids = list((await db.execute(query.limit(limit))).scalars().all())
+    else:
+        ordered, device_ids = sorted(candidates), []
+        for start in range(0, len(ordered), ID_CHUNK):
+            chunk = ordered[start:start + ID_CHUNK]
+            result = await db.execute(query.where(Device.id.in_(chunk)).limit(limit - len(device_ids)))
+            device_ids += result.scalars().all()
+            if len(device_ids) >= limit:
+                break
+    if len(device_ids) > settings.BULK_ACTION_MAX_DEVICES:
+        raise ValueError(too_many)
+    return device_ids, resolution
+
+
+async def dispatch(db: AsyncSession, organization_id: int, user_id: int,
+                   request: BulkDeviceActionCreate, device_ids: List[int],
+                   resolution: Dict[str, Any], ip_address: Optional[str] = None) -> str:
+    """Queue the action for every device and audit it, in one transaction."""
+    batch_id = uuid.uuid4().hex
+    await db.execute(insert(DeviceAction), [
+        {
+            "device_id": device_id,
+            "action_type": request.action_type,
+            "payload": request.payload,
+            "status": "pending",
+            "batch_id": batch_id,
+        }
+        for device_id in device_ids
+    ])
+    selection = {selector: getattr(request, selector) for selector in SELECTORS
+                 if getattr(request, selector) is not None}
+    audit_writer.record(db, AuditEvent(
+        AuditAction.DEVICE_ACTION_BULK_DISPATCHED,
+        organization_id=organization_id,
+        user_id=user_id,
+        target_type="action_batch",
+        target_id=batch_id,
+        details={
+            "action_type": request.action_type,
+            "targeted": len(device_ids),
+            "selection": selection,
+            "resolved_from": resolution["resolved_from"],
+            "telemetry_as_of": resolution["telemetry_as_of"] and resolution["telemetry_as_of"].isoformat(),
+        },
+        ip_address=ip_address,
+    ))
+    await db.commit()
+    return batch_id
+
+
+async def progress(db: AsyncSession, organization_id: int, batch_id: str) -> Optional[Dict[str, Any]]:
+    """Action counts per status, or None for an unknown batch."""
+    result = await db.execute(
+        select(DeviceAction.status, func.count())
+        .join(Device, Device.id == DeviceAction.device_id)
+        .where(DeviceAction.batch_id == batch_id, Device.organization_id == organization_id)
+        .group_by(DeviceAction.status)
+    )
+    counts = dict(result.all())
+    if not counts:
+        return None
+    report: Dict[str, Any] = {"batch_id": batch_id, "total": sum(counts.values())}
+    for status in STATUSES:
+        report[status] = counts.pop(status, 0)
+    report.update(counts)  # any other status as-is
+    report["done"] = report["pending"] == 0
+    return report
@@ -0,0 +1,143 @@
+"""
+OCSafe Action Queue
+===================
+Delivery of DeviceActions to agents, at least once:
+
+  * claim: an agent takes up to ACTION_CLAIM_BATCH of its pending actions,
+    oldest first, and each is leased to it for ACTION_LEASE_SECONDS. One
+    UPDATE ... WHERE id IN (SELECT ... FOR UPDATE SKIP LOCKED) RETURNING,
+    so concurrent polls (a retrying agent, two workers) never block on or
+    double-claim a row, and every lookup uses the partial pending index.
+  * ack: the agent reports each action completed or failed, with an
+    optional result.
+  * An action whose lease runs out unacknowledged is handed out again, up
+    to ACTION_MAX_ATTEMPTS claims. A background pass marks actions failed
+    after their last lease and expired once older than ACTION_TTL_SECONDS,
+    so the pending set stays small.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import literal_column, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.db.session import IngestSessionLocal
+from app.models.core import DeviceAction
+
+logger = logging.getLogger(__name__)
+
+# Inlined rather than bound: a parameter would keep generic plans of these
+# prepared statements from using the partial "status = 'pending'" indexes
+PENDING = DeviceAction.status == literal_column("'pending'")
+
+actions_claimed = registry.counter("ocsafe_actions_claimed_total", "Device actions handed to agents")
+actions_expired = registry.counter("ocsafe_actions_expired_total", "Device actions expired or failed unacknowledged")
+
+
+async def claim(db: AsyncSession, device_id: int, limit: Optional[int] = None) -> List[DeviceAction]:
+    """Lease the device's oldest claimable actions and return them."""
+    now = datetime.utcnow()
+    claimable = (
+        select(DeviceAction.id)
+        .where(
+            DeviceAction.device_id == device_id,
+            PENDING,
+            or_(DeviceAction.claimed_until.is_(None), DeviceAction.claimed_until < now),
+            DeviceAction.attempts < settings.ACTION_MAX_ATTEMPTS,
+            DeviceAction.created_at >= now - timedelta(seconds=settings.ACTION_TTL_SECONDS),
+        )
+        .order_by(DeviceAction.id)
+        .limit(limit or settings.ACTION_CLAIM_BATCH)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.scalars(
+        update(DeviceAction)
+        .where(DeviceAction.id.in_(claimable.scalar_subquery()))
+        .values(
+            claimed_until=now + timedelta(seconds=settings.ACTION_LEASE_SECONDS),
+            attempts=DeviceAction.attempts + 1,
+        )
+        .returning(DeviceAction),
+        execution_options={"synchronize_session": False},
+    )
+    actions = sorted(result.all(), key=lambda action: action.id)
+    await db.commit()
+    actions_claimed.inc(len(actions))
+    return actions
+
+
+async def ack(db: AsyncSession, device_id: int, acks: Sequence[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """
+    Record outcomes ({"id", "status", "result"}) of the device's pending
+    actions. Ids that are unknown, another device's, or already finished
+    (e.g. expired, or acknowledged by an earlier retry) are ignored.
+    """
+    requested = {entry["id"]: entry for entry in acks}
+    result = await db.execute(
+        select(DeviceAction.id).where(
+            DeviceAction.id.in_(list(requested)),
+            DeviceAction.device_id == device_id,
+            PENDING,
+        ).with_for_update()
+    )
+    accepted = sorted(result.scalars().all())
+    if accepted:
+        now = datetime.utcnow()
+        await db.execute(
+            update(DeviceAction),
+            [
+                {
+                    "id": action_id,
+                    "status": requested[action_id]["status"],
+                    "result": requested[action_id].get("result"),
+                    "completed_at": now,
+                }
+                for action_id in accepted
+            ],
+        )
+        await db.commit()
+    return {"acknowledged": accepted, "ignored": sorted(set(requested) - set(accepted))}
+
+
+async def expire(db: AsyncSession) -> int:
+    """Finish pending actions that can no longer be delivered."""
+    now = datetime.utcnow()
+    expired = await db.execute(
+        update(DeviceAction)
+        .where(
+            PENDING,
+            DeviceAction.created_at < now - timedelta(seconds=settings.ACTION_TTL_SECONDS),
+        )
+        .values(status="expired", completed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    exhausted = await db.execute(
+        update(DeviceAction)
+        .where(
+            PENDING,
+            DeviceAction.attempts >= settings.ACTION_MAX_ATTEMPTS,
+            DeviceAction.claimed_until < now,
+        )
+        .values(status="failed", result={"error": "Not acknowledged"}, completed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    count = expired.rowcount + exhausted.rowcount
+    actions_expired.inc(count)
+    return count
+
+
+async def run():
+    """Background loop: expire undeliverable actions."""
+    while True:
+        await asyncio.sleep(settings.ACTION_EXPIRY_INTERVAL_SECONDS)
+        try:
+            async with IngestSessionLocal() as db:
+                await expire(db)
+        except Exception:
+            logger.exception("Device action expiry failed")
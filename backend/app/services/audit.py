@@ -0,0 +1,214 @@
+"""
+OCSafe Audit Writer
+===================
+Structured audit events, written off the request path.
+
+Endpoints describe what happened with an AuditEvent (an AuditAction, the
+target, free-form details and the client IP) and hand it to
+audit_writer.record() before committing their own transaction:
+
+  * Critical actions (CRITICAL_ACTIONS, or every action with
+    AUDIT_DURABILITY="all") are added to that transaction, so the entry is
+    durable before the response is sent and exists if and only if the
+    change does.
+  * Everything else is parked on the session and, once the transaction
+    commits, queued in memory; a background loop bulk-inserts the queue
+    every AUDIT_FLUSH_INTERVAL_SECONDS, or as soon as AUDIT_FLUSH_BATCH
+    events are waiting. A rolled-back transaction drops its events.
+    If the database rejects a batch (say an event's user was deleted
+    before the flush), it is retried row by row and only the offending
+    rows are dropped, with their content logged; connection errors
+    requeue the batch.
+
+The queue is per worker and flushed on shutdown; a worker that dies
+loses at most one interval of non-critical entries.
+"""
+import asyncio
+import enum
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy import event, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.db.session import IngestSessionLocal
+from app.models.core import AuditLog
+
+logger = logging.getLogger(__name__)
+
+audit_written = registry.counter("ocsafe_audit_events_written_total", "Buffered audit events bulk-inserted")
+audit_dropped = registry.counter("ocsafe_audit_events_dropped_total", "Buffered audit events dropped on overflow")
+audit_rejected = registry.counter("ocsafe_audit_events_rejected_total", "Buffered audit events the database refused")
+audit_pending = registry.gauge("ocsafe_audit_events_pending", "Audit events waiting for the next flush")
+
+
+class AuditAction(str, enum.Enum):
+    POLICY_CREATED = "policy.created"
+    USER_REMOVED = "user.removed"
+    USER_ROLE_CHANGED = "user.role_changed"
+    DEVICE_ACTION_DISPATCHED = "device.action_dispatched"
+    DEVICE_ACTION_BULK_DISPATCHED = "device.action_bulk_dispatched"
+
+
+# Written in the caller's transaction regardless of AUDIT_DURABILITY
+CRITICAL_ACTIONS = frozenset({
+    AuditAction.USER_REMOVED,
+    AuditAction.USER_ROLE_CHANGED,
+})
+
+# Session.info key holding events that wait for the transaction to commit
+_SESSION_KEY = "audit_events"
+
+
+def request_ip(request: Request) -> Optional[str]:
+    """Client address as seen by the server (run uvicorn with --proxy-headers behind a proxy)."""
+    return request.client.host if request.client else None
+
+
+class AuditEvent:
+    __slots__ = ("action", "organization_id", "user_id", "target_type", "target_id",
+                 "details", "ip_address", "created_at")
+
+    def __init__(
+        self,
+        action: AuditAction,
+        organization_id: int,
+        user_id: Optional[int],
+        target_type: Optional[str] = None,
+        target_id: Any = None,
+        details: Optional[Dict[str, Any]] = None,
+        ip_address: Optional[str] = None,
+    ):
+        self.action = action
+        self.organization_id = organization_id
+        self.user_id = user_id
+        self.target_type = target_type
+        self.target_id = None if target_id is None else str(target_id)
+        self.details = details
+        self.ip_address = ip_address
+        # When it happened, not when the buffer was flushed
+        self.created_at = datetime.utcnow()
+
+    @property
+    def critical(self) -> bool:
+        return self.action in CRITICAL_ACTIONS or settings.AUDIT_DURABILITY == "all"
+
+    def row(self) -> Dict[str, Any]:
+        return {
+            "organization_id": self.organization_id,
+            "user_id": self.user_id,
+            "action": self.action.value,
+            "target_type": self.target_type,
+            "target_id": self.target_id,
+            "details": json.dumps(self.details) if self.details is not None else None,
+            "ip_address": self.ip_address,
+            "created_at": self.created_at,
+        }
+
+
+class AuditWriter:
+    def __init__(self):
+        self._pending: List[Dict[str, Any]] = []
+        self._wakeup = asyncio.Event()
+
+    def record(self, db: AsyncSession, audit_event: AuditEvent) -> None:
+        """Audit an action committed by db's current transaction (call before the commit)."""
+        if audit_event.critical:
+            db.add(AuditLog(**audit_event.row()))
+        else:
+            session = db.sync_session
+            if not session.in_transaction():
+                session.begin()  # no I/O; lets the rollback hook see this transaction end
+            session.info.setdefault(_SESSION_KEY, []).append(audit_event.row())
+
+    def enqueue(self, rows: List[Dict[str, Any]]) -> None:
+        self._pending.extend(rows)
+        overflow = len(self._pending) - settings.AUDIT_BUFFER_MAX
+        if overflow > 0:
+            # Keep the newest; the database must be down for this to happen
+            del self._pending[:overflow]
+            audit_dropped.inc(overflow)
+            logger.error("Audit buffer full, dropped %d events", overflow)
+        audit_pending.set(len(self._pending))
+        if len(self._pending) >= settings.AUDIT_FLUSH_BATCH:
+            self._wakeup.set()
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Write all queued events with one executemany INSERT."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        try:
+            async with IngestSessionLocal() as db:
+                await db.execute(insert(AuditLog), pending)
+                await db.commit()
+            written = len(pending)
+        except (IntegrityError, DataError):
+            # Retrying the batch would fail forever; find the bad rows instead
+            written = await self._write_each(pending)
+        except Exception:
+            # Retry next tick, ahead of anything queued meanwhile
+            self._pending[:0] = pending
+            logger.exception("Audit flush failed for %d events", len(pending))
+            written = 0
+        audit_pending.set(len(self._pending))
+        audit_written.inc(written)
+        return written
+
+    async def _write_each(self, rows: List[Dict[str, Any]]) -> int:
+        """Insert rows one per transaction, dropping those the database rejects."""
+        written = 0
+        async with IngestSessionLocal() as db:
+            for index, row in enumerate(rows):
+                try:
+                    await db.execute(insert(AuditLog), [row])
+                    await db.commit()
+                    written += 1
+                except (IntegrityError, DataError):
+                    await db.rollback()
+                    audit_rejected.inc()
+                    logger.error("Dropping audit event rejected by the database: %r", row, exc_info=True)
+                except Exception:
+                    # Lost the database midway: keep what wasn't written for next tick
+                    self._pending[:0] = rows[index:]
+                    logger.exception("Audit flush failed for %d events", len(rows) - index)
+                    break
+        return written
+
+    async def run(self):
+        """Background loop: flush on a fixed interval or when a batch is full."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.AUDIT_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+audit_writer = AuditWriter()
+
+
+@event.listens_for(Session, "after_commit")
+def _queue_committed(session):
+    rows = session.info.pop(_SESSION_KEY, None)
+    if rows:
+        audit_writer.enqueue(rows)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_rolled_back(session, previous_transaction):
+    # Fires even when no SQL ran yet; a savepoint rollback keeps the outer events
+    if not previous_transaction.nested:
+        session.info.pop(_SESSION_KEY, None)
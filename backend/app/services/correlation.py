@@ -0,0 +1,278 @@
+"""
+OCSafe Correlation Engine
+=========================
+Fleet-level detection across the devices of an organization, on top of the
+per-payload ThreatEngine. Over a sliding window of
+CORRELATION_WINDOW_SECONDS it raises campaign alerts when:
+
+  * the same suspicious process (or IOC-matched indicator) shows up on
+    CORRELATION_MIN_DEVICES devices;
+  * the same external endpoint on an uncommon port is contacted by that
+    many devices;
+  * that many devices switch their firewall or antivirus off;
+  * one device connects to CORRELATION_FANOUT_MIN_HOSTS internal hosts on
+    remote-administration ports (lateral-movement-like fan-out).
+
+Each signal is a window of key -> members (devices, or target hosts for
+fan-out) with their last-seen time, oldest first, so expiry pops from the
+front in amortised O(1). Keys per org and signal are capped at
+CORRELATION_MAX_KEYS (least recently seen dropped first), which bounds
+memory whatever the fleet does.
+
+An alert fires when a key reaches its threshold and again whenever its
+member count doubles; it re-arms once the key ages out of the window.
+Alerts are pushed to the org's SOC sockets and the latest
+CORRELATION_ALERT_HISTORY are kept for GET /alerts/campaigns.
+
+State is per worker process: with several workers, each correlates the
+devices it ingests, so thresholds apply per worker unless ingest is routed
+by device.
+"""
+import asyncio
+import ipaddress
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.core.sockets import manager
+
+logger = logging.getLogger(__name__)
+
+campaign_alerts = registry.counter(
+    "ocsafe_campaign_alerts_total", "Fleet-wide campaign alerts raised by the correlation engine"
+)
+
+# Remote-administration / file-sharing ports used for lateral movement
+LATERAL_PORTS = frozenset({22, 135, 139, 445, 3389, 5985, 5986})
+# Everyone talks to these; spread across the fleet means nothing by itself
+COMMON_REMOTE_PORTS = frozenset({53, 80, 123, 443})
+
+SEVERITY = {
+    "process": "high",
+    "ioc": "high",
+    "firewall_disabled": "high",
+    "antivirus_disabled": "high",
+    "lateral_fanout": "high",
+    "endpoint": "medium",
+}
+
+
+class SlidingWindow:
+    """Distinct members per key seen within the last `seconds`."""
+
+    def __init__(self, seconds: float, max_keys: int):
+        self.seconds = seconds
+        self.max_keys = max_keys
+        # key -> OrderedDict(member -> last seen); keys ordered by last update
+        self.keys: "OrderedDict[Hashable, OrderedDict[Hashable, float]]" = OrderedDict()
+        # key -> member count when it last alerted
+        self.alerted: Dict[Hashable, int] = {}
+
+    def add(self, key: Hashable, member: Hashable, now: float) -> int:
+        """Record a sighting; returns the key's distinct members in the window."""
+        members = self.keys.pop(key, None)
+        if members is None:
+            members = OrderedDict()
+        self.keys[key] = members
+        members[member] = now
+        members.move_to_end(member)
+
+        cutoff = now - self.seconds
+        while next(iter(members.values())) < cutoff:
+            members.popitem(last=False)
+        while len(self.keys) > self.max_keys:
+            self._drop(next(iter(self.keys)))
+        return len(members)
+
+    def expire(self, now: float) -> None:
+        cutoff = now - self.seconds
+        while self.keys:
+            key, members = next(iter(self.keys.items()))
+            if next(reversed(members.values())) >= cutoff:
+                break
+            self._drop(key)
+
+    def _drop(self, key: Hashable) -> None:
+        del self.keys[key]
+        self.alerted.pop(key, None)
+
+    def should_alert(self, key: Hashable, count: int, threshold: int) -> bool:
+        if count < threshold or count < 2 * self.alerted.get(key, 0):
+            return False
+        self.alerted[key] = count
+        return True
+
+    def members(self, key: Hashable) -> List[Hashable]:
+        return list(self.keys.get(key, ()))
+
+    def __len__(self) -> int:
+        return sum(len(members) for members in self.keys.values())
+
+
+def _split_endpoint(endpoint: str) -> Optional[Tuple[Any, int]]:
+    host, sep, port = endpoint.rpartition(":")
+    if not sep or not port.isdigit():
+        return None
+    try:
+        return ipaddress.ip_address(host.strip("[]")), int(port)
+    except ValueError:
+        return None
+
+
+def signals(payload: Dict[str, Any], evaluation: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(signal, key) pairs this payload contributes to device-spread windows."""
+    found = []
+
+    for proc in evaluation.get("suspicious_processes") or []:
+        # High CPU on many hosts is usually a rollout, not a campaign
+        if proc["name"] and proc["rule"] != "high_cpu":
+            found.append(("process", proc["name"].lower()))
+
+    for match in evaluation.get("ioc_matches") or []:
+        found.append(("ioc", str(match["value"])))
+
+    network = payload.get("network")
+    if isinstance(network, dict) and not network.get("error"):
+        for endpoint in network.get("remote_endpoints") or []:
+            parsed = _split_endpoint(endpoint)
+            if parsed and parsed[0].is_global and parsed[1] not in COMMON_REMOTE_PORTS:
+                found.append(("endpoint", endpoint))
+    return found
+
+
+def lateral_targets(payload: Dict[str, Any]) -> List[str]:
+    """Internal hosts this device talks to on remote-administration ports."""
+    network = payload.get("network")
+    if not isinstance(network, dict) or network.get("error"):
+        return []
+    targets = set()
+    endpoints = list(network.get("remote_endpoints") or [])
+    endpoints += [c.get("remote_addr") or "" for c in network.get("established_connections") or []]
+    for endpoint in endpoints:
+        parsed = _split_endpoint(endpoint)
+        if parsed and parsed[0].is_private and not parsed[0].is_loopback and parsed[1] in LATERAL_PORTS:
+            targets.add(str(parsed[0]))
+    return sorted(targets)
+
+
+class _OrgState:
+    def __init__(self):
+        window, max_keys = settings.CORRELATION_WINDOW_SECONDS, settings.CORRELATION_MAX_KEYS
+        self.windows = {signal: SlidingWindow(window, max_keys) for signal in SEVERITY}
+        # device_id -> (firewall_enabled, antivirus_enabled) at its last report
+        self.protection: Dict[int, Tuple[Optional[bool], Optional[bool]]] = {}
+        self.alerts: Deque[Dict[str, Any]] = deque(maxlen=settings.CORRELATION_ALERT_HISTORY)
+        self.last_expire = 0.0
+
+
+class CorrelationEngine:
+    def __init__(self):
+        self._orgs: Dict[int, _OrgState] = {}
+
+    def observe(
+        self,
+        organization_id: int,
+        device_id: int,
+        payload: Dict[str, Any],
+        evaluation: Dict[str, Any],
+        now: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Feed one ingested payload; returns the campaign alerts it raised."""
+        now = time.time() if now is None else now
+        state = self._orgs.get(organization_id)
+        if state is None:
+            state = self._orgs[organization_id] = _OrgState()
+
+        # Spread across devices
+        sightings = signals(payload, evaluation)
+        sightings += self._protection_changes(state, device_id, payload)
+        raised = []
+        for signal, key in sightings:
+            window = state.windows[signal]
+            count = window.add(key, device_id, now)
+            if window.should_alert(key, count, settings.CORRELATION_MIN_DEVICES):
+                raised.append(self._alert(signal, key, window, devices=window.members(key), now=now))
+
+        # Fan-out from this device
+        window = state.windows["lateral_fanout"]
+        count = 0
+        for target in lateral_targets(payload):
+            count = window.add(device_id, target, now)
+        if window.should_alert(device_id, count, settings.CORRELATION_FANOUT_MIN_HOSTS):
+            raised.append(self._alert(
+                "lateral_fanout", str(device_id), window,
+                devices=[device_id], targets=window.members(device_id), now=now,
+            ))
+
+        # Idle keys only cost memory; sweep them out about once a window/10
+        if now - state.last_expire > settings.CORRELATION_WINDOW_SECONDS / 10:
+            for window in state.windows.values():
+                window.expire(now)
+            state.last_expire = now
+
+        for alert in raised:
+            state.alerts.append(alert)
+            self._publish(organization_id, alert)
+        return raised
+
+    def _protection_changes(self, state: _OrgState, device_id: int, payload: Dict[str, Any]):
+        security = payload.get("security")
+        if not isinstance(security, dict) or security.get("error"):
+            return []
+        current = (security.get("firewall_enabled"), security.get("antivirus_enabled"))
+        previous = state.protection.get(device_id, (None, None))
+        state.protection[device_id] = current
+        changes = []
+        # Only on-to-off transitions: a device that was always off isn't news
+        if previous[0] is True and current[0] is False:
+            changes.append(("firewall_disabled", "firewall"))
+        if previous[1] is True and current[1] is False:
+            changes.append(("antivirus_disabled", "antivirus"))
+        return changes
+
+    def _alert(self, signal: str, key: str, window: SlidingWindow, devices: List[int],
+               now: float, targets: Optional[List[str]] = None) -> Dict[str, Any]:
+        alert = {
+            "type": "campaign",
+            "kind": signal,
+            "indicator": key,
+            "severity": SEVERITY[signal],
+            "device_count": len(devices),
+            "device_ids": devices,
+            "window_seconds": window.seconds,
+            "at": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+        }
+        if targets is not None:
+            alert["target_count"] = len(targets)
+            alert["targets"] = targets
+        campaign_alerts.inc()
+        logger.warning("Campaign alert: %s %s on %d device(s)", signal, key, len(devices))
+        return alert
+
+    def _publish(self, organization_id: int, alert: Dict[str, Any]) -> None:
+        if manager.active_connections.get(organization_id):
+            asyncio.get_running_loop().create_task(
+                manager.broadcast_to_org(json.dumps(alert), organization_id)
+            )
+
+    def recent(self, organization_id: int) -> List[Dict[str, Any]]:
+        """Campaign alerts raised in this worker, newest first."""
+        state = self._orgs.get(organization_id)
+        return list(reversed(state.alerts)) if state else []
+
+    def tracked(self) -> int:
+        """Entries held across every window (for the memory gauge)."""
+        return sum(len(w) for state in self._orgs.values() for w in state.windows.values())
+
+
+correlation_engine = CorrelationEngine()
+
+registry.gauge(
+    "ocsafe_correlation_window_entries", "Key/member entries held in correlation windows",
+    function=correlation_engine.tracked,
+)
@@ -0,0 +1,199 @@
+"""
+OCSafe Fleet Index
+==================
+In-memory inverted index over each device's latest telemetry, answering
+incident questions like "which machines run psexec.exe" or "which devices
+talked to 10.1.2.3:4444" without touching telemetry_log.
+
+Terms per kind:
+  process  lower-cased process name
+  remote   remote endpoint "ip:port", and the bare "ip"
+  port     listening port
+
+Each ingest diffs the device's new terms against the ones indexed for it
+last time, so the index always reflects the latest state and an update
+costs O(terms that changed). A section that is missing or reports a
+collector error leaves that device's terms for the kind untouched.
+
+Each worker only sees the ingests routed to it, so an organization is
+reconciled against the latest telemetry row of each of its devices when
+first searched and again once FLEET_INDEX_REFRESH_SECONDS have passed:
+devices other workers saw are brought up to date and deleted devices are
+dropped. Every device's state is tagged with the telemetry row it came
+from, so neither side can overwrite a newer one. With several workers, a
+search may therefore miss changes up to FLEET_INDEX_REFRESH_SECONDS old.
+"""
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Set
+
+from sqlalchemy import and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.models.core import Device, TelemetryLog
+
+TERM_KINDS = ("process", "remote", "port")
+
+
+def _section(payload: Dict[str, Any], name: str) -> Optional[Dict[str, Any]]:
+    section = payload.get(name)
+    if not isinstance(section, dict) or section.get("error"):
+        return None
+    return section
+
+
+def normalize(kind: str, term: Any) -> str:
+    term = str(term).strip()
+    return term.lower() if kind == "process" else term
+
+
+def extract_terms(payload: Dict[str, Any]) -> Dict[str, FrozenSet[str]]:
+    """Index terms by kind, for the kinds the payload reports on."""
+    terms: Dict[str, FrozenSet[str]] = {}
+
+    processes = _section(payload, "processes")
+    if processes is not None:
+        names = list(processes.get("names") or [])
+        names.extend(proc.get("name") for proc in processes.get("suspicious") or [])
+        terms["process"] = frozenset(sys.intern(normalize("process", n)) for n in names if n)
+
+    network = _section(payload, "network")
+    if network is not None:
+        remote: Set[str] = set()
+        endpoints = list(network.get("remote_endpoints") or [])
+        endpoints.extend(c.get("remote_addr") for c in network.get("established_connections") or [])
+        for endpoint in endpoints:
+            if not endpoint:
+                continue
+            remote.add(sys.intern(endpoint))
+            ip, _, port = endpoint.rpartition(":")
+            if ip and port.isdigit():
+                remote.add(sys.intern(ip))
+        terms["remote"] = frozenset(remote)
+        terms["port"] = frozenset(sys.intern(str(p)) for p in network.get("open_ports") or [])
+
+    return terms
+
+
+class FleetIndex:
+    def __init__(self):
+        # organization_id -> kind -> term -> device ids
+        self._postings: Dict[int, Dict[str, Dict[str, Set[int]]]] = {}
+        # device_id -> kind -> terms currently indexed for it
+        self._device_terms: Dict[int, Dict[str, FrozenSet[str]]] = {}
+        # device_id -> id of the telemetry row its terms come from
+        self._versions: Dict[int, int] = {}
+        # organization_id -> indexed devices
+        self._devices: Dict[int, Set[int]] = {}
+        # organization_id -> monotonic time of the last reconciliation
+        self._loaded_at: Dict[int, float] = {}
+        # organization_id -> when its last reconciliation finished
+        self._as_of: Dict[int, datetime] = {}
+
+    def update(self, organization_id: int, device_id: int, payload: Dict[str, Any],
+               telemetry_id: Optional[int] = None) -> None:
+        """Re-index a device from its latest payload, unless a newer row is already indexed."""
+        if telemetry_id is not None:
+            if telemetry_id <= self._versions.get(device_id, 0):
+                return
+            self._versions[device_id] = telemetry_id
+        self._devices.setdefault(organization_id, set()).add(device_id)
+        postings = self._postings.setdefault(organization_id, {})
+        indexed = self._device_terms.setdefault(device_id, {})
+        for kind, terms in extract_terms(payload).items():
+            previous = indexed.get(kind, frozenset())
+            if terms == previous:
+                continue
+            by_term = postings.setdefault(kind, {})
+            self._unindex(by_term, device_id, previous - terms)
+            for term in terms - previous:
+                by_term.setdefault(term, set()).add(device_id)
+            indexed[kind] = terms
+
+    def remove(self, organization_id: int, device_id: int) -> None:
+        postings = self._postings.get(organization_id, {})
+        for kind, terms in self._device_terms.pop(device_id, {}).items():
+            self._unindex(postings.get(kind, {}), device_id, terms)
+        self._versions.pop(device_id, None)
+        self._devices.get(organization_id, set()).discard(device_id)
+
+    @staticmethod
+    def _unindex(by_term: Dict[str, Set[int]], device_id: int, terms) -> None:
+        for term in terms:
+            devices = by_term.get(term)
+            if devices is not None:
+                devices.discard(device_id)
+                if not devices:
+                    del by_term[term]
+
+    def search(self, organization_id: int, kind: str, term: str) -> List[int]:
+        """
+        Device ids whose latest state contains the term. A trailing "*" matches
+        by prefix (scans the kind's distinct terms rather than one posting list).
+        """
+        by_term = self._postings.get(organization_id, {}).get(kind, {})
+        term = normalize(kind, term)
+        if term.endswith("*"):
+            prefix = term[:-1]
+            devices: Set[int] = set()
+            for candidate, posting in by_term.items():
+                if candidate.startswith(prefix):
+                    devices |= posting
+            return sorted(devices)
+        return sorted(by_term.get(term, ()))
+
+    def stats(self, organization_id: int) -> Dict[str, int]:
+        postings = self._postings.get(organization_id, {})
+        return {kind: len(postings.get(kind, {})) for kind in TERM_KINDS}
+
+    async def load(self, db: AsyncSession, organization_id: int) -> None:
+        """Reconcile an organization with the latest telemetry row of each existing device."""
+        latest_ids = (
+            select(func.max(TelemetryLog.id))
+            .where(TelemetryLog.organization_id == organization_id)
+            .group_by(TelemetryLog.device_id)
+        )
+        # Every device of the organization, with its latest row if it has one
+        result = await db.stream(
+            select(Device.id, TelemetryLog.id,
+                   TelemetryLog.payload["processes"], TelemetryLog.payload["network"])
+            .outerjoin(TelemetryLog, and_(TelemetryLog.device_id == Device.id, TelemetryLog.id.in_(latest_ids)))
+            .where(Device.organization_id == organization_id)
+            .execution_options(yield_per=1_000)
+        )
+        existing: Set[int] = set()
+        async for device_id, telemetry_id, processes, network in result:
+            existing.add(device_id)
+            if telemetry_id is not None:
+                self.update(organization_id, device_id, {"processes": processes, "network": network}, telemetry_id)
+        for device_id in self._devices.get(organization_id, set()) - existing:
+            self.remove(organization_id, device_id)
+        self._as_of[organization_id] = datetime.utcnow()
+
+    def as_of(self, organization_id: int) -> Optional[datetime]:
+        """When the organization was last reconciled with the database."""
+        return self._as_of.get(organization_id)
+
+    async def ensure_loaded(self, db: AsyncSession, organization_id: int,
+                            max_age: Optional[float] = None) -> None:
+        """
+        Reconcile the organization unless that happened within max_age
+        seconds (default FLEET_INDEX_REFRESH_SECONDS; 0 always reconciles).
+        """
+        max_age = settings.FLEET_INDEX_REFRESH_SECONDS if max_age is None else max_age
+        now = time.monotonic()
+        if now - self._loaded_at.get(organization_id, float("-inf")) < max_age:
+            return
+        # Claimed up front so concurrent searches don't all reconcile at once
+        self._loaded_at[organization_id] = now
+        try:
+            await self.load(db, organization_id)
+        except BaseException:
+            del self._loaded_at[organization_id]
+            raise
+
+
+fleet_index = FleetIndex()
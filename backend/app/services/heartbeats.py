@@ -0,0 +1,103 @@
+"""
+OCSafe Heartbeat Buffer
+=======================
+Coalesces device heartbeats in memory and flushes them to PostgreSQL
+in a single bulk UPDATE every few seconds instead of one write per message.
+The in-memory timestamp is authoritative for online/offline reads.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import settings
+from app.db.session import IngestSessionLocal
+from app.models.core import Device
+
+logger = logging.getLogger(__name__)
+
+_device_table = Device.__table__
+
+# Only move last_heartbeat forward, so a late flush from another worker
+# can never overwrite a newer value.
+_flush_statement = (
+    update(_device_table)
+    .where(_device_table.c.id == bindparam("b_device_id"))
+    .where(
+        or_(
+            _device_table.c.last_heartbeat.is_(None),
+            _device_table.c.last_heartbeat < bindparam("b_last_heartbeat"),
+        )
+    )
+    .values(last_heartbeat=bindparam("b_last_heartbeat"))
+)
+
+
+class HeartbeatBuffer:
+    def __init__(self):
+        # Latest heartbeat seen by this process, per device
+        self._last_seen: Dict[int, datetime] = {}
+        # Heartbeats not yet written to the database
+        self._pending: Dict[int, datetime] = {}
+
+    def record(self, device_id: int, timestamp: Optional[datetime] = None) -> datetime:
+        """Record a heartbeat. Cheap, never touches the database."""
+        timestamp = timestamp or datetime.utcnow()
+        self._last_seen[device_id] = timestamp
+        self._pending[device_id] = timestamp
+        return timestamp
+
+    def last_seen(self, device_id: int) -> Optional[datetime]:
+        return self._last_seen.get(device_id)
+
+    def apply(self, devices: Iterable[Device]) -> None:
+        """
+        Overlay buffered heartbeats onto loaded Device rows without marking
+        them dirty, so read endpoints see the authoritative value.
+        """
+        for device in devices:
+            seen = self._last_seen.get(device.id)
+            if seen and (device.last_heartbeat is None or seen > device.last_heartbeat):
+                set_committed_value(device, "last_heartbeat", seen)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Write all pending heartbeats with one executemany UPDATE."""
+        if not self._pending:
+            return 0
+
+        # Swap the table first so heartbeats arriving during the write
+        # land in the next batch.
+        pending, self._pending = self._pending, {}
+        rows = [
+            {"b_device_id": device_id, "b_last_heartbeat": timestamp}
+            for device_id, timestamp in pending.items()
+        ]
+
+        try:
+            async with IngestSessionLocal() as db:
+                await db.execute(_flush_statement, rows)
+                await db.commit()
+        except Exception:
+            # Put the batch back unless a newer heartbeat already replaced it
+            for device_id, timestamp in pending.items():
+                self._pending.setdefault(device_id, timestamp)
+            logger.exception("Heartbeat flush failed for %d devices", len(rows))
+            return 0
+
+        return len(rows)
+
+    async def run(self):
+        """Background loop that flushes the buffer on a fixed interval."""
+        while True:
+            await asyncio.sleep(settings.HEARTBEAT_FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+
+heartbeat_buffer = HeartbeatBuffer()
@@ -0,0 +1,323 @@
+"""
+OCSafe IOC Engine
+=================
+Indicator-of-compromise matching against large local feeds (millions of
+file hashes, IPs / CIDR ranges, domains, process names).
+
+Feeds are plain-text files in IOC_FEED_DIR, one indicator per line (the
+first whitespace/comma-separated token; "#" and ";" start comments). The
+file name's leading word selects the indicator type:
+
+  hashes*.txt     file hashes (md5 / sha1 / sha256, hex)
+  domains*.txt    domains; subdomains of a listed domain match too
+  ips*.txt        IPv4 / IPv6 addresses and CIDR ranges
+  processes*.txt  process names (case-insensitive)
+  ports*.txt      suspicious listening ports
+
+Storage is compact and lookup-friendly:
+  * hashes, domains and process names are reduced to 64-bit fingerprints
+    kept in one sorted array per type (8 bytes per indicator, binary search
+    in C; a bloom pre-filter measured slower than the search it would skip);
+  * IP addresses and CIDRs are merged into sorted, non-overlapping integer
+    intervals, so a lookup is one binary search whatever the prefix lengths
+    (same answers as a radix tree, in two flat arrays).
+
+Reloads build a new immutable IOCStore in a worker thread and swap it in
+with a single reference assignment, so ingest never waits for a reload and
+never sees a half-built store.
+"""
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import os
+import socket
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+FEED_TYPES = {
+    "hashes": "hash",
+    "domains": "domain",
+    "ips": "ip",
+    "processes": "process",
+    "ports": "port",
+}
+
+
+def fingerprint(value: str) -> int:
+    """64-bit fingerprint of a normalised indicator (blake2b, little-endian)."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def normalize(kind: str, value: str) -> str:
+    value = value.strip().lower()
+    if kind == "domain":
+        value = value.rstrip(".")
+    return value
+
+
+class FingerprintSet:
+    """Sorted, de-duplicated uint64 fingerprints (8 bytes per indicator)."""
+
+    def __init__(self, fingerprints: np.ndarray):
+        self.sorted = array("Q")
+        self.sorted.frombytes(np.unique(fingerprints.astype(np.uint64, copy=False)).tobytes())
+
+    def __len__(self) -> int:
+        return len(self.sorted)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.sorted) * self.sorted.itemsize
+
+    def __contains__(self, fp: int) -> bool:
+        index = bisect_left(self.sorted, fp)
+        return index < len(self.sorted) and self.sorted[index] == fp
+
+
+class IntervalSet:
+    """Sorted, merged, inclusive [start, end] integer ranges."""
+
+    def __init__(self, ranges: Iterable[Tuple[int, int]], typecode: Optional[str] = None):
+        merged: List[List[int]] = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        # IPv4 fits a flat uint32 array; IPv6 needs Python ints
+        if typecode:
+            self.starts = array(typecode, (start for start, _ in merged))
+            self.ends = array(typecode, (end for _, end in merged))
+        else:
+            self.starts = [start for start, _ in merged]
+            self.ends = [end for _, end in merged]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def nbytes(self) -> int:
+        if isinstance(self.starts, array):
+            return 2 * len(self.starts) * self.starts.itemsize
+        return 2 * 8 * len(self.starts) + sum(v.bit_length() // 8 for v in self.ends)
+
+    def __contains__(self, value: int) -> bool:
+        index = bisect_right(self.starts, value) - 1
+        return index >= 0 and value <= self.ends[index]
+
+
+def parse_ip(text: str) -> Optional[Tuple[int, int]]:
+    """(version, integer value) of an IP address, or None."""
+    text = text.strip().strip("[]")
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, text), "big")
+    except OSError:
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, text), "big")
+    except OSError:
+        return None
+
+
+def endpoint_ip(endpoint: str) -> str:
+    """IP part of "ip:port" (also "[v6]:port")."""
+    host, sep, port = endpoint.rpartition(":")
+    if sep and port.isdigit() and host:
+        return host
+    return endpoint
+
+
+def _indicators(path: str) -> Iterator[str]:
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.split("#", 1)[0].split(";", 1)[0].strip()
+            if line:
+                yield line.replace(",", " ").split()[0]
+
+
+def feed_files(feed_dir: str) -> List[Tuple[str, str]]:
+    """(indicator type, path) of every recognised feed file, sorted by name."""
+    if not os.path.isdir(feed_dir):
+        return []
+    files = []
+    for name in sorted(os.listdir(feed_dir)):
+        prefix = name.split(".", 1)[0].split("-", 1)[0].split("_", 1)[0].lower()
+        kind = FEED_TYPES.get(prefix)
+        path = os.path.join(feed_dir, name)
+        if kind and os.path.isfile(path):
+            files.append((kind, path))
+    return files
+
+
+def feed_signature(feed_dir: str) -> str:
+    """Changes whenever a feed file is added, removed or modified."""
+    digest = hashlib.sha1()
+    for _, path in feed_files(feed_dir):
+        stat = os.stat(path)
+        digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class IOCStore:
+    """Immutable snapshot of every loaded feed."""
+
+    def __init__(
+        self,
+        version: str,
+        fingerprints: Dict[str, np.ndarray],
+        ipv4: List[Tuple[int, int]],
+        ipv6: List[Tuple[int, int]],
+        ports: Iterable[int],
+    ):
+        self.version = version
+        self.sets = {kind: FingerprintSet(fps) for kind, fps in fingerprints.items()}
+        self.ipv4 = IntervalSet(ipv4, "I")
+        self.ipv6 = IntervalSet(ipv6)
+        self.ports = frozenset(ports)
+
+    @classmethod
+    def empty(cls) -> "IOCStore":
+        none = np.empty(0, dtype=np.uint64)
+        return cls("empty", {k: none for k in ("hash", "domain", "process")}, [], [], [])
+
+    @classmethod
+    def load(cls, feed_dir: str) -> "IOCStore":
+        version = feed_signature(feed_dir)
+        fingerprints: Dict[str, List[np.ndarray]] = {"hash": [], "domain": [], "process": []}
+        ipv4: List[Tuple[int, int]] = []
+        ipv6: List[Tuple[int, int]] = []
+        ports = set()
+
+        for kind, path in feed_files(feed_dir):
+            if kind in fingerprints:
+                fingerprints[kind].append(np.fromiter(
+                    (fingerprint(normalize(kind, value)) for value in _indicators(path)), dtype=np.uint64
+                ))
+            elif kind == "ip":
+                for value in _indicators(path):
+                    try:
+                        network = ipaddress.ip_network(value, strict=False)
+                    except ValueError:
+                        continue
+                    target = ipv4 if network.version == 4 else ipv6
+                    target.append((int(network.network_address), int(network.broadcast_address)))
+            elif kind == "port":
+                ports.update(int(value) for value in _indicators(path) if value.isdigit())
+
+        return cls(
+            version,
+            {kind: np.concatenate(parts) if parts else np.empty(0, dtype=np.uint64)
+             for kind, parts in fingerprints.items()},
+            ipv4, ipv6, ports,
+        )
+
+    def counts(self) -> Dict[str, int]:
+        counts = {kind: len(fps) for kind, fps in self.sets.items()}
+        counts.update(ip_ranges=len(self.ipv4) + len(self.ipv6), ports=len(self.ports))
+        return counts
+
+    @property
+    def nbytes(self) -> int:
+        return sum(s.nbytes for s in self.sets.values()) + self.ipv4.nbytes + self.ipv6.nbytes
+
+    # --- Lookups ---
+
+    def has(self, kind: str, value: str) -> bool:
+        return fingerprint(normalize(kind, value)) in self.sets[kind]
+
+    def has_domain(self, domain: str) -> bool:
+        """The domain or any parent domain is listed."""
+        labels = normalize("domain", domain).split(".")
+        domains = self.sets["domain"]
+        return any(fingerprint(".".join(labels[i:])) in domains for i in range(len(labels) - 1))
+
+    def has_ip(self, text: str) -> bool:
+        parsed = parse_ip(text)
+        if parsed is None:
+            return False
+        version, value = parsed
+        return value in (self.ipv4 if version == 4 else self.ipv6)
+
+    def match_payload(self, payload: Dict[str, Any]) -> List[Dict[str, str]]:
+        """
+        Indicators found in a telemetry payload: process names and optional
+        hashes (processes.names / .suspicious / .hashes), remote endpoints
+        (network.remote_endpoints / .established_connections) and optional
+        looked-up domains (network.domains).
+        """
+        matches: List[Dict[str, str]] = []
+
+        def hit(kind: str, value: str):
+            matches.append({"type": kind, "value": value})
+
+        processes = payload.get("processes")
+        if isinstance(processes, dict) and not processes.get("error"):
+            names = set(processes.get("names") or [])
+            hashes = set(processes.get("hashes") or [])
+            for proc in processes.get("suspicious") or []:
+                names.add(proc.get("name"))
+                hashes.add(proc.get("sha256"))
+            for name in sorted(n for n in names if n):
+                if self.has("process", name):
+                    hit("process", name)
+            for file_hash in sorted(h for h in hashes if h):
+                if self.has("hash", file_hash):
+                    hit("hash", file_hash)
+
+        network = payload.get("network")
+        if isinstance(network, dict) and not network.get("error"):
+            endpoints = set(network.get("remote_endpoints") or [])
+            endpoints.update(c.get("remote_addr") for c in network.get("established_connections") or [])
+            for endpoint in sorted(e for e in endpoints if e):
+                if self.has_ip(endpoint_ip(endpoint)):
+                    hit("ip", endpoint)
+            for domain in sorted(set(d for d in network.get("domains") or [] if d)):
+                if self.has_domain(domain):
+                    hit("domain", domain)
+
+        return matches
+
+
+class IOCEngine:
+    """Owns the current IOCStore and hot-reloads it when the feeds change."""
+
+    def __init__(self, feed_dir: str):
+        self.feed_dir = feed_dir
+        self.store = IOCStore.empty()
+        self._lock = asyncio.Lock()
+
+    async def reload(self, force: bool = False) -> bool:
+        """Rebuild the store off the event loop if the feeds changed."""
+        async with self._lock:
+            signature = await asyncio.to_thread(feed_signature, self.feed_dir)
+            if not force and signature == self.store.version:
+                return False
+            store = await asyncio.to_thread(IOCStore.load, self.feed_dir)
+            self.store = store
+            logger.info(
+                "Loaded IOC feeds %s: %s (%.1f MB)", store.version, store.counts(), store.nbytes / 1e6
+            )
+            return True
+
+    def match_payload(self, payload: Dict[str, Any]) -> List[Dict[str, str]]:
+        return self.store.match_payload(payload)
+
+    async def run(self):
+        """Background loop that picks up new or changed feed files."""
+        while True:
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error("IOC feed reload failed, keeping version %s: %s", self.store.version, e)
+            await asyncio.sleep(settings.IOC_RELOAD_INTERVAL_SECONDS)
+
+
+ioc_engine = IOCEngine(settings.IOC_FEED_DIR)
@@ -0,0 +1,176 @@
+"""
+OCSafe IOC Bundle
+=================
+Compact binary snapshot of the loaded IOC feeds for agents to memory-map
+and match locally (see agent/ioc.py, which mirrors this format).
+
+Layout (little-endian, sections 8-byte aligned):
+
+  header   "<8sI16sI"  magic b"OCIOCBND", format version, IOC version, section count
+  entries  "<4sII"     tag, offset, length; one per section
+  sections
+    PROC / HASH / DOMN  "<BxxxI" mode, num_hashes, then
+                        mode 0: sorted uint64 fingerprints (exact)
+                        mode 1: bloom filter bits, 2^n bits, num_hashes probes
+    IPV4                "<I" count, count uint32 starts, count uint32 ends
+    IPV6                "<I" count, count 16-byte big-endian starts, then ends
+    PORT                uint16 ports
+
+Fingerprint sets up to IOC_BUNDLE_EXACT_MAX entries ship exact, so agents
+never false-positive on process names or domains. Larger ones (typically
+file hashes) ship as bloom filters at IOC_BUNDLE_FP_RATE: about 14 bits per
+indicator instead of 64. A bloom hit is only a candidate; payloads carry
+the indicator and the server confirms it against the exact store. Bloom
+filters use a power-of-two size and a probe count fixed by the FP rate, so
+the layout stays the same as a feed grows and shrinks. That keeps deltas
+small.
+
+Deltas rebuild the new bundle from the agent's copy, section by section
+(unchanged / XOR with the old section / replaced), and are zlib-compressed:
+
+  "<8s16s16sI"  magic b"OCIOCDLT", base version, new version, section count
+  per section "<4sBI" tag, mode (0 copy, 1 xor, 2 replace), length, data
+"""
+import asyncio
+import math
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ioc import IOCStore, ioc_engine
+
+MAGIC = b"OCIOCBND"
+DELTA_MAGIC = b"OCIOCDLT"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sI16sI")
+ENTRY = struct.Struct("<4sII")
+SET_HEADER = struct.Struct("<BxxxI")
+DELTA_HEADER = struct.Struct("<8s16s16sI")
+DELTA_ENTRY = struct.Struct("<4sBI")
+
+SET_TAGS = {"process": b"PROC", "hash": b"HASH", "domain": b"DOMN"}
+MODE_EXACT, MODE_BLOOM = 0, 1
+COPY, XOR, REPLACE = 0, 1, 2
+
+
+def _pad(length: int) -> int:
+    return -length % 8
+
+
+def pack(version: str, sections: List[Tuple[bytes, bytes]]) -> bytes:
+    offset = HEADER.size + ENTRY.size * len(sections)
+    offset += _pad(offset)
+    entries, body = [], []
+    for tag, data in sections:
+        entries.append(ENTRY.pack(tag, offset, len(data)))
+        body.append(data + b"\0" * _pad(len(data)))
+        offset += len(data) + _pad(len(data))
+    head = HEADER.pack(MAGIC, FORMAT_VERSION, version.encode("ascii"), len(sections)) + b"".join(entries)
+    return head + b"\0" * _pad(len(head)) + b"".join(body)
+
+
+def unpack(data: bytes) -> Tuple[str, List[Tuple[bytes, bytes]]]:
+    magic, fmt, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC or fmt != FORMAT_VERSION:
+        raise ValueError("Not an IOC bundle")
+    sections = []
+    for i in range(count):
+        tag, offset, length = ENTRY.unpack_from(data, HEADER.size + i * ENTRY.size)
+        sections.append((tag, bytes(data[offset:offset + length])))
+    return version.rstrip(b"\0").decode("ascii"), sections
+
+
+def bloom_bits(fingerprints: np.ndarray, fp_rate: float) -> Tuple[bytes, int]:
+    """
+    Probe i sets bit (h1 + i * h2) & (m - 1): h1 / h2 are the low / high 32
+    bits of the fingerprint (h2 forced odd) and m is a power of two.
+    """
+    num_hashes = max(1, round(-math.log2(fp_rate)))
+    needed = len(fingerprints) * num_hashes / math.log(2)
+    num_bits = 1 << max(6, math.ceil(math.log2(max(needed, 1))))
+    h1 = fingerprints & np.uint64(0xFFFFFFFF)
+    h2 = (fingerprints >> np.uint64(32)) | np.uint64(1)
+    bits = np.zeros(num_bits, dtype=bool)
+    mask = np.uint64(num_bits - 1)
+    for i in range(num_hashes):
+        bits[(h1 + np.uint64(i) * h2) & mask] = True
+    return np.packbits(bits, bitorder="little").tobytes(), num_hashes
+
+
+def build_bundle(store: IOCStore) -> bytes:
+    sections: List[Tuple[bytes, bytes]] = []
+    for kind, tag in SET_TAGS.items():
+        fingerprints = np.frombuffer(store.sets[kind].sorted, dtype=np.uint64)
+        if len(fingerprints) <= settings.IOC_BUNDLE_EXACT_MAX:
+            sections.append((tag, SET_HEADER.pack(MODE_EXACT, 0) + fingerprints.tobytes()))
+        else:
+            bits, num_hashes = bloom_bits(fingerprints, settings.IOC_BUNDLE_FP_RATE)
+            sections.append((tag, SET_HEADER.pack(MODE_BLOOM, num_hashes) + bits))
+
+    ipv4 = store.ipv4
+    sections.append((b"IPV4", struct.pack("<I", len(ipv4)) + ipv4.starts.tobytes() + ipv4.ends.tobytes()))
+    ipv6 = store.ipv6
+    sections.append((b"IPV6", struct.pack("<I", len(ipv6)) + b"".join(
+        value.to_bytes(16, "big") for value in list(ipv6.starts) + list(ipv6.ends)
+    )))
+    sections.append((b"PORT", np.array(sorted(store.ports), dtype="<u2").tobytes()))
+    return pack(store.version, sections)
+
+
+def build_delta(old: bytes, new: bytes) -> bytes:
+    base_version, old_sections = unpack(old)
+    version, new_sections = unpack(new)
+    previous = dict(old_sections)
+    parts = [DELTA_HEADER.pack(DELTA_MAGIC, base_version.encode(), version.encode(), len(new_sections))]
+    for tag, data in new_sections:
+        before = previous.get(tag)
+        if before == data:
+            parts.append(DELTA_ENTRY.pack(tag, COPY, 0))
+        elif before is not None and len(before) == len(data):
+            diff = (np.frombuffer(before, dtype=np.uint8) ^ np.frombuffer(data, dtype=np.uint8)).tobytes()
+            parts.append(DELTA_ENTRY.pack(tag, XOR, len(diff)) + diff)
+        else:
+            parts.append(DELTA_ENTRY.pack(tag, REPLACE, len(data)) + data)
+    return zlib.compress(b"".join(parts), 6)
+
+
+class IOCBundleCache:
+    """
+    Current bundle plus the last IOC_BUNDLE_HISTORY versions, so agents a
+    few versions behind get a delta instead of the full bundle.
+    """
+
+    def __init__(self):
+        self._bundles: "OrderedDict[str, bytes]" = OrderedDict()
+        self._deltas: Dict[Tuple[str, str], bytes] = {}
+        self._lock = asyncio.Lock()
+
+    async def current(self) -> Tuple[str, bytes]:
+        store = ioc_engine.store
+        if store.version not in self._bundles:
+            async with self._lock:
+                if store.version not in self._bundles:
+                    bundle = await asyncio.to_thread(build_bundle, store)
+                    self._bundles[store.version] = bundle
+                    while len(self._bundles) > settings.IOC_BUNDLE_HISTORY:
+                        dropped, _ = self._bundles.popitem(last=False)
+                        self._deltas = {k: v for k, v in self._deltas.items() if dropped not in k}
+        return store.version, self._bundles[store.version]
+
+    async def delta(self, base_version: str, version: str) -> Optional[bytes]:
+        """Delta from an older retained version, or None if it's no longer retained."""
+        if base_version not in self._bundles or version not in self._bundles:
+            return None
+        key = (base_version, version)
+        if key not in self._deltas:
+            self._deltas[key] = await asyncio.to_thread(
+                build_delta, self._bundles[base_version], self._bundles[version]
+            )
+        return self._deltas[key]
+
+
+ioc_bundles = IOCBundleCache()
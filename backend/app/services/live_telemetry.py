@@ -0,0 +1,187 @@
+"""
+OCSafe Live Telemetry
+=====================
+Recent CPU / RAM / disk / connection samples per device, kept in memory
+for the device detail view's live charts.
+
+Each device gets a fixed-size ring (LIVE_BUFFER_SAMPLES slots) of flat
+typed arrays: one float64 timestamp and four float32 values per sample,
+24 bytes, with no per-sample objects. Ingest appends to the ring and hands
+the sample to any Server-Sent Events subscribers of that device, so a live
+view gets new samples as they arrive without touching the database. A ring
+is backfilled once from telemetry_log the first time a device is viewed
+without having reported to this process yet.
+
+State is per worker process; run the API with a single worker (or sticky
+routing per device) so streams see every sample.
+"""
+import asyncio
+import math
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import desc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.models.core import Device, TelemetryLog
+
+FIELDS = ("cpu_percent", "ram_percent", "disk_percent", "active_connections")
+_NAN = float("nan")
+
+
+class SampleRing:
+    """Fixed-capacity ring of (timestamp, *FIELDS) samples, oldest overwritten first."""
+
+    __slots__ = ("capacity", "times", "values", "head", "size")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("f", bytes(4 * capacity * len(FIELDS)))
+        self.head = 0  # next slot to write
+        self.size = 0
+
+    def append(self, at: float, values: Iterable[float]) -> None:
+        self.times[self.head] = at
+        base = self.head * len(FIELDS)
+        for offset, value in enumerate(values):
+            self.values[base + offset] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def samples(self, after_id: int = 0) -> List[Dict[str, Any]]:
+        """Samples with an id (epoch milliseconds) above `after_id`, oldest first."""
+        start = (self.head - self.size) % self.capacity
+        result = []
+        for i in range(self.size):
+            slot = (start + i) % self.capacity
+            if sample_id(self.times[slot]) > after_id:
+                result.append(_sample(self.times[slot], self.values[slot * len(FIELDS):(slot + 1) * len(FIELDS)]))
+        return result
+
+
+def sample_id(at: float) -> int:
+    return int(at * 1000)
+
+
+def _sample(at: float, values: Iterable[float]) -> Dict[str, Any]:
+    sample: Dict[str, Any] = {"timestamp": datetime.utcfromtimestamp(at).isoformat(), "id": sample_id(at)}
+    for field, value in zip(FIELDS, values):
+        sample[field] = None if math.isnan(value) else round(value, 1)
+    return sample
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else _NAN
+
+
+def extract(payload: Dict[str, Any]) -> Optional[Tuple[float, ...]]:
+    """FIELDS from a telemetry payload (NaN where missing), or None if it has none."""
+    system = payload.get("system") if isinstance(payload.get("system"), dict) else {}
+    network = payload.get("network") if isinstance(payload.get("network"), dict) else {}
+    values = (
+        _number(system.get("cpu_percent")),
+        _number(system.get("ram_percent")),
+        _number(system.get("disk_percent")),
+        _number(network.get("active_connections")),
+    )
+    return None if all(math.isnan(v) for v in values) else values
+
+
+class LiveTelemetry:
+    def __init__(self):
+        self._rings: Dict[int, SampleRing] = {}
+        self._org_of: Dict[int, int] = {}
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+
+    def record(self, organization_id: int, device_id: int, payload: Dict[str, Any],
+               at: Optional[float] = None) -> None:
+        values = extract(payload)
+        if values is None:
+            return
+        at = time.time() if at is None else at
+        ring = self._rings.get(device_id)
+        if ring is None:
+            ring = self._rings[device_id] = SampleRing(settings.LIVE_BUFFER_SAMPLES)
+        self._org_of[device_id] = organization_id
+        ring.append(at, values)
+
+        subscribers = self._subscribers.get(device_id)
+        if subscribers:
+            sample = _sample(at, values)
+            for queue in subscribers:
+                if queue.full():
+                    # A slow reader loses its oldest samples, never blocks ingest
+                    queue.get_nowait()
+                queue.put_nowait(sample)
+
+    async def ensure_loaded(self, db: AsyncSession, organization_id: int, device_id: int) -> bool:
+        """
+        True if the device belongs to the organization. The first time a
+        device is seen without samples, its ring is backfilled from the DB.
+        """
+        known = self._org_of.get(device_id)
+        if known is not None:
+            return known == organization_id
+
+        result = await db.execute(
+            select(Device.id).where(Device.id == device_id, Device.organization_id == organization_id)
+        )
+        if result.scalar() is None:
+            return False
+        rows = await db.execute(
+            select(TelemetryLog.created_at, TelemetryLog.payload["system"], TelemetryLog.payload["network"])
+            .where(TelemetryLog.device_id == device_id)
+            .order_by(desc(TelemetryLog.created_at))
+            .limit(settings.LIVE_BUFFER_SAMPLES)
+        )
+        ring = SampleRing(settings.LIVE_BUFFER_SAMPLES)
+        for created_at, system, network in reversed(rows.all()):
+            # Network counts only matter for the chart; skip the rest of the section
+            network = {"active_connections": (network or {}).get("active_connections")}
+            values = extract({"system": system or {}, "network": network})
+            if values is not None and created_at is not None:
+                ring.append((created_at - datetime(1970, 1, 1)).total_seconds(), values)
+        # Ingests that raced the query are newer; keep theirs
+        self._rings.setdefault(device_id, ring)
+        self._org_of[device_id] = organization_id
+        return True
+
+    def samples(self, device_id: int, after_id: int = 0) -> List[Dict[str, Any]]:
+        ring = self._rings.get(device_id)
+        return ring.samples(after_id) if ring else []
+
+    def subscribe(self, device_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=settings.LIVE_SUBSCRIBER_QUEUE)
+        self._subscribers.setdefault(device_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, device_id: int, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(device_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[device_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def buffered_devices(self) -> int:
+        return len(self._rings)
+
+
+live_telemetry = LiveTelemetry()
+
+registry.gauge(
+    "ocsafe_live_stream_subscribers", "Open live telemetry (SSE) streams",
+    function=live_telemetry.subscriber_count,
+)
+registry.gauge(
+    "ocsafe_live_buffered_devices", "Devices with an in-memory live telemetry ring",
+    function=live_telemetry.buffered_devices,
+)
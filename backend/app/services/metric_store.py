@@ -0,0 +1,199 @@
+"""
+OCSafe Metric Store
+===================
+Device CPU / RAM / disk / connection history as Gorilla-compressed chunks
+(app/core/gorilla.py) instead of decoding JSON payloads.
+
+Ingest appends each payload's metrics to the device's open chunk in
+memory; chunks close after METRIC_CHUNK_SECONDS or METRIC_CHUNK_MAX_SAMPLES
+samples, and every METRIC_FLUSH_INTERVAL_SECONDS the changed ones are
+upserted to metric_chunk, one row per (device, chunk start, worker). A
+history read decodes the chunks overlapping the range, using this
+worker's unflushed chunks in place of their rows.
+
+At a regular 30 s interval a sample (timestamp and four values) takes
+about 16 bytes, against about 90 bytes of JSON for the same fields
+(benchmarks/bench_metric_store.py).
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.gorilla import ChunkEncoder, decode
+from app.db.session import IngestSessionLocal, worker_id
+from app.models.core import MetricChunk
+from app.services.live_telemetry import FIELDS, extract
+
+logger = logging.getLogger(__name__)
+
+
+class OpenChunk:
+    __slots__ = ("organization_id", "device_id", "encoder", "dirty")
+
+    def __init__(self, organization_id: int, device_id: int):
+        self.organization_id = organization_id
+        self.device_id = device_id
+        self.encoder = ChunkEncoder(len(FIELDS))
+        self.dirty = False
+
+    @property
+    def start_at(self) -> datetime:
+        return datetime.utcfromtimestamp(self.encoder.first_timestamp)
+
+    def row(self, worker: str) -> Dict[str, Any]:
+        return {
+            "device_id": self.device_id,
+            "organization_id": self.organization_id,
+            "worker_id": worker,
+            "start_at": self.start_at,
+            "end_at": datetime.utcfromtimestamp(self.encoder.last_timestamp),
+            "sample_count": self.encoder.count,
+            "data": self.encoder.getvalue(),
+            "updated_at": datetime.utcnow(),
+        }
+
+
+def _rows(data: bytes, count: int, since: int, until: int) -> List[Tuple[int, tuple]]:
+    return [row for row in decode(data, count, len(FIELDS)) if since <= row[0] < until]
+
+
+class MetricStore:
+    def __init__(self):
+        self._open: Dict[int, OpenChunk] = {}
+        # Closed chunks not yet written
+        self._closed: List[OpenChunk] = []
+
+    def append(self, organization_id: int, device_id: int, payload: Dict[str, Any],
+               at: Optional[float] = None) -> None:
+        values = extract(payload)
+        if values is None:
+            return
+        timestamp = int(time.time() if at is None else at)
+        chunk = self._open.get(device_id)
+        if chunk is not None and (
+            timestamp - chunk.encoder.first_timestamp >= settings.METRIC_CHUNK_SECONDS
+            or chunk.encoder.count >= settings.METRIC_CHUNK_MAX_SAMPLES
+        ):
+            self._closed.append(chunk)
+            chunk = None
+        if chunk is None:
+            chunk = self._open[device_id] = OpenChunk(organization_id, device_id)
+        chunk.encoder.append(timestamp, values)
+        chunk.dirty = True
+
+    async def history(self, db: AsyncSession, device_id: int, since: datetime,
+                      until: Optional[datetime] = None) -> Tuple[List[Dict[str, Any]], Optional[datetime]]:
+        """
+        Samples in [since, until), oldest first, and the start of the
+        earliest chunk found (None if there are none); older samples only
+        exist as telemetry_log rows.
+        """
+        until = until or datetime.utcnow() + timedelta(seconds=1)
+        local = [chunk for chunk in [*self._closed, self._open.get(device_id)]
+                 if chunk is not None and chunk.device_id == device_id and chunk.encoder.count]
+        local = [(chunk.start_at, chunk.encoder.getvalue(), chunk.encoder.count) for chunk in local
+                 if chunk.start_at < until
+                 and datetime.utcfromtimestamp(chunk.encoder.last_timestamp) >= since]
+        local_starts = {start for start, _, _ in local}
+        me = worker_id()
+
+        result = await db.execute(
+            select(MetricChunk.start_at, MetricChunk.worker_id, MetricChunk.data, MetricChunk.sample_count)
+            .where(
+                MetricChunk.device_id == device_id,
+                MetricChunk.start_at < until,
+                MetricChunk.end_at >= since,
+            )
+        )
+        chunks = [(start, data, count) for start, worker, data, count in result.all()
+                  # This worker's in-memory chunks are newer than its rows
+                  if not (worker == me and start in local_starts)]
+        chunks += local
+        if not chunks:
+            return [], None
+
+        low = int((since - datetime(1970, 1, 1)).total_seconds())
+        high = int((until - datetime(1970, 1, 1)).total_seconds())
+
+        def combine() -> List[Dict[str, Any]]:
+            rows = []
+            for start, data, count in chunks:
+                try:
+                    rows.extend(_rows(data, count, low, high))
+                except ValueError as e:
+                    logger.warning("Skipping metric chunk for device %s at %s: %s", device_id, start, e)
+            rows.sort(key=lambda row: row[0])
+            return [{"timestamp": datetime.utcfromtimestamp(timestamp).isoformat(), **dict(zip(FIELDS, values))}
+                    for timestamp, values in rows]
+
+        return await asyncio.to_thread(combine), min(start for start, _, _ in chunks)
+
+    async def flush(self) -> int:
+        """Upsert every changed chunk; forget closed chunks once written."""
+        me = worker_id()
+        pending = [chunk for chunk in [*self._closed, *self._open.values()] if chunk.dirty]
+        if pending:
+            rows = []
+            for chunk in pending:
+                chunk.dirty = False
+                rows.append(chunk.row(me))
+            # Executemany: SQLAlchemy pages the rows into multi-VALUES batches
+            # below the driver's bind parameter limit, however many are dirty
+            stmt = insert(MetricChunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["device_id", "start_at", "worker_id"],
+                set_={
+                    "end_at": stmt.excluded.end_at,
+                    "sample_count": stmt.excluded.sample_count,
+                    "data": stmt.excluded.data,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            )
+            try:
+                async with IngestSessionLocal() as db:
+                    await db.execute(stmt, rows)
+                    await db.commit()
+            except Exception:
+                for chunk in pending:
+                    chunk.dirty = True
+                logger.exception("Metric chunk flush failed for %d chunks", len(pending))
+                return 0
+
+        self._closed = [chunk for chunk in self._closed if chunk.dirty]
+        # Devices that stopped reporting: their last chunk is written, let it go
+        now = time.time()
+        for device_id, chunk in list(self._open.items()):
+            if not chunk.dirty and now - chunk.encoder.first_timestamp >= settings.METRIC_CHUNK_SECONDS:
+                del self._open[device_id]
+        return len(pending)
+
+    async def prune(self) -> None:
+        cutoff = datetime.utcnow() - timedelta(days=settings.METRIC_RETENTION_DAYS)
+        async with IngestSessionLocal() as db:
+            await db.execute(delete(MetricChunk).where(MetricChunk.end_at < cutoff))
+            await db.commit()
+
+    async def run(self):
+        """Background loop: flush chunks, and drop expired ones about hourly."""
+        flushes_per_prune = max(1, int(3600 / settings.METRIC_FLUSH_INTERVAL_SECONDS))
+        flushes = 0
+        while True:
+            await asyncio.sleep(settings.METRIC_FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+            flushes += 1
+            if flushes % flushes_per_prune == 0:
+                try:
+                    await self.prune()
+                except Exception:
+                    logger.exception("Metric chunk pruning failed")
+
+
+metric_store = MetricStore()
@@ -0,0 +1,259 @@
+"""
+OCSafe Network Sketches
+=======================
+Fleet network statistics without storing connections: per organization
+and SKETCH_WINDOW_SECONDS window, the `network` section of every ingested
+payload feeds
+
+  * a Count-Min sketch with top-K of remote endpoints (ip:port),
+  * a Count-Min sketch with top-K of listening ports,
+  * a HyperLogLog of distinct external IPs for the whole fleet,
+  * a small (sparse until it grows) HyperLogLog of external IPs per device.
+
+Each worker keeps its current windows in memory and upserts them to
+network_sketch every SKETCH_FLUSH_INTERVAL_SECONDS, one row per
+(organization, window, worker). Reads merge every row in the requested
+range with this worker's unflushed state; merging is exact for the
+sketches, so the answer is the same as from a single worker that saw
+everything.
+"""
+import asyncio
+import io
+import ipaddress
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Tuple
+
+import numpy as np
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.sketches import HyperLogLog, TopK, hash64
+from app.db.session import IngestSessionLocal, worker_id
+from app.models.core import NetworkSketch
+from app.services.ioc import IntervalSet, endpoint_ip, parse_ip
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def window_start(at: datetime) -> datetime:
+    seconds = int((at - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % settings.SKETCH_WINDOW_SECONDS)
+
+
+# IPv4 special-purpose ranges (RFC 6890); everything else is external.
+# One bisect instead of ipaddress.is_global, which costs tens of us per call.
+_NON_GLOBAL_V4 = IntervalSet(
+    ((int(n.network_address), int(n.broadcast_address)) for n in map(ipaddress.ip_network, (
+        "0.0.0.0/8", "10.0.0.0/8", "100.64.0.0/10", "127.0.0.0/8", "169.254.0.0/16",
+        "172.16.0.0/12", "192.0.0.0/24", "192.0.2.0/24", "192.168.0.0/16", "198.18.0.0/15",
+        "198.51.100.0/24", "203.0.113.0/24", "224.0.0.0/3",
+    ))),
+    "I",
+)
+
+
+def _is_external(ip: str) -> bool:
+    parsed = parse_ip(ip)
+    if parsed is None:
+        return False
+    version, value = parsed
+    if version == 4:
+        return value not in _NON_GLOBAL_V4
+    return ipaddress.ip_address(value).is_global
+
+
+class NetworkWindow:
+    def __init__(self):
+        self.endpoints = TopK(settings.SKETCH_TOP_K, settings.SKETCH_CMS_WIDTH, settings.SKETCH_CMS_DEPTH)
+        self.ports = TopK(settings.SKETCH_TOP_K, settings.SKETCH_CMS_WIDTH, settings.SKETCH_CMS_DEPTH)
+        self.external_ips = HyperLogLog(settings.SKETCH_HLL_PRECISION)
+        self.device_ips: Dict[int, HyperLogLog] = {}
+        self.dirty = False
+
+    def observe(self, device_id: int, network: Dict[str, Any]) -> None:
+        endpoints = network.get("remote_endpoints")
+        if endpoints is None:
+            endpoints = [c.get("remote_addr") for c in network.get("established_connections") or []]
+        endpoints = [e for e in endpoints if e]
+        self.endpoints.add(endpoints)
+        self.ports.add([port for port in network.get("open_ports") or [] if isinstance(port, int)])
+
+        external = {ip for ip in map(endpoint_ip, endpoints) if _is_external(ip)}
+        if external:
+            device = self.device_ips.get(device_id)
+            if device is None:
+                device = self.device_ips[device_id] = HyperLogLog(settings.SKETCH_DEVICE_HLL_PRECISION)
+            for h in map(hash64, external):
+                device.add_hash(h)
+                self.external_ips.add_hash(h)
+        self.dirty = True
+
+    def merge(self, other: "NetworkWindow") -> None:
+        self.endpoints.merge(other.endpoints)
+        self.ports.merge(other.ports)
+        self.external_ips.merge(other.external_ips)
+        for device_id, hll in other.device_ips.items():
+            if device_id in self.device_ips:
+                self.device_ips[device_id].merge(hll)
+            else:
+                self.device_ips[device_id] = hll
+
+    def copy(self) -> "NetworkWindow":
+        """Snapshot for serializing or merging off the event loop."""
+        copy = NetworkWindow()
+        copy.endpoints = self.endpoints.copy()
+        copy.ports = self.ports.copy()
+        copy.external_ips = self.external_ips.copy()
+        copy.device_ips = {device_id: hll.copy() for device_id, hll in self.device_ips.items()}
+        return copy
+
+    # --- Serialization (.npz, no pickles) ---
+
+    def to_bytes(self) -> bytes:
+        device_ids = sorted(self.device_ips)
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            endpoint_table=self.endpoints.sketch.table,
+            endpoint_keys=np.array(list(self.endpoints.candidates), dtype=str),
+            port_table=self.ports.sketch.table,
+            port_keys=np.array(list(self.ports.candidates), dtype=np.int64),
+            external_ips=self.external_ips.to_array(),
+            device_ids=np.array(device_ids, dtype=np.int64),
+            device_ips=np.array(
+                [self.device_ips[d].to_array() for d in device_ids], dtype=np.uint8
+            ).reshape(len(device_ids), 1 << settings.SKETCH_DEVICE_HLL_PRECISION),
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "NetworkWindow":
+        window = cls()
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            if arrays["endpoint_table"].shape != window.endpoints.sketch.table.shape \
+                    or arrays["device_ips"].shape[1] != 1 << settings.SKETCH_DEVICE_HLL_PRECISION \
+                    or len(arrays["external_ips"]) != window.external_ips.m:
+                raise ValueError("Sketch dimensions differ from the current settings")
+            window.endpoints.sketch.table = arrays["endpoint_table"]
+            window.endpoints.candidates = dict.fromkeys(arrays["endpoint_keys"].tolist(), 0)
+            window.ports.sketch.table = arrays["port_table"]
+            window.ports.candidates = dict.fromkeys(arrays["port_keys"].tolist(), 0)
+            window.external_ips.registers = arrays["external_ips"]
+            for device_id, registers in zip(arrays["device_ids"].tolist(), arrays["device_ips"]):
+                window.device_ips[device_id] = HyperLogLog(settings.SKETCH_DEVICE_HLL_PRECISION, registers)
+        return window
+
+
+class NetworkSketchStore:
+    def __init__(self):
+        # (organization_id, window_start) -> this worker's window
+        self._windows: Dict[Tuple[int, datetime], NetworkWindow] = {}
+
+    def observe(self, organization_id: int, device_id: int, payload: Dict[str, Any],
+                at: datetime = None) -> None:
+        network = payload.get("network")
+        if not isinstance(network, dict) or network.get("error"):
+            return
+        key = (organization_id, window_start(at or datetime.utcnow()))
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = NetworkWindow()
+        window.observe(device_id, network)
+
+    async def merged(self, db: AsyncSession, organization_id: int, hours: int) -> NetworkWindow:
+        """Every worker's sketches for the last `hours`, merged."""
+        since = window_start(datetime.utcnow() - timedelta(hours=hours) + timedelta(
+            seconds=settings.SKETCH_WINDOW_SECONDS))
+        local = {start: window.copy() for (org, start), window in self._windows.items()
+                 if org == organization_id and start >= since}
+        me = worker_id()
+
+        result = await db.execute(
+            select(NetworkSketch.window_start, NetworkSketch.worker_id, NetworkSketch.data)
+            .where(NetworkSketch.organization_id == organization_id, NetworkSketch.window_start >= since)
+        )
+        rows = [(start, data) for start, worker, data in result.all()
+                # This worker's in-memory windows are newer than its rows
+                if not (worker == me and start in local)]
+
+        def combine() -> NetworkWindow:
+            merged = NetworkWindow()
+            for start, data in rows:
+                try:
+                    merged.merge(NetworkWindow.from_bytes(data))
+                except (ValueError, KeyError) as e:
+                    logger.warning("Skipping network sketch for %s: %s", start, e)
+            for window in local.values():
+                merged.merge(window)
+            return merged
+
+        return await asyncio.to_thread(combine)
+
+    async def flush(self) -> int:
+        """Upsert every changed window; forget closed windows once written."""
+        current = window_start(datetime.utcnow())
+        me = worker_id()
+        rows = []
+        for (organization_id, start), window in list(self._windows.items()):
+            if window.dirty:
+                window.dirty = False
+                rows.append({
+                    "organization_id": organization_id,
+                    "window_start": start,
+                    "worker_id": me,
+                    "data": await asyncio.to_thread(window.copy().to_bytes),
+                    "updated_at": datetime.utcnow(),
+                })
+        if rows:
+            # Executemany, paged by SQLAlchemy below the bind parameter limit
+            stmt = insert(NetworkSketch)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["organization_id", "window_start", "worker_id"],
+                set_={"data": stmt.excluded.data, "updated_at": stmt.excluded.updated_at},
+            )
+            try:
+                async with IngestSessionLocal() as db:
+                    await db.execute(stmt, rows)
+                    await db.commit()
+            except Exception:
+                for row in rows:
+                    window = self._windows.get((row["organization_id"], row["window_start"]))
+                    if window is not None:
+                        window.dirty = True
+                logger.exception("Network sketch flush failed for %d windows", len(rows))
+                return 0
+
+        for key, window in list(self._windows.items()):
+            if key[1] < current and not window.dirty:
+                del self._windows[key]
+        return len(rows)
+
+    async def prune(self) -> None:
+        cutoff = datetime.utcnow() - timedelta(days=settings.SKETCH_RETENTION_DAYS)
+        async with IngestSessionLocal() as db:
+            await db.execute(delete(NetworkSketch).where(NetworkSketch.window_start < cutoff))
+            await db.commit()
+
+    async def run(self):
+        """Background loop: flush sketches, and drop expired rows about hourly."""
+        flushes_per_prune = max(1, int(3600 / settings.SKETCH_FLUSH_INTERVAL_SECONDS))
+        flushes = 0
+        while True:
+            await asyncio.sleep(settings.SKETCH_FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+            flushes += 1
+            if flushes % flushes_per_prune == 0:
+                try:
+                    await self.prune()
+                except Exception:
+                    logger.exception("Network sketch pruning failed")
+
+
+network_sketches = NetworkSketchStore()
+
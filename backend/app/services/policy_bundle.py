@@ -0,0 +1,87 @@
+"""
+OCSafe Policy Bundle
+====================
+Each organization's policies compiled into one versioned JSON bundle for
+agents. The version is a hash of the bundle's content, so every worker
+derives the same version for the same policies, and an agent that is up to
+date costs a 304 and a string comparison instead of a query and a full
+serialization.
+
+Bundles are cached per worker. Policy writes invalidate them locally and
+POLICY_BUNDLE_TTL_SECONDS bounds how long other workers keep serving the
+old one. The last POLICY_BUNDLE_HISTORY versions are kept per organization,
+so agents a few versions behind get a delta (upserted / removed policies).
+"""
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.serialization import dumps
+from app.models.core import Policy
+from app.schemas.core import Policy as PolicySchema
+
+
+class PolicyBundle:
+    def __init__(self, policies: List[Dict[str, Any]]):
+        self.policies = {policy["id"]: policy for policy in policies}
+        canonical = dumps(sorted(policies, key=lambda p: p["id"]))
+        self.version = hashlib.sha256(canonical).hexdigest()[:16]
+        self.body = b'{"version":"%s","policies":%s}' % (self.version.encode(), canonical)
+
+    def delta_from(self, base: "PolicyBundle") -> bytes:
+        upserted = [policy for policy_id, policy in sorted(self.policies.items())
+                    if base.policies.get(policy_id) != policy]
+        removed = sorted(set(base.policies) - set(self.policies))
+        return dumps({"version": self.version, "base": base.version, "upserted": upserted, "removed": removed})
+
+
+class PolicyBundleCache:
+    def __init__(self):
+        self._current = TTLCache(maxsize=4096, ttl=settings.POLICY_BUNDLE_TTL_SECONDS)
+        # organization_id -> recent bundles by version, oldest first
+        self._history: Dict[int, "OrderedDict[str, PolicyBundle]"] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    def invalidate(self, organization_id: int) -> None:
+        self._current.pop(organization_id)
+
+    async def _build(self, db: AsyncSession, organization_id: int) -> PolicyBundle:
+        result = await db.execute(select(Policy).where(Policy.organization_id == organization_id))
+        return PolicyBundle([
+            PolicySchema.model_validate(policy).model_dump(mode="json") for policy in result.scalars().all()
+        ])
+
+    async def current(self, db: AsyncSession, organization_id: int) -> PolicyBundle:
+        bundle = self._current.get(organization_id)
+        if bundle is not None:
+            return bundle
+
+        lock = self._locks.setdefault(organization_id, asyncio.Lock())
+        async with lock:
+            bundle = self._current.get(organization_id)
+            if bundle is None:
+                bundle = await self._build(db, organization_id)
+                history = self._history.setdefault(organization_id, OrderedDict())
+                # Keep the existing object for an unchanged version
+                bundle = history.pop(bundle.version, bundle)
+                history[bundle.version] = bundle
+                while len(history) > settings.POLICY_BUNDLE_HISTORY:
+                    history.popitem(last=False)
+                self._current.set(organization_id, bundle)
+        return bundle
+
+    def delta(self, organization_id: int, base_version: str, bundle: PolicyBundle) -> Optional[bytes]:
+        """Delta from an older retained version, or None if it's no longer retained."""
+        base = self._history.get(organization_id, {}).get(base_version)
+        if base is None or base is bundle:
+            return None
+        return bundle.delta_from(base)
+
+
+policy_bundles = PolicyBundleCache()
@@ -0,0 +1,244 @@
+"""
+OCSafe Presence Tracker
+=======================
+Tracks which devices are online using a hashed timer wheel.
+Every heartbeat re-arms the device's timer; devices whose timer fires
+transition to offline. Transitions are pushed to the org's WebSocket
+subscribers and online/offline counts are persisted as a time series.
+
+State is per worker process; run the API with a single worker (or sticky
+routing per device) for consistent counts.
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.sockets import manager
+from app.db.session import AsyncSessionLocal
+from app.models.core import Device, DevicePresenceSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel. Scheduling and cancelling are O(1); advancing the
+    wheel only visits the slots for the elapsed ticks.
+    """
+
+    def __init__(self, tick_seconds: float, slots: int):
+        self.tick_seconds = tick_seconds
+        self._slots: List[Dict[Hashable, float]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._current_tick: Optional[int] = None
+
+    def _tick_for(self, timestamp: float) -> int:
+        return int(timestamp // self.tick_seconds)
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        self.cancel(key)
+        slot = math.ceil(deadline / self.tick_seconds) % len(self._slots)
+        self._slots[slot][key] = deadline
+        self._slot_of[key] = slot
+
+    def cancel(self, key: Hashable) -> None:
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self._slots[slot].pop(key, None)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Return the keys whose deadline has passed, removing them."""
+        now_tick = self._tick_for(now)
+        if self._current_tick is None:
+            self._current_tick = now_tick - 1
+
+        # A full rotation visits every slot, so never walk more than that
+        first_tick = max(self._current_tick + 1, now_tick - len(self._slots) + 1)
+        expired = []
+        for tick in range(first_tick, now_tick + 1):
+            slot = self._slots[tick % len(self._slots)]
+            # Entries further than one rotation away stay for a later round
+            due = [key for key, deadline in slot.items() if deadline <= now]
+            for key in due:
+                del slot[key]
+                del self._slot_of[key]
+            expired.extend(due)
+        self._current_tick = now_tick
+        return expired
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+
+class PresenceTracker:
+    def __init__(self):
+        self.offline_after = settings.PRESENCE_OFFLINE_AFTER_SECONDS
+        tick = settings.PRESENCE_TICK_SECONDS
+        self._wheel = TimerWheel(tick, math.ceil(self.offline_after / tick) + 1)
+        self._org_of: Dict[int, int] = {}
+        self._online: Set[int] = set()
+        self._online_count: Dict[int, int] = {}
+        self._total_count: Dict[int, int] = {}
+        # In-flight broadcasts; the loop only keeps weak references to tasks
+        self._broadcasts: Set[asyncio.Task] = set()
+
+    # --- Device state ---
+
+    def register(self, organization_id: int, device_id: int,
+                 last_heartbeat: Optional[datetime] = None) -> None:
+        """Start tracking a device, online if its last heartbeat is recent."""
+        if device_id in self._org_of:
+            return
+        self._org_of[device_id] = organization_id
+        self._total_count[organization_id] = self._total_count.get(organization_id, 0) + 1
+        self._online_count.setdefault(organization_id, 0)
+
+        if last_heartbeat:
+            silence = (datetime.utcnow() - last_heartbeat).total_seconds()
+            if silence < self.offline_after:
+                self._set_online(device_id, organization_id)
+                self._wheel.schedule(device_id, time.time() + self.offline_after - silence)
+
+    def touch(self, organization_id: int, device_id: int) -> Optional[dict]:
+        """
+        Record activity for a device and re-arm its offline timer.
+        Returns a transition event if the device just came online.
+        """
+        self.register(organization_id, device_id)
+        self._wheel.schedule(device_id, time.time() + self.offline_after)
+        if device_id in self._online:
+            return None
+        self._set_online(device_id, organization_id)
+        event = self._event(device_id, "online")
+        self._publish(organization_id, event)
+        return event
+
+    def expire(self, now: Optional[float] = None) -> List[Tuple[int, dict]]:
+        """Transition devices whose timers fired to offline."""
+        transitions = []
+        for device_id in self._wheel.advance(now or time.time()):
+            if device_id not in self._online:
+                continue
+            organization_id = self._org_of[device_id]
+            self._online.discard(device_id)
+            self._online_count[organization_id] -= 1
+            transitions.append((organization_id, self._event(device_id, "offline")))
+        return transitions
+
+    def _set_online(self, device_id: int, organization_id: int) -> None:
+        self._online.add(device_id)
+        self._online_count[organization_id] += 1
+
+    # --- Reads (O(1)) ---
+
+    def is_online(self, device_id: int) -> bool:
+        return device_id in self._online
+
+    def counts(self, organization_id: int) -> Dict[str, int]:
+        online = self._online_count.get(organization_id, 0)
+        return {
+            "online": online,
+            "offline": self._total_count.get(organization_id, 0) - online,
+        }
+
+    # --- Events ---
+
+    def _event(self, device_id: int, status: str) -> dict:
+        return {
+            "type": "device_status",
+            "device_id": device_id,
+            "status": status,
+            "at": datetime.utcnow().isoformat(),
+        }
+
+    def _publish(self, organization_id: int, event: dict) -> None:
+        if manager.active_connections.get(organization_id):
+            task = asyncio.get_running_loop().create_task(
+                manager.broadcast_to_org(json.dumps(event), organization_id)
+            )
+            self._broadcasts.add(task)
+            task.add_done_callback(self._broadcast_done)
+
+    def _broadcast_done(self, task: asyncio.Task) -> None:
+        self._broadcasts.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Presence broadcast failed", exc_info=task.exception())
+
+    # --- Persistence ---
+
+    async def load(self) -> None:
+        """Seed the tracker with every enrolled device (once per process)."""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Device.id, Device.organization_id, Device.last_heartbeat)
+            )
+            for device_id, organization_id, last_heartbeat in result.all():
+                self.register(organization_id, device_id, last_heartbeat)
+
+    async def snapshot(self) -> None:
+        """Persist current online/offline counts for every organization."""
+        if not self._total_count:
+            return
+        async with AsyncSessionLocal() as db:
+            for organization_id in self._total_count:
+                counts = self.counts(organization_id)
+                db.add(DevicePresenceSnapshot(
+                    organization_id=organization_id,
+                    online_count=counts["online"],
+                    offline_count=counts["offline"],
+                ))
+            await db.commit()
+
+    async def run(self):
+        """Background loop: fire expired timers and take periodic snapshots."""
+        try:
+            await self.load()
+        except Exception:
+            logger.exception("Could not load devices into the presence tracker")
+
+        next_snapshot = time.time() + settings.PRESENCE_SNAPSHOT_INTERVAL_SECONDS
+        while True:
+            await asyncio.sleep(self._wheel.tick_seconds)
+            for organization_id, event in self.expire():
+                self._publish(organization_id, event)
+
+            if time.time() >= next_snapshot:
+                next_snapshot += settings.PRESENCE_SNAPSHOT_INTERVAL_SECONDS
+                try:
+                    await self.snapshot()
+                except Exception:
+                    logger.exception("Presence snapshot failed")
+
+
+async def presence_history(db, organization_id: int, days: int) -> List[dict]:
+    """Daily average online/offline counts from the snapshot time series."""
+    since = datetime.utcnow() - timedelta(days=days)
+    day = func.date(DevicePresenceSnapshot.created_at)
+    result = await db.execute(
+        select(
+            day,
+            func.avg(DevicePresenceSnapshot.online_count),
+            func.avg(DevicePresenceSnapshot.offline_count),
+        )
+        .where(
+            DevicePresenceSnapshot.organization_id == organization_id,
+            DevicePresenceSnapshot.created_at >= since,
+        )
+        .group_by(day)
+        .order_by(day)
+    )
+    return [
+        {"label": str(label), "online": round(online or 0), "offline": round(offline or 0)}
+        for label, online, offline in result.all()
+    ]
+
+
+presence_tracker = PresenceTracker()
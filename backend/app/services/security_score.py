@@ -0,0 +1,111 @@
+"""
+OCSafe Security Score
+=====================
+Org-wide security score derived from the latest risk score of every device.
+Running sums are updated on each ingest, so reading the score is O(1)
+no matter how many devices or telemetry rows an organization has.
+
+Each worker only applies the ingests routed to it, so an organization is
+reconciled against the latest telemetry row of each existing device when
+first read and again after SECURITY_SCORE_REFRESH_SECONDS: scores other
+workers saw are picked up, and deleted devices drop out. Scores are tagged
+with the telemetry row they came from, so neither side overwrites a newer one.
+"""
+import time
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.core import Device, TelemetryLog
+
+
+def status_label(score: int) -> str:
+    if score >= 80:
+        return "Good - Secure"
+    if score >= 50:
+        return "Fair - At Risk"
+    return "Poor - Critical"
+
+
+class SecurityScoreAggregator:
+    def __init__(self):
+        # organization_id -> {device_id: latest risk score}
+        self._latest: Dict[int, Dict[int, int]] = {}
+        self._risk_sum: Dict[int, int] = {}
+        # device_id -> id of the telemetry row its score comes from
+        self._versions: Dict[int, int] = {}
+        # organization_id -> monotonic time of the last reconciliation
+        self._loaded_at: Dict[int, float] = {}
+        self._cache = TTLCache(maxsize=4096, ttl=settings.SECURITY_SCORE_CACHE_TTL_SECONDS)
+
+    def update(self, organization_id: int, device_id: int, risk_score: int,
+               telemetry_id: Optional[int] = None) -> None:
+        """Replace a device's latest risk score and adjust the running sum."""
+        if telemetry_id is not None:
+            if telemetry_id <= self._versions.get(device_id, 0):
+                return
+            self._versions[device_id] = telemetry_id
+        devices = self._latest.setdefault(organization_id, {})
+        previous = devices.get(device_id, 0)
+        devices[device_id] = risk_score
+        self._risk_sum[organization_id] = self._risk_sum.get(organization_id, 0) + risk_score - previous
+
+    def remove(self, organization_id: int, device_id: int) -> None:
+        previous = self._latest.get(organization_id, {}).pop(device_id, None)
+        if previous is not None:
+            self._risk_sum[organization_id] -= previous
+        self._versions.pop(device_id, None)
+
+    def compute(self, organization_id: int) -> Dict[str, Any]:
+        devices = self._latest.get(organization_id)
+        if not devices:
+            return {"score": 0, "max_score": 100, "status_label": "", "devices_scored": 0}
+
+        average_risk = self._risk_sum[organization_id] / len(devices)
+        score = max(0, min(100, round(100 - average_risk)))
+        return {
+            "score": score,
+            "max_score": 100,
+            "status_label": status_label(score),
+            "devices_scored": len(devices),
+        }
+
+    async def load(self, db: AsyncSession, organization_id: int) -> None:
+        """Reconcile an organization with the latest telemetry row of each existing device."""
+        latest_ids = (
+            select(func.max(TelemetryLog.id))
+            .where(TelemetryLog.organization_id == organization_id)
+            .group_by(TelemetryLog.device_id)
+        )
+        # Every device of the organization, with its latest row if it has one
+        result = await db.execute(
+            select(Device.id, TelemetryLog.id, TelemetryLog.threat_evaluation)
+            .outerjoin(TelemetryLog, and_(TelemetryLog.device_id == Device.id, TelemetryLog.id.in_(latest_ids)))
+            .where(Device.organization_id == organization_id)
+        )
+        existing: Set[int] = set()
+        for device_id, telemetry_id, evaluation in result.all():
+            existing.add(device_id)
+            if telemetry_id is not None:
+                self.update(organization_id, device_id, (evaluation or {}).get("risk_score", 0), telemetry_id)
+        for device_id in set(self._latest.get(organization_id, {})) - existing:
+            self.remove(organization_id, device_id)
+        self._loaded_at[organization_id] = time.monotonic()
+
+    async def get_score(self, db: AsyncSession, organization_id: int) -> Dict[str, Any]:
+        cached = self._cache.get(organization_id)
+        if cached is not None:
+            return cached
+        loaded_at = self._loaded_at.get(organization_id, float("-inf"))
+        if time.monotonic() - loaded_at >= settings.SECURITY_SCORE_REFRESH_SECONDS:
+            await self.load(db, organization_id)
+        score = self.compute(organization_id)
+        self._cache.set(organization_id, score)
+        return score
+
+
+security_score = SecurityScoreAggregator()
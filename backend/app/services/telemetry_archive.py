@@ -0,0 +1,277 @@
+"""
+OCSafe Telemetry Archive
+========================
+Cold tier for telemetry_log. Whole UTC days older than TELEMETRY_HOT_DAYS
+are moved out of PostgreSQL into one zlib-compressed document per device
+and day, so the hot table (and its indexes) only holds recent data.
+
+Documents go to a MongoDB collection (TELEMETRY_ARCHIVE_BACKEND="mongo",
+indexed by organization, device and time range) or to files under
+TELEMETRY_ARCHIVE_DIR laid out as <org>/<day>/<device>.jsonl.zz
+("file"); an empty backend disables archiving. A document holds the
+device's rows for the day as JSON lines, ordered by time.
+
+A device-day is written before its rows are deleted, under an id derived
+from (organization, device, day), so a run interrupted in between simply
+rewrites the same document next time; for the same reason every worker
+may run the job. History and export read archived days from here and the
+rest from telemetry_log.
+"""
+import asyncio
+import json
+import logging
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.db.session import IngestSessionLocal
+from app.models.core import TelemetryLog
+
+logger = logging.getLogger(__name__)
+
+archived_rows = registry.counter(
+    "ocsafe_telemetry_archived_rows_total", "telemetry_log rows moved to the archive"
+)
+
+# (organization_id, device_id, day) of a document
+Key = Tuple[int, int, datetime]
+
+
+def hot_since(now: Optional[datetime] = None) -> datetime:
+    """Start of the oldest day kept in telemetry_log; earlier days are archived."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=settings.TELEMETRY_HOT_DAYS)
+    return datetime(cutoff.year, cutoff.month, cutoff.day)
+
+
+def _day(at: datetime) -> datetime:
+    return datetime(at.year, at.month, at.day)
+
+
+def encode_rows(rows: List[tuple]) -> bytes:
+    """(id, created_at, payload, threat_evaluation) rows as compressed JSON lines."""
+    lines = (
+        json.dumps({
+            "id": row_id,
+            "created_at": created_at.isoformat(),
+            "payload": payload,
+            "threat_evaluation": threat_evaluation,
+        }, separators=(",", ":"))
+        for row_id, created_at, payload, threat_evaluation in rows
+    )
+    return zlib.compress("\n".join(lines).encode("utf-8"), 6)
+
+
+def decode_rows(data: bytes) -> List[Dict[str, Any]]:
+    records = []
+    for line in zlib.decompress(data).decode("utf-8").splitlines():
+        record = json.loads(line)
+        record["created_at"] = datetime.fromisoformat(record["created_at"])
+        records.append(record)
+    return records
+
+
+class FileArchive:
+    """One file per device-day; the directory layout is the time index."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, organization_id: int, device_id: int, day: datetime) -> str:
+        return os.path.join(self.root, str(organization_id), f"{day:%Y-%m-%d}", f"{device_id}.jsonl.zz")
+
+    async def put(self, key: Key, start_at: datetime, end_at: datetime, count: int, data: bytes) -> None:
+        path = self._path(*key)
+
+        def write():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+
+        await asyncio.to_thread(write)
+
+    async def find(self, organization_id: int, device_id: Optional[int],
+                   since: datetime, until: datetime) -> AsyncIterator[Tuple[Key, bytes]]:
+        """Documents overlapping [since, until), by day and then device."""
+        org_dir = os.path.join(self.root, str(organization_id))
+
+        def listing():
+            if not os.path.isdir(org_dir):
+                return []
+            found = []
+            for name in sorted(os.listdir(org_dir)):
+                try:
+                    day = datetime.strptime(name, "%Y-%m-%d")
+                except ValueError:
+                    continue
+                if day + timedelta(days=1) <= since or day >= until:
+                    continue
+                devices = [device_id] if device_id is not None else sorted(
+                    int(f.split(".", 1)[0]) for f in os.listdir(os.path.join(org_dir, name))
+                    if f.endswith(".jsonl.zz")
+                )
+                found.extend((organization_id, device, day) for device in devices)
+            return found
+
+        for key in await asyncio.to_thread(listing):
+            try:
+                with open(self._path(*key), "rb") as f:
+                    data = await asyncio.to_thread(f.read)
+            except FileNotFoundError:
+                continue
+            yield key, data
+
+
+class MongoArchive:
+    """Documents in the telemetry_archive collection of MONGODB_DB."""
+
+    def __init__(self):
+        self._collection = None
+
+    async def collection(self):
+        if self._collection is None:
+            from app.db.mongodb import mongodb
+
+            if mongodb.db is None:
+                await mongodb.connect_to_database()
+            collection = mongodb.db["telemetry_archive"]
+            await collection.create_index([("organization_id", 1), ("start_at", 1), ("end_at", 1)])
+            await collection.create_index([("organization_id", 1), ("device_id", 1), ("start_at", 1)])
+            self._collection = collection
+        return self._collection
+
+    async def put(self, key: Key, start_at: datetime, end_at: datetime, count: int, data: bytes) -> None:
+        organization_id, device_id, day = key
+        collection = await self.collection()
+        await collection.replace_one(
+            {"_id": f"{organization_id}:{device_id}:{day:%Y-%m-%d}"},
+            {
+                "organization_id": organization_id,
+                "device_id": device_id,
+                "day": day,
+                "start_at": start_at,
+                "end_at": end_at,
+                "count": count,
+                "data": data,
+            },
+            upsert=True,
+        )
+
+    async def find(self, organization_id: int, device_id: Optional[int],
+                   since: datetime, until: datetime) -> AsyncIterator[Tuple[Key, bytes]]:
+        """Documents overlapping [since, until), by day and then device."""
+        collection = await self.collection()
+        query: Dict[str, Any] = {
+            "organization_id": organization_id,
+            "start_at": {"$lt": until},
+            "end_at": {"$gte": since},
+        }
+        if device_id is not None:
+            query["device_id"] = device_id
+        cursor = collection.find(query).sort([("day", 1), ("device_id", 1)])
+        async for document in cursor:
+            yield (document["organization_id"], document["device_id"], document["day"]), document["data"]
+
+
+class TelemetryArchive:
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.TELEMETRY_ARCHIVE_BACKEND)
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if settings.TELEMETRY_ARCHIVE_BACKEND == "mongo":
+                self._backend = MongoArchive()
+            elif settings.TELEMETRY_ARCHIVE_BACKEND == "file":
+                self._backend = FileArchive(settings.TELEMETRY_ARCHIVE_DIR)
+            else:
+                raise ValueError(f"Unknown archive backend: {settings.TELEMETRY_ARCHIVE_BACKEND!r}")
+        return self._backend
+
+    # --- Tiering ---
+
+    async def archive_due(self) -> int:
+        """Move every day before hot_since() to the archive, oldest first."""
+        cutoff = hot_since()
+        moved = 0
+        async with IngestSessionLocal() as db:
+            while True:
+                oldest = (await db.execute(
+                    select(func.min(TelemetryLog.created_at))
+                    .where(TelemetryLog.created_at < cutoff, TelemetryLog.device_id.isnot(None))
+                )).scalar()
+                if oldest is None:
+                    return moved
+                day = _day(oldest)
+                groups = (await db.execute(
+                    select(TelemetryLog.organization_id, TelemetryLog.device_id)
+                    .where(TelemetryLog.created_at >= day, TelemetryLog.created_at < day + timedelta(days=1),
+                           TelemetryLog.device_id.isnot(None))
+                    .distinct()
+                )).all()
+                await db.rollback()  # don't hold a snapshot across the archive writes
+                for organization_id, device_id in groups:
+                    moved += await self._archive_device_day(db, organization_id, device_id, day)
+                logger.info("Archived telemetry for %s (%d devices)", f"{day:%Y-%m-%d}", len(groups))
+
+    async def _archive_device_day(self, db, organization_id: int, device_id: int, day: datetime) -> int:
+        in_day = (
+            TelemetryLog.device_id == device_id,
+            TelemetryLog.created_at >= day,
+            TelemetryLog.created_at < day + timedelta(days=1),
+        )
+        rows = (await db.execute(
+            select(TelemetryLog.id, TelemetryLog.created_at, TelemetryLog.payload, TelemetryLog.threat_evaluation)
+            .where(*in_day)
+            .order_by(TelemetryLog.created_at, TelemetryLog.id)
+        )).all()
+        if not rows:
+            return 0
+        data = await asyncio.to_thread(encode_rows, rows)
+        await self.backend.put((organization_id, device_id, day), rows[0][1], rows[-1][1], len(rows), data)
+        await db.execute(delete(TelemetryLog).where(*in_day))
+        await db.commit()
+        archived_rows.inc(len(rows))
+        return len(rows)
+
+    async def run(self):
+        """Background loop: archive due days every TELEMETRY_ARCHIVE_INTERVAL_SECONDS."""
+        if not self.enabled:
+            return
+        while True:
+            try:
+                await self.archive_due()
+            except Exception:
+                logger.exception("Telemetry archiving failed")
+            await asyncio.sleep(settings.TELEMETRY_ARCHIVE_INTERVAL_SECONDS)
+
+    # --- Reads ---
+
+    async def records(self, organization_id: int, device_id: Optional[int],
+                      since: datetime, until: datetime) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Archived rows in [since, until), one list per document: by day,
+        then device, then time. Nothing is archived after hot_since().
+        """
+        if not self.enabled or since >= hot_since():
+            return
+        async for (_, document_device, _), data in self.backend.find(organization_id, device_id, since, until):
+            records = await asyncio.to_thread(decode_rows, data)
+            records = [r for r in records if since <= r["created_at"] < until]
+            for record in records:
+                record["device_id"] = document_device
+            if records:
+                yield records
+
+
+telemetry_archive = TelemetryArchive()
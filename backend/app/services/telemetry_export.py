@@ -0,0 +1,219 @@
+"""
+OCSafe Telemetry Export
+=======================
+Streams telemetry_log rows for an organization (optionally one device and a
+time range) as CSV, Arrow IPC (stream format) or Parquet.
+
+Rows are read with a server-side cursor in EXPORT_BATCH_SIZE chunks and each
+chunk is encoded and handed to the caller before the next is fetched, so
+memory stays bounded by one batch whatever the export size. Chart metrics and
+the risk score are extracted in SQL; the full payload and threat evaluation
+are exported as their stored JSON text without being decoded.
+
+Days moved to the cold tier (app/services/telemetry_archive.py) are
+exported first, one archive document at a time: device by device within
+each day, then the telemetry_log rows in time order.
+"""
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+from sqlalchemy import Text, cast
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.models.core import TelemetryLog
+from app.services.telemetry_archive import telemetry_archive
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - only needed for arrow/parquet
+    pa = None
+    pq = None
+
+COLUMNS = (
+    "id", "device_id", "created_at", "cpu_percent", "ram_percent", "disk_percent",
+    "risk_score", "payload", "threat_evaluation",
+)
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("device_id", pa.int64()),
+        ("created_at", pa.timestamp("us")),
+        ("cpu_percent", pa.float64()),
+        ("ram_percent", pa.float64()),
+        ("disk_percent", pa.float64()),
+        ("risk_score", pa.int32()),
+        ("payload", pa.string()),
+        ("threat_evaluation", pa.string()),
+    ])
+
+
+def available_formats() -> List[str]:
+    if pa is None:
+        return ["csv"]
+    return list(FORMATS)
+
+
+def export_query(
+    organization_id: int,
+    device_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+):
+    payload = TelemetryLog.payload
+    query = (
+        select(
+            TelemetryLog.id,
+            TelemetryLog.device_id,
+            TelemetryLog.created_at,
+            payload[("system", "cpu_percent")].as_float(),
+            payload[("system", "ram_percent")].as_float(),
+            payload[("system", "disk_percent")].as_float(),
+            TelemetryLog.threat_evaluation["risk_score"].as_integer(),
+            cast(TelemetryLog.payload, Text),
+            cast(TelemetryLog.threat_evaluation, Text),
+        )
+        .where(TelemetryLog.organization_id == organization_id)
+        .order_by(TelemetryLog.created_at, TelemetryLog.id)
+    )
+    if device_id is not None:
+        query = query.where(TelemetryLog.device_id == device_id)
+    if since is not None:
+        query = query.where(TelemetryLog.created_at >= since)
+    if until is not None:
+        query = query.where(TelemetryLog.created_at < until)
+    return query
+
+
+def _archived_row(record: Dict[str, Any]) -> tuple:
+    payload = record["payload"]
+    system = payload.get("system") if isinstance(payload, dict) else None
+    system = system if isinstance(system, dict) else {}
+    evaluation = record["threat_evaluation"]
+    metrics = []
+    for field in ("cpu_percent", "ram_percent", "disk_percent"):
+        value = system.get(field)
+        metrics.append(float(value) if isinstance(value, (int, float)) else None)
+    return (
+        record["id"],
+        record["device_id"],
+        record["created_at"],
+        *metrics,
+        evaluation.get("risk_score") if isinstance(evaluation, dict) else None,
+        json.dumps(payload),
+        json.dumps(evaluation),
+    )
+
+
+async def archived_batches(
+    organization_id: int,
+    device_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> AsyncIterator[List[tuple]]:
+    """Archived rows in the range, as export_query columns."""
+    async for records in telemetry_archive.records(
+        organization_id, device_id, since or datetime.min, until or datetime.utcnow()
+    ):
+        yield await asyncio.to_thread(lambda: [_archived_row(r) for r in records])
+
+
+class _CSVEncoder:
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._writer.writerow(COLUMNS)
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode("utf-8")
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        self._writer.writerows(
+            (row[0], row[1], row[2].isoformat() if row[2] else "", *row[3:]) for row in rows
+        )
+        return self._drain()
+
+    def close(self) -> bytes:
+        return self._drain()
+
+
+class _ArrowEncoder:
+    """Arrow IPC stream or Parquet; one record batch / row group per DB batch."""
+
+    def __init__(self, fmt: str):
+        self._schema = _schema()
+        self._buffer = io.BytesIO()
+        if fmt == "parquet":
+            self._writer = pq.ParquetWriter(self._buffer, self._schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_stream(self._buffer, self._schema)
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def encode(self, rows: Sequence[tuple]) -> bytes:
+        columns = list(zip(*rows))
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+            schema=self._schema,
+        )
+        self._writer.write_batch(batch)
+        return self._drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._drain()
+
+
+def _encoder(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if fmt == "csv":
+        return _CSVEncoder()
+    if pa is None:
+        raise ValueError(f"{fmt} export requires pyarrow to be installed")
+    return _ArrowEncoder(fmt)
+
+
+async def export_chunks(
+    db: AsyncSession, query, fmt: str, archived: Optional[AsyncIterator[List[tuple]]] = None
+) -> AsyncIterator[bytes]:
+    """
+    Encoded export, one chunk per database batch (after one per batch of
+    `archived` rows, if given). Encoding runs in a worker thread so large
+    batches don't stall the event loop.
+    """
+    encoder = _encoder(fmt)
+    if archived is not None:
+        async for rows in archived:
+            chunk = await asyncio.to_thread(encoder.encode, rows)
+            if chunk:
+                yield chunk
+    stream = await db.stream(query.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+    async for rows in stream.partitions():
+        chunk = await asyncio.to_thread(encoder.encode, rows)
+        if chunk:
+            yield chunk
+    tail = await asyncio.to_thread(encoder.close)
+    if tail:
+        yield tail
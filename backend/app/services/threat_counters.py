@@ -0,0 +1,158 @@
+"""
+OCSafe Threat Counters
+======================
+Per-org hourly and daily counters of detected threats and risk buckets.
+The ingest path increments them with a single upsert, and the dashboard
+charts read at most one row per bucket instead of scanning telemetry_log.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.models.core import ThreatCounter
+
+COUNTER_COLUMNS = ("threats", "low", "medium", "high")
+GRANULARITIES = ("hour", "day")
+
+
+def risk_bucket(risk_score: int) -> str:
+    if risk_score >= 70:
+        return "high"
+    if risk_score >= 30:
+        return "medium"
+    return "low"
+
+
+def bucket_start(at: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def increments(evaluation: Optional[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+    """Counter deltas for one threat evaluation, or None if nothing to count."""
+    if not evaluation or not evaluation.get("is_threat"):
+        return None
+    deltas = dict.fromkeys(COUNTER_COLUMNS, 0)
+    deltas["threats"] = evaluation.get("threat_count", 0)
+    deltas[risk_bucket(evaluation.get("risk_score", 0))] = 1
+    return deltas
+
+
+# Executed with a list of rows (executemany), which SQLAlchemy pages into
+# batches below the driver's bind parameter limit however many buckets there are
+_upsert = insert(ThreatCounter)
+_upsert = _upsert.on_conflict_do_update(
+    index_elements=["organization_id", "granularity", "bucket_start"],
+    set_={
+        column: getattr(ThreatCounter.__table__.c, column) + getattr(_upsert.excluded, column)
+        for column in COUNTER_COLUMNS
+    },
+)
+
+
+async def record(db: AsyncSession, organization_id: int,
+                 evaluation: Dict[str, Any], at: Optional[datetime] = None) -> None:
+    """Increment the hour and day counters for one evaluation (no commit)."""
+    deltas = increments(evaluation)
+    if deltas is None:
+        return
+    at = at or datetime.utcnow()
+    rows = [
+        {
+            "organization_id": organization_id,
+            "granularity": granularity,
+            "bucket_start": bucket_start(at, granularity),
+            **deltas,
+        }
+        for granularity in GRANULARITIES
+    ]
+    await db.execute(_upsert, rows)
+
+
+async def record_many(db: AsyncSession, buckets: Dict[tuple, Dict[str, int]]) -> None:
+    """Increment many pre-aggregated (org, granularity, bucket_start) counters."""
+    if not buckets:
+        return
+    rows = [
+        {
+            "organization_id": organization_id,
+            "granularity": granularity,
+            "bucket_start": start,
+            **deltas,
+        }
+        for (organization_id, granularity, start), deltas in buckets.items()
+    ]
+    await db.execute(_upsert, rows)
+
+
+def aggregate(buckets: Dict[tuple, Dict[str, int]], organization_id: int,
+              evaluation: Optional[Dict[str, Any]], at: datetime) -> None:
+    """Fold one evaluation into an in-memory bucket map (used by the backfill)."""
+    deltas = increments(evaluation)
+    if deltas is None:
+        return
+    for granularity in GRANULARITIES:
+        counts = buckets[(organization_id, granularity, bucket_start(at, granularity))]
+        for column, value in deltas.items():
+            counts[column] += value
+
+
+def new_bucket_map() -> Dict[tuple, Dict[str, int]]:
+    return defaultdict(lambda: dict.fromkeys(COUNTER_COLUMNS, 0))
+
+
+async def _rows_since(db: AsyncSession, organization_id: int,
+                      granularity: str, since: datetime) -> Iterable[ThreatCounter]:
+    result = await db.execute(
+        select(ThreatCounter).where(
+            ThreatCounter.organization_id == organization_id,
+            ThreatCounter.granularity == granularity,
+            ThreatCounter.bucket_start >= since,
+        )
+    )
+    return result.scalars().all()
+
+
+async def threat_series(db: AsyncSession, organization_id: int,
+                        days: int, granularity: str = "day") -> Dict[str, list]:
+    """Threat counts per bucket over the last `days`, zero-filled."""
+    now = datetime.utcnow()
+    if granularity == "hour":
+        step = timedelta(hours=1)
+        periods = days * 24
+    else:
+        step = timedelta(days=1)
+        periods = days
+    first = bucket_start(now, granularity) - step * (periods - 1)
+
+    counts = {row.bucket_start: row.threats for row in await _rows_since(db, organization_id, granularity, first)}
+    labels, data = [], []
+    for index in range(periods):
+        start = first + step * index
+        labels.append(start.strftime("%Y-%m-%d %H:00" if granularity == "hour" else "%Y-%m-%d"))
+        data.append(counts.get(start, 0))
+    return {"labels": labels, "data": data}
+
+
+async def risk_distribution(db: AsyncSession, organization_id: int, days: int) -> Dict[str, int]:
+    """Low/medium/high threat evaluations summed over the last `days`."""
+    since = bucket_start(datetime.utcnow(), "day") - timedelta(days=days - 1)
+    result = await db.execute(
+        select(
+            func.coalesce(func.sum(ThreatCounter.low), 0),
+            func.coalesce(func.sum(ThreatCounter.medium), 0),
+            func.coalesce(func.sum(ThreatCounter.high), 0),
+        ).where(
+            ThreatCounter.organization_id == organization_id,
+            ThreatCounter.granularity == "day",
+            ThreatCounter.bucket_start >= since,
+        )
+    )
+    low, medium, high = result.one()
+    return {"low": int(low), "medium": int(medium), "high": int(high)}
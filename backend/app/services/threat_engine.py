@@ -2,19 +2,48 @@
 OCSafe Threat Engine
 ====================
 Rule-based threat detection that evaluates incoming telemetry.
-Flags disabled security, suspicious processes, and anomalous network activity.
+Flags disabled security, suspicious processes, anomalous network activity
+and matches against the loaded IOC feeds (see app/services/ioc.py).
 """
 from typing import Any, Dict, List
 
+from app.services.ioc import ioc_engine
+
+# Used when no ports feed is loaded
+DEFAULT_DANGEROUS_PORTS = frozenset({4444, 5555, 1337, 31337, 6666, 6667})
+
+# Agent reasons by rule, for agents that don't send "rule" yet
+_LEGACY_PROCESS_RULES = (
+    ("Known malicious tool", "known_tool"),
+    ("Blocked by policy", "policy"),
+    ("IOC feed match", "ioc"),
+    ("High CPU", "high_cpu"),
+)
+
+
+def process_rule(proc: Dict[str, Any]) -> str:
+    """Which agent rule flagged a suspicious process ("" if unknown)."""
+    if proc.get("rule"):
+        return proc["rule"]
+    reason = str(proc.get("reason", ""))
+    for prefix, rule in _LEGACY_PROCESS_RULES:
+        if reason.startswith(prefix):
+            return rule
+    return ""
+
 
 class ThreatEngine:
     def evaluate_telemetry(self, device_id: int, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
         Evaluate incoming telemetry against security rules.
-        Returns threat assessment with risk score.
+        Returns threat assessment with risk score. Besides the human-readable
+        reasons, suspicious processes and IOC matches are listed as data for
+        consumers such as the correlation engine.
         """
         reasons = []
         risk_score = 0
+        suspicious_processes: List[Dict[str, str]] = []
+        ioc_matches: List[Dict[str, str]] = []
 
         # --- Security Status Checks ---
         security = payload.get("security", {})
@@ -39,19 +68,26 @@ class ThreatEngine:
             for proc in suspicious:
                 reason = proc.get("reason", "Suspicious activity")
                 reasons.append(f"Suspicious process: {proc.get('name', 'unknown')} - {reason}")
+                suspicious_processes.append({"name": proc.get("name") or "", "rule": process_rule(proc)})
                 risk_score += 25
 
         # --- Network Checks ---
         network = payload.get("network", {})
         if network and not network.get("error"):
             # Flag common attack ports being open
-            dangerous_ports = {4444, 5555, 1337, 31337, 6666, 6667}
+            dangerous_ports = ioc_engine.store.ports or DEFAULT_DANGEROUS_PORTS
             open_ports = set(network.get("open_ports", []))
             flagged_ports = open_ports & dangerous_ports
             if flagged_ports:
                 reasons.append(f"Suspicious open ports: {sorted(flagged_ports)}")
                 risk_score += 20
 
+        # --- IOC Feed Matches ---
+        for match in ioc_engine.match_payload(payload):
+            reasons.append(f"IOC match ({match['type']}): {match['value']}")
+            ioc_matches.append({"type": match["type"], "value": match["value"]})
+            risk_score += 40
+
         # --- System Health Checks ---
         system = payload.get("system", {})
         if system and not system.get("error"):
@@ -67,6 +103,8 @@ class ThreatEngine:
             "reasons": reasons,
             "risk_score": risk_score,
             "threat_count": len(reasons),
+            "suspicious_processes": suspicious_processes,
+            "ioc_matches": ioc_matches,
         }
 
 
@@ -0,0 +1,82 @@
+"""
+OCSafe - Rebuild the pre-aggregated threat counters from telemetry history.
+
+Streams telemetry_log with a server-side cursor, folds each evaluation into
+hour/day buckets in memory, and upserts the buckets in batches, so memory
+stays bounded regardless of how much history exists.
+
+Existing counters in the rebuilt range are deleted first; pause ingestion
+(or accept a small overlap in the current hour) while it runs.
+
+Usage:
+  cd backend
+  python backfill_threat_counters.py            # full history
+  python backfill_threat_counters.py --days 90  # last 90 days only
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.future import select
+
+from app.db.session import AsyncSessionLocal
+from app.models.core import TelemetryLog, ThreatCounter
+from app.services import threat_counters
+
+STREAM_BATCH_SIZE = 5_000
+# Flush the in-memory bucket map once it holds this many buckets
+MAX_PENDING_BUCKETS = 10_000
+
+
+async def backfill(days: Optional[int] = None):
+    since = None
+    if days:
+        since = threat_counters.bucket_start(datetime.utcnow() - timedelta(days=days), "day")
+
+    async with AsyncSessionLocal() as db:
+        clear = delete(ThreatCounter)
+        if since:
+            clear = clear.where(ThreatCounter.bucket_start >= since)
+        await db.execute(clear)
+        await db.commit()
+        print(f"[OK] Cleared existing counters{f' since {since:%Y-%m-%d}' if since else ''}")
+
+    query = select(
+        TelemetryLog.organization_id,
+        TelemetryLog.created_at,
+        TelemetryLog.threat_evaluation,
+    ).execution_options(yield_per=STREAM_BATCH_SIZE)
+    if since:
+        query = query.where(TelemetryLog.created_at >= since)
+
+    scanned = 0
+    buckets = threat_counters.new_bucket_map()
+
+    # Separate sessions: one holds the server-side cursor, one writes
+    async with AsyncSessionLocal() as reader, AsyncSessionLocal() as writer:
+        stream = await reader.stream(query)
+        async for organization_id, created_at, evaluation in stream:
+            scanned += 1
+            if created_at is None:
+                continue
+            threat_counters.aggregate(buckets, organization_id, evaluation, created_at)
+
+            if len(buckets) >= MAX_PENDING_BUCKETS:
+                await threat_counters.record_many(writer, buckets)
+                await writer.commit()
+                buckets = threat_counters.new_bucket_map()
+                print(f"  ... {scanned} telemetry rows processed")
+
+        await threat_counters.record_many(writer, buckets)
+        await writer.commit()
+
+    print(f"[DONE] Backfilled threat counters from {scanned} telemetry rows.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=None, help="Only rebuild the last N days")
+    args = parser.parse_args()
+    asyncio.run(backfill(args.days))
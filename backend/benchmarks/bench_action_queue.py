@@ -0,0 +1,108 @@
+"""
+Benchmark: action queue throughput under many concurrent agents.
+
+Creates a scratch organization with DEVICES devices and queues ACTIONS
+actions for each (one bulk insert), then runs AGENTS concurrent pollers
+against the configured PostgreSQL database. Each poller works on a random
+device: claim a batch, acknowledge it, repeat until the queue is drained.
+Several pollers share each device, as retrying agents or several workers
+would, to exercise SKIP LOCKED. Reports claims and acks per second, poll
+latency, and checks that no action was handed out twice within its lease.
+The scratch rows are deleted afterwards.
+
+Needs PostgreSQL: other databases ignore FOR UPDATE SKIP LOCKED, so a
+clean run there says nothing about concurrent claiming, and the script
+refuses to start. Pool sizes come from the usual settings; with more
+AGENTS than INGEST_DB_POOL_SIZE, poll latency includes pool waits.
+
+Usage:
+  cd backend
+  python -m benchmarks.bench_action_queue
+"""
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from collections import Counter
+
+from sqlalchemy import delete, insert
+
+from app.db.session import IngestSessionLocal, ingest_engine
+from app.models.core import Device, DeviceAction, Organization
+from app.services import action_queue
+
+DEVICES = 500
+ACTIONS = 20
+AGENTS = 32
+BATCH = 5
+
+
+async def seed():
+    async with IngestSessionLocal() as db:
+        org = Organization(name=f"bench-{uuid.uuid4().hex[:8]}")
+        db.add(org)
+        await db.flush()
+        devices = [Device(hostname=f"bench-{i}", os_type="linux", mac_address=f"bench-{org.id}-{i}",
+                          organization_id=org.id) for i in range(DEVICES)]
+        db.add_all(devices)
+        await db.flush()
+        device_ids = [device.id for device in devices]
+        await db.execute(insert(DeviceAction), [
+            {"device_id": device_id, "action_type": "scan", "status": "pending"}
+            for device_id in device_ids for _ in range(ACTIONS)
+        ])
+        await db.commit()
+        return org.id, device_ids
+
+
+async def cleanup(organization_id, device_ids):
+    async with IngestSessionLocal() as db:
+        await db.execute(delete(DeviceAction).where(DeviceAction.device_id.in_(device_ids)))
+        await db.execute(delete(Device).where(Device.organization_id == organization_id))
+        await db.execute(delete(Organization).where(Organization.id == organization_id))
+        await db.commit()
+
+
+async def agent(remaining, claimed, latencies, rng):
+    while remaining:
+        device_id = rng.choice(list(remaining))
+        async with IngestSessionLocal() as db:
+            start = time.perf_counter()
+            actions = await action_queue.claim(db, device_id, BATCH)
+            latencies.append(time.perf_counter() - start)
+            if not actions:
+                remaining.discard(device_id)
+                continue
+            claimed.update(action.id for action in actions)
+            await action_queue.ack(db, device_id, [{"id": a.id, "status": "completed"} for a in actions])
+
+
+async def main():
+    if ingest_engine.dialect.name != "postgresql":
+        raise SystemExit(f"Needs PostgreSQL, not {ingest_engine.dialect.name}")
+    organization_id, device_ids = await seed()
+    print(f"{DEVICES} devices x {ACTIONS} actions, {AGENTS} concurrent agents, batch {BATCH}")
+    try:
+        remaining = set(device_ids)
+        claimed, latencies = Counter(), []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            agent(remaining, claimed, latencies, random.Random(i)) for i in range(AGENTS)
+        ))
+        elapsed = time.perf_counter() - start
+
+        total = DEVICES * ACTIONS
+        latencies.sort()
+        print(f"drained {sum(claimed.values())} claims in {elapsed:.1f} s: "
+              f"{total / elapsed:,.0f} actions/s claimed and acknowledged")
+        print(f"poll latency: median {statistics.median(latencies) * 1000:.1f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms over {len(latencies)} polls")
+        duplicates = sum(1 for count in claimed.values() if count > 1)
+        print(f"actions claimed more than once: {duplicates}; never claimed: {total - len(claimed)}")
+    finally:
+        await cleanup(organization_id, device_ids)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
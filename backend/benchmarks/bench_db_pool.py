@@ -0,0 +1,101 @@
+"""
+Benchmark: ingest throughput at different pool sizes.
+
+Runs CONCURRENCY simulated agents, each doing the ingest path's database
+work (device lookup + telemetry insert + commit), against the configured
+PostgreSQL database for each pool size, and reports ingests/second and the
+mean time spent waiting for a pooled connection.
+
+Requires a reachable database (see app/core/config.py). A throwaway
+organization and device are created and removed afterwards.
+
+Usage:
+  cd backend
+  python -m benchmarks.bench_db_pool
+"""
+import asyncio
+import time
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from app.db.session import AsyncSessionLocal, create_engine_for, pool_checkouts, pool_wait_seconds
+from app.models.core import Device, Organization, TelemetryLog
+
+POOL_SIZES = [2, 5, 10, 20, 40]
+CONCURRENCY = 100
+REQUESTS_PER_WORKER = 50
+
+SAMPLE_PAYLOAD = {
+    "system": {"cpu_percent": 32.5, "ram_percent": 67.3, "disk_percent": 72.4},
+    "security": {"firewall_enabled": True, "antivirus_enabled": True},
+    "processes": {"total_count": 287, "suspicious": []},
+    "network": {"active_connections": 42, "open_ports": [80, 443]},
+}
+
+
+async def create_fixture():
+    async with AsyncSessionLocal() as db:
+        org = Organization(name="bench-pool")
+        db.add(org)
+        await db.flush()
+        device = Device(hostname="bench", os_type="linux", mac_address=f"bench-{time.time()}",
+                        organization_id=org.id)
+        db.add(device)
+        await db.commit()
+        return org.id, device.id
+
+
+async def drop_fixture(organization_id: int, device_id: int):
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(TelemetryLog).where(TelemetryLog.device_id == device_id))
+        await db.execute(delete(Device).where(Device.id == device_id))
+        await db.execute(delete(Organization).where(Organization.id == organization_id))
+        await db.commit()
+
+
+async def agent(session_factory, organization_id: int, device_id: int):
+    for _ in range(REQUESTS_PER_WORKER):
+        async with session_factory() as db:
+            result = await db.execute(select(Device).where(
+                Device.id == device_id, Device.organization_id == organization_id
+            ))
+            result.scalars().first()
+            db.add(TelemetryLog(device_id=device_id, organization_id=organization_id,
+                                payload=SAMPLE_PAYLOAD, threat_evaluation={"risk_score": 0}))
+            await db.commit()
+
+
+async def run_pool_size(pool_size: int, organization_id: int, device_id: int):
+    label = f"bench-{pool_size}"
+    engine = create_engine_for(label, pool_size=pool_size, max_overflow=0)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        agent(session_factory, organization_id, device_id) for _ in range(CONCURRENCY)
+    ))
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+
+    total = CONCURRENCY * REQUESTS_PER_WORKER
+    checkouts = pool_checkouts.value(pool=label) or 1
+    mean_wait_ms = pool_wait_seconds.value(pool=label) / checkouts * 1000
+    print(f"{pool_size:>9} {total / elapsed:>14.0f} {mean_wait_ms:>16.2f}")
+
+
+async def main():
+    organization_id, device_id = await create_fixture()
+    print(f"{CONCURRENCY} concurrent agents x {REQUESTS_PER_WORKER} ingests")
+    print(f"{'pool size':>9} {'ingests/sec':>14} {'mean wait (ms)':>16}")
+    try:
+        for pool_size in POOL_SIZES:
+            await run_pool_size(pool_size, organization_id, device_id)
+    finally:
+        await drop_fixture(organization_id, device_id)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""
+Benchmark: fleet search index at 50,000 devices.
+
+Indexes a synthetic fleet (about 150 processes, 20 remote endpoints and a
+few listening ports per device), then measures incremental re-index cost
+per ingest and lookup latency for exact and prefix queries.
+
+Usage:
+  cd backend
+  python -m benchmarks.bench_fleet_index
+"""
+import random
+import time
+
+from app.services.fleet_index import FleetIndex
+
+DEVICES = 50_000
+COMMON_PROCESSES = [f"proc{i}.exe" for i in range(400)]
+LOOKUPS = 1_000
+
+
+def payload(rng: random.Random):
+    names = rng.sample(COMMON_PROCESSES, 150)
+    if rng.random() < 0.001:
+        names.append("psexec.exe")
+    endpoints = [f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}:{rng.choice([443, 80, 4444])}"
+                 for _ in range(20)]
+    return {
+        "processes": {"names": names, "suspicious": []},
+        "network": {"remote_endpoints": endpoints, "open_ports": rng.sample([22, 80, 443, 3389, 4444, 5985], 3)},
+    }
+
+
+def main():
+    rng = random.Random(7)
+    index = FleetIndex()
+
+    start = time.perf_counter()
+    for device_id in range(DEVICES):
+        index.update(1, device_id, payload(rng))
+    build = time.perf_counter() - start
+    print(f"indexed {DEVICES} devices in {build:.1f}s; distinct terms: {index.stats(1)}")
+
+    # Worst case: every term of the device changes between reports
+    updates = [(device_id, payload(rng)) for device_id in rng.sample(range(DEVICES), 2_000)]
+    start = time.perf_counter()
+    for device_id, p in updates:
+        index.update(1, device_id, p)
+    print(f"re-index per ingest (worst):   {(time.perf_counter() - start) / len(updates) * 1e6:>8.1f} us")
+
+    for label, kind, term in [
+        ("process exact (rare)", "process", "psexec.exe"),
+        ("process exact (common)", "process", "proc7.exe"),
+        ("process prefix", "process", "psexec*"),
+        ("remote ip:port", "remote", "10.1.2.3:4444"),
+        ("listening port", "port", "4444"),
+    ]:
+        start = time.perf_counter()
+        for _ in range(LOOKUPS):
+            matches = index.search(1, kind, term)
+        elapsed_ms = (time.perf_counter() - start) / LOOKUPS * 1000
+        print(f"{label:<30} {elapsed_ms:>8.3f} ms  ({len(matches)} devices)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: IOC store memory and lookup throughput.
+
+Writes synthetic feeds to a temporary directory (HASHES sha256 hashes,
+DOMAINS domains, IP_RANGES IPv4 addresses / CIDRs), loads them into an
+IOCStore and reports load time, resident size of the compact structures
+next to a plain Python set of the same strings, and lookups per second for
+hits and misses.
+
+Usage:
+  cd backend
+  python -m benchmarks.bench_ioc
+"""
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from app.services.ioc import IOCStore
+
+HASHES = 2_000_000
+DOMAINS = 200_000
+IP_RANGES = 100_000
+LOOKUPS = 200_000
+
+
+def write_feeds(feed_dir: str, rng: random.Random):
+    hashes = ["%064x" % rng.getrandbits(256) for _ in range(HASHES)]
+    with open(os.path.join(feed_dir, "hashes-bench.txt"), "w") as f:
+        f.write("\n".join(hashes))
+    domains = [f"bad{i}.example{rng.randrange(100)}.com" for i in range(DOMAINS)]
+    with open(os.path.join(feed_dir, "domains-bench.txt"), "w") as f:
+        f.write("\n".join(domains))
+    with open(os.path.join(feed_dir, "ips-bench.txt"), "w") as f:
+        for _ in range(IP_RANGES):
+            ip = ".".join(str(rng.randrange(1, 255)) for _ in range(4))
+            f.write(f"{ip}/{rng.choice([24, 28, 32, 32, 32])}\n")
+    return hashes, domains
+
+
+def throughput(label: str, fn, values):
+    start = time.perf_counter()
+    for value in values:
+        fn(value)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {len(values) / elapsed / 1e6:>8.2f} M lookups/s  ({elapsed / len(values) * 1e6:.2f} us)")
+
+
+def main():
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as feed_dir:
+        hashes, domains = write_feeds(feed_dir, rng)
+
+        start = time.perf_counter()
+        store = IOCStore.load(feed_dir)
+        print(f"load: {time.perf_counter() - start:.1f}s  {store.counts()}")
+
+    print(f"compact store: {store.nbytes / 1e6:>8.1f} MB")
+    tracemalloc.start()
+    naive = set(hashes) | set(domains)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"python set (hashes+domains, excl. the strings): {size / 1e6:>8.1f} MB")
+    del naive
+
+    hits = rng.sample(hashes, LOOKUPS // 2)
+    misses = ["%064x" % rng.getrandbits(256) for _ in range(LOOKUPS // 2)]
+    throughput("hash hit", lambda v: store.has("hash", v), hits)
+    throughput("hash miss", lambda v: store.has("hash", v), misses)
+    throughput("domain (subdomain walk)", store.has_domain, [f"www.{d}" for d in rng.sample(domains, 10_000)])
+    ips = [".".join(str(rng.randrange(1, 255)) for _ in range(4)) for _ in range(LOOKUPS // 2)]
+    throughput("ipv4 in ranges", store.has_ip, ips)
+
+
+if __name__ == "__main__":
+    main()
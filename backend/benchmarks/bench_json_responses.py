@@ -0,0 +1,85 @@
+"""
+Benchmark: serializing a 5,000-device fleet summary and a large latest-telemetry
+payload.
+
+Compares FastAPI's default path (jsonable_encoder + stdlib json) against
+app.core.serialization (orjson), and decoding + re-encoding a stored payload
+against passing the stored JSON text through. Reports mean time per response
+and peak Python memory allocated while producing it (tracemalloc).
+
+Usage:
+  cd backend
+  python -m benchmarks.bench_json_responses
+"""
+import json
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.serialization import dumps, loads, orjson
+
+DEVICES = 5_000
+PROCESSES_PER_PAYLOAD = 2_000
+ROUNDS = 20
+
+
+def fleet_summary():
+    now = datetime.utcnow()
+    devices = [{
+        "device_id": device_id,
+        "hostname": f"host-{device_id:05d}",
+        "os_type": random.choice(["windows", "linux", "darwin"]),
+        "status": "active",
+        "online": random.random() < 0.9,
+        "cpu_percent": round(random.uniform(0, 100), 1),
+        "ram_percent": round(random.uniform(0, 100), 1),
+        "disk_percent": round(random.uniform(0, 100), 1),
+        "firewall_enabled": random.random() < 0.8,
+        "antivirus_enabled": random.random() < 0.8,
+        "last_seen": (now - timedelta(seconds=random.randint(0, 600))).isoformat(),
+    } for device_id in range(DEVICES)]
+    return {"devices": devices, "total": len(devices)}
+
+
+def stored_payload() -> str:
+    processes = [{"pid": pid, "name": f"proc-{pid}", "cpu_percent": random.random(),
+                  "username": "svc"} for pid in range(PROCESSES_PER_PAYLOAD)]
+    return json.dumps({"system": {"cpu_percent": 12.5}, "processes": {"list": processes}}, separators=(",", ":"))
+
+
+def stdlib_response(content) -> bytes:
+    return json.dumps(jsonable_encoder(content), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def measure(label: str, fn):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        body = fn()
+    elapsed_ms = (time.perf_counter() - start) / ROUNDS * 1000
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<40} {elapsed_ms:>10.2f} {peak / 1e6:>12.2f} {len(body) / 1e6:>10.2f}")
+
+
+def main():
+    summary = fleet_summary()
+    raw = stored_payload()
+
+    print(f"orjson {'available' if orjson is not None else 'NOT installed (stdlib fallback)'}")
+    print(f"{'':<40} {'ms/resp':>10} {'peak MB':>12} {'body MB':>10}")
+    measure(f"summary, {DEVICES} devices, stdlib", lambda: stdlib_response(summary))
+    measure(f"summary, {DEVICES} devices, fast path", lambda: dumps(summary))
+    measure("latest payload, decode + stdlib", lambda: stdlib_response({"data": json.loads(raw)}))
+    measure("latest payload, decode + fast path", lambda: dumps({"data": loads(raw)}))
+    measure("latest payload, raw passthrough", lambda: ('{"data":%s}' % raw).encode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: Gorilla metric chunks against JSON telemetry rows.
+
+Generates DAYS of metrics for DEVICES devices reporting every ~30 s
+(random-walk CPU with one decimal like psutil, slowly moving RAM and
+disk, small connection counts, the odd missed report), then compares:
+
+  * bytes per sample: chunk bytes vs the JSON text of the charted fields
+    and of a typical full payload, which is what telemetry_log stores;
+  * append cost per sample on ingest;
+  * a 24 h history read for one device: decoding its chunks vs parsing
+    the JSON payloads of its rows (database I/O excluded on both sides).
+
+Usage:
+  cd backend
+  python -m benchmarks.bench_metric_store
+"""
+import json
+import random
+import statistics
+import time
+
+from app.core.config import settings
+from app.core.gorilla import ChunkEncoder, decode
+from app.services.live_telemetry import FIELDS, extract
+
+DEVICES = 100
+DAYS = 1
+INTERVAL = 30
+START = 1_760_000_000
+
+# The parts of a real agent payload the metrics are not in
+FILLER = {
+    "security": {"firewall_enabled": True, "antivirus_enabled": True, "disk_encrypted": True},
+    "processes": {"total": 243, "suspicious": [], "top_cpu": [
+        {"pid": 4312, "name": "chrome.exe", "cpu_percent": 3.1, "memory_percent": 4.2},
+        {"pid": 1180, "name": "svchost.exe", "cpu_percent": 0.8, "memory_percent": 1.1},
+    ]},
+}
+
+
+def series(rng: random.Random):
+    cpu, ram, disk = rng.uniform(5, 40), rng.uniform(30, 70), rng.uniform(20, 80)
+    at = START + rng.uniform(0, INTERVAL)
+    samples = []
+    while at < START + DAYS * 86_400:
+        cpu = min(100.0, max(0.0, cpu + rng.gauss(0, 4)))
+        ram = min(100.0, max(0.0, ram + rng.gauss(0, 0.3)))
+        disk += 0.0005
+        if rng.random() > 0.002:
+            samples.append((int(at), {
+                "system": {"cpu_percent": round(cpu, 1), "ram_percent": round(ram, 1),
+                           "disk_percent": round(disk, 1)},
+                "network": {"active_connections": rng.randrange(20, 60), "remote_endpoints": []},
+            }))
+        at += INTERVAL + rng.uniform(-0.2, 0.2)
+    return samples
+
+
+def chunked(samples):
+    chunks, encoder = [], None
+    for timestamp, payload in samples:
+        if encoder is None or timestamp - encoder.first_timestamp >= settings.METRIC_CHUNK_SECONDS:
+            encoder = ChunkEncoder(len(FIELDS))
+            chunks.append(encoder)
+        encoder.append(timestamp, extract(payload))
+    return [(e.getvalue(), e.count) for e in chunks]
+
+
+def main():
+    rng = random.Random(7)
+    devices = [series(rng) for _ in range(DEVICES)]
+    total = sum(map(len, devices))
+    print(f"{DEVICES} devices, {total} samples over {DAYS} day(s)")
+
+    start = time.perf_counter()
+    stored = [chunked(samples) for samples in devices]
+    elapsed = time.perf_counter() - start
+    print(f"append:              {elapsed / total * 1e6:>8.1f} us per sample")
+
+    chunk_bytes = sum(len(data) for chunks in stored for data, _ in chunks)
+    fields_json = sum(len(json.dumps({**p["system"], "active_connections": p["network"]["active_connections"]}))
+                      for samples in devices for _, p in samples)
+    payload_json = [[json.dumps({**p, **FILLER}) for _, p in samples] for samples in devices]
+    full_json = sum(len(text) for texts in payload_json for text in texts)
+    print(f"gorilla chunks:      {chunk_bytes / total:>8.2f} bytes per sample "
+          f"({len(stored[0])} chunks per device-day)")
+    print(f"JSON metric fields:  {fields_json / total:>8.2f} bytes per sample ({fields_json / chunk_bytes:.0f}x)")
+    print(f"JSON full payload:   {full_json / total:>8.2f} bytes per sample ({full_json / chunk_bytes:.0f}x)")
+
+    chunk_times, json_times = [], []
+    for chunks, texts in zip(stored[:20], payload_json[:20]):
+        start = time.perf_counter()
+        rows = [row for data, count in chunks for row in decode(data, count, len(FIELDS))]
+        chunk_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        parsed = [json.loads(text)["system"] for text in texts]
+        json_times.append(time.perf_counter() - start)
+        assert len(rows) == len(parsed)
+        assert all(row[1][0] == system["cpu_percent"] for row, system in zip(rows, parsed))
+    print(f"24 h read, chunks:   {statistics.median(chunk_times) * 1000:>8.2f} ms per device")
+    print(f"24 h read, JSON:     {statistics.median(json_times) * 1000:>8.2f} ms per device")
+
+
+if __name__ == "__main__":
+    main()
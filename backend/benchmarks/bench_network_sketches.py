@@ -0,0 +1,119 @@
+"""
+Benchmark: network sketch memory and accuracy against exact counting.
+
+Feeds one window of synthetic fleet traffic (DEVICES devices x REPORTS
+reports, ~25 remote endpoints each drawn from a Zipf-like distribution
+over ENDPOINTS endpoints) split across WORKERS sketch windows, merges them
+as the read path does, and compares with exact Counters / sets:
+
+  * top-20 endpoint and port recall and the worst relative overcount;
+  * fleet and per-device distinct external IP error;
+  * memory of the sketches (and serialized row size) vs the exact state;
+  * ingest cost per payload.
+
+Usage:
+  cd backend
+  python -m benchmarks.bench_network_sketches
+"""
+import random
+import statistics
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from app.services.network_sketches import NetworkWindow
+
+DEVICES = 5_000
+REPORTS = 20
+ENDPOINTS = 200_000
+WORKERS = 4
+TOP = 20
+
+
+def build_reports(rng: random.Random):
+    weights = 1.0 / np.arange(1, ENDPOINTS + 1) ** 1.1
+    picks = np.random.default_rng(5).choice(ENDPOINTS, size=DEVICES * REPORTS * 25, p=weights / weights.sum())
+    # Public first octets only, so every endpoint counts as external
+    octets = [8, 13, 20, 23, 31, 34, 52, 104, 142, 151, 185]
+    endpoints = [f"{octets[i % len(octets)]}.{(i // 11) % 256}.{(i // 2816) % 256}.{i % 7 + 1}:{443 if i % 3 else 8080}"
+                 for i in range(ENDPOINTS)]
+    reports, cursor = [], 0
+    for device_id in range(DEVICES):
+        ports = rng.sample([22, 80, 135, 443, 445, 3389, 5985, 8080], 3)
+        for _ in range(REPORTS):
+            chosen = [endpoints[j] for j in picks[cursor:cursor + 25]]
+            cursor += 25
+            reports.append((device_id, {"remote_endpoints": chosen, "open_ports": ports}))
+    return reports
+
+
+def exact(reports):
+    endpoints, ports = Counter(), Counter()
+    fleet_ips, device_ips = set(), defaultdict(set)
+    for device_id, network in reports:
+        endpoints.update(network["remote_endpoints"])
+        ports.update(network["open_ports"])
+        for endpoint in network["remote_endpoints"]:
+            ip = endpoint.rpartition(":")[0]
+            fleet_ips.add(ip)
+            device_ips[device_id].add(ip)
+    return endpoints, ports, fleet_ips, device_ips
+
+
+def compare_top(label, sketch_top, exact_counts):
+    truth = exact_counts.most_common(TOP)
+    recall = len({k for k, _ in sketch_top[:TOP]} & {k for k, _ in truth}) / len(truth)
+    errors = [(estimate - exact_counts[key]) / exact_counts[key] for key, estimate in sketch_top[:TOP]]
+    print(f"{label:<22} top-{TOP} recall {recall:.0%}, worst overcount {max(errors):.2%}")
+
+
+def main():
+    rng = random.Random(5)
+    reports = build_reports(rng)
+    print(f"{len(reports)} payloads, {sum(len(n['remote_endpoints']) for _, n in reports)} endpoint observations")
+
+    workers = [NetworkWindow() for _ in range(WORKERS)]
+    start = time.perf_counter()
+    for i, (device_id, network) in enumerate(reports):
+        workers[i % WORKERS].observe(device_id, network)
+    elapsed = time.perf_counter() - start
+    print(f"ingest:                {elapsed / len(reports) * 1e6:>8.1f} us per payload")
+
+    # Again under tracemalloc, which skews timing, for the resident size
+    tracemalloc.start()
+    workers = [NetworkWindow() for _ in range(WORKERS)]
+    for i, (device_id, network) in enumerate(reports):
+        workers[i % WORKERS].observe(device_id, network)
+    sketch_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rows = [w.to_bytes() for w in workers]
+    merged = NetworkWindow()
+    start = time.perf_counter()
+    for row in rows:
+        merged.merge(NetworkWindow.from_bytes(row))
+    print(f"merge {WORKERS} worker rows:    {(time.perf_counter() - start) * 1000:>8.1f} ms")
+
+    tracemalloc.start()
+    endpoints, ports, fleet_ips, device_ips = exact(reports)
+    exact_memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"sketch memory:         {sketch_memory / 1e6:>8.1f} MB for {WORKERS} workers, "
+          f"rows {sum(map(len, rows)) / 1e6:.1f} MB serialized")
+    print(f"exact memory:          {exact_memory / 1e6:>8.1f} MB (Counters and sets)")
+
+    compare_top("remote endpoints", merged.endpoints.top(TOP), endpoints)
+    compare_top("listening ports", merged.ports.top(TOP), ports)
+
+    estimate = merged.external_ips.count()
+    print(f"fleet distinct IPs     {estimate} vs {len(fleet_ips)} ({(estimate - len(fleet_ips)) / len(fleet_ips):+.2%})")
+    errors = [abs(merged.device_ips[d].count() - len(ips)) / len(ips) for d, ips in device_ips.items()]
+    print(f"per-device distinct    median error {statistics.median(errors):.2%}, "
+          f"p99 {sorted(errors)[int(len(errors) * 0.99)]:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark: security score reads as the fleet grows.
+
+Compares the incremental aggregator (running sums) against recomputing
+the average over every device's latest risk score on each request.
+
+Usage:
+  cd backend
+  python -m benchmarks.bench_security_score
+"""
+import random
+import time
+
+from app.services.security_score import SecurityScoreAggregator
+
+FLEET_SIZES = [1_000, 10_000, 100_000, 500_000]
+READS = 2_000
+
+
+def naive_score(latest: dict) -> int:
+    return round(100 - sum(latest.values()) / len(latest))
+
+
+def main():
+    print(f"{'devices':>10} {'incremental (us)':>18} {'recompute (us)':>16} {'update (us)':>13}")
+    for size in FLEET_SIZES:
+        aggregator = SecurityScoreAggregator()
+        for device_id in range(size):
+            aggregator.update(1, device_id, random.randint(0, 100))
+        latest = dict(aggregator._latest[1])
+
+        start = time.perf_counter()
+        for _ in range(READS):
+            aggregator.compute(1)
+        incremental = (time.perf_counter() - start) / READS * 1e6
+
+        naive_reads = max(1, READS // (size // 1_000))
+        start = time.perf_counter()
+        for _ in range(naive_reads):
+            naive_score(latest)
+        recompute = (time.perf_counter() - start) / naive_reads * 1e6
+
+        start = time.perf_counter()
+        for _ in range(READS):
+            aggregator.update(1, random.randrange(size), random.randint(0, 100))
+        update = (time.perf_counter() - start) / READS * 1e6
+
+        print(f"{size:>10} {incremental:>18.2f} {recompute:>16.2f} {update:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
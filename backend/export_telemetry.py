@@ -0,0 +1,53 @@
+"""
+OCSafe - Export telemetry for offline investigation.
+
+Streams telemetry_log rows for an organization (optionally one device and a
+time range) to a CSV, Arrow IPC stream or Parquet file with a server-side
+cursor, so multi-gigabyte exports run with bounded memory. Days moved to
+the telemetry archive are included. The same export is available over
+HTTP at GET /api/v1/telemetry/export.
+
+Usage:
+  cd backend
+  python export_telemetry.py --org 1 --since 2024-01-01 -o jan.parquet
+  python export_telemetry.py --org 1 --device 42 --days 30 --format csv -o dev42.csv
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from app.db.session import replica_router
+from app.services import telemetry_export
+
+
+async def export(args):
+    until = args.until
+    since = args.since
+    if since is None and args.days:
+        since = (until or datetime.utcnow()) - timedelta(days=args.days)
+
+    query = telemetry_export.export_query(args.org, args.device, since, until)
+    archived = telemetry_export.archived_batches(args.org, args.device, since, until)
+    written = 0
+    async with replica_router.session() as db:
+        with open(args.output, "wb") as f:
+            async for chunk in telemetry_export.export_chunks(db, query, args.format, archived):
+                f.write(chunk)
+                written += len(chunk)
+                print(f"  ... {written / 1e6:.1f} MB written", end="\r")
+
+    print(f"[DONE] Exported telemetry to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--org", type=int, required=True, help="Organization id")
+    parser.add_argument("--device", type=int, default=None, help="Only this device")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="ISO date/time (inclusive)")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="ISO date/time (exclusive)")
+    parser.add_argument("--days", type=int, default=None, help="Last N days (ignored with --since)")
+    parser.add_argument("--format", choices=list(telemetry_export.FORMATS), default="parquet")
+    parser.add_argument("-o", "--output", required=True, help="Output file")
+    args = parser.parse_args()
+    asyncio.run(export(args))